@@ -0,0 +1,1453 @@
+"""Benchmarks for the backend, run against a throwaway SQLite database.
+
+Usage:
+    python -m backend.bench seed --db /tmp/bench.db --clients 100000
+    python -m backend.bench load --clients 10000 --concurrency 32   # needs httpx
+    python -m backend.bench bundle --clients 10000   # needs httpx
+    python -m backend.bench micro
+    python -m backend.bench search --clients 100000
+    python -m backend.bench email --messages 2000   # needs aiosmtpd
+    python -m backend.bench tax --assignees 1000000   # needs numpy
+    python -m backend.bench calc --assignees 50000
+    python -m backend.bench score --ideas 5000 --chars 10000
+    python -m backend.bench stats --clients 100000
+    python -m backend.bench audit --saves 1000000
+    python -m backend.bench serialize --rows 10000
+    python -m backend.bench parity --database-url postgresql://...   # needs httpx, asyncpg
+    python -m backend.bench startup --budget-ms 1500
+    python -m backend.bench workers --workers 1 2 4 --min-speedup 1.5   # needs httpx, uvicorn
+
+Every command takes ``--out results.json`` (before the command name) to save
+its results together with the parameters and git revision they came from.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+
+WORDS = [
+    "contoso", "fabrikam", "northwind", "adventure", "globex", "litware", "tailspin",
+    "wingtip", "proseware", "alpine", "blue", "yonder", "coho", "margie", "lucerne",
+    "trey", "woodgrove", "humongous", "wide", "world", "fourth", "coffee", "graphic",
+    "design", "institute", "school", "fine", "arts", "datum", "consolidated",
+]
+SUFFIXES = ["Ltd", "Inc", "Corp", "Traders", "Works", "Group", "Partners", "LLC"]
+TASK_STATUSES = ["awaiting", "in_progress", "done"]
+WORKPAPER_STATUSES = ["draft", "review", "final"]
+
+
+def load_app(db_path: str):
+    """Import backend.main pointed at db_path and create the schema."""
+    os.environ["DB_PATH"] = db_path
+    from backend import main
+
+    main.migrate_db()
+    return main
+
+
+def owner_names(n: int) -> List[str]:
+    return [f"owner{i}" for i in range(n)]
+
+
+def seed_clients(conn, n: int, rng: random.Random, owners=("demo", "alice", "bob", "")) -> None:
+    rows = []
+    for i in range(n):
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {rng.choice(SUFFIXES)} {i}"
+        rows.append((name, rng.choice(owners)))
+    conn.executemany("INSERT OR IGNORE INTO clients (name, owner) VALUES (?, ?)", rows)
+    conn.commit()
+
+
+def seed(main, conn, args, rng: random.Random) -> dict:
+    """Fill every table with synthetic data at the scale given by args."""
+    start = time.perf_counter()
+    seed_clients(conn, args.clients, rng, owner_names(args.owners))
+    client_ids = [r[0] for r in conn.execute("SELECT id FROM clients")]
+    conn.executemany(
+        "INSERT INTO tasks (client_id, title, status) VALUES (?, ?, ?)",
+        ((cid, f"Task {i}", rng.choice(TASK_STATUSES)) for cid in client_ids for i in range(args.tasks_per_client)),
+    )
+    conn.executemany(
+        "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)",
+        (
+            (cid, f"Employee {cid}-{i}", f"e{cid}.{i}@example.com")
+            for cid in client_ids
+            for i in range(args.assignees_per_client)
+        ),
+    )
+    assignee_ids = [r[0] for r in conn.execute("SELECT id FROM assignees")]
+    conn.executemany(
+        "INSERT INTO workpapers (assignee_id, title, status) VALUES (?, ?, ?)",
+        ((aid, "Tax return", rng.choice(WORKPAPER_STATUSES)) for aid in assignee_ids),
+    )
+    income_rows, deduction_rows = [], []
+    for aid in assignee_ids:
+        income_rows.append((aid, rng.randint(20_000, 250_000), rng.randint(0, 50_000), rng.randint(0, 10_000)))
+        deduction_rows.append((aid, rng.randint(0, 20_000), rng.randint(0, 8_000), rng.randint(0, 5_000)))
+    conn.executemany(main.INCOME_SCHEMA.upsert_sql(), income_rows)
+    conn.executemany(main.DEDUCTION_SCHEMA.upsert_sql(), deduction_rows)
+    main.refresh_tax_summary(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    return {
+        "clients": len(client_ids),
+        "assignees": len(assignee_ids),
+        "calculator_rows": len(income_rows) + len(deduction_rows),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def percentiles(samples: List[float]) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def timed(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+# (name, method, path, JSON body). Strings are formatted with a random
+# owner / client_id / assignee_id / prefix from the seeded data per request.
+LOAD_SCENARIOS = [
+    ("home_overview", "GET", "/api/home/overview?owner={owner}", None),
+    ("my_assignees", "GET", "/api/home/my-assignees?owner={owner}", None),
+    ("list_clients", "GET", "/api/clients?limit=50", None),
+    ("search_clients", "GET", "/api/clients/search?q={prefix}", None),
+    ("list_assignees", "GET", "/api/clients/{client_id}/assignees?limit=50", None),
+    ("get_assignee", "GET", "/api/assignees/{assignee_id}", None),
+    ("get_calc", "GET", "/api/assignees/{assignee_id}/calc/income-tax", None),
+    ("assignee_overview", "GET", "/api/assignees/{assignee_id}/overview", None),
+    ("list_workpapers", "GET", "/api/assignees/{assignee_id}/workpapers", None),
+    ("assignee_bundle", "GET", "/api/assignees/{assignee_id}/bundle", None),
+    ("client_overview", "GET", "/api/clients/{client_id}/assignees/overview?limit=50", None),
+    ("owner_tax_summary", "GET", "/api/home/tax-summary?owner={owner}", None),
+    ("list_ideas", "GET", "/api/ideas?limit=50", None),
+    ("create_idea", "POST", "/api/ideas", {"title": "Load idea", "description": "urgent security risk"}),
+    ("put_calc", "PUT", "/api/assignees/{assignee_id}/calc/income-tax", {"data": {"salary": 60000, "bonus": 500}}),
+    ("assign_client", "POST", "/api/clients/{client_id}/assign", {"owner": "{owner}"}),
+]
+
+
+def fill(template, values: dict):
+    if isinstance(template, str):
+        return template.format(**values)
+    if isinstance(template, dict):
+        return {k: fill(v, values) for k, v in template.items()}
+    return template
+
+
+async def drive(client, method: str, path: str, body, requests: int, concurrency: int, pick) -> dict:
+    """Send `requests` requests from `concurrency` concurrent workers and summarise latencies."""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            values = pick()
+            start = time.perf_counter()
+            r = await client.request(method, fill(path, values), json=fill(body, values))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests": requests, "errors": errors, "rps": round(requests / elapsed, 1), **percentiles(latencies)}
+
+
+async def run_load(main, args, rng: random.Random) -> dict:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("the load benchmark needs httpx (pip install httpx)")
+    conn = main.get_db()
+    client_ids = [r[0] for r in conn.execute("SELECT id FROM clients")]
+    assignee_ids = [r[0] for r in conn.execute("SELECT id FROM assignees")]
+    conn.close()
+    owners = owner_names(args.owners)
+
+    def pick():
+        return {
+            "owner": rng.choice(owners),
+            "client_id": rng.choice(client_ids),
+            "assignee_id": rng.choice(assignee_ids),
+            "prefix": rng.choice(WORDS)[: rng.randint(2, 5)],
+        }
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, method, path, body in LOAD_SCENARIOS:
+            if args.only and name not in args.only:
+                continue
+            r = results[name] = await drive(client, method, path, body, args.requests, args.concurrency, pick)
+            print(
+                f"  {name:18} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}"
+                f"  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}"
+            )
+    return results
+
+
+def with_seeded_db(args, fn) -> dict:
+    """Run fn(main, rng) against args.db (or a temporary file), seeding it first if it is short of data."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(args.db or os.path.join(tmp, "bench.db"))
+        conn = main.get_db()
+        (existing,) = conn.execute("SELECT COUNT(*) FROM clients").fetchone()
+        seeded = None
+        if existing < args.clients:
+            seeded = seed(main, conn, args, rng)
+            print(f"seeded {seeded}")
+        conn.close()
+        return {"seed": seeded, "results": fn(main, rng)}
+
+
+# What the workpaper pages requested for one assignee before the bundle endpoint
+WORKPAPER_PAGE_PATHS = (
+    "/api/assignees/{id}",
+    "/api/assignees/{id}/calc/income-tax",
+    "/api/assignees/{id}/calc/deductions",
+    "/api/assignees/{id}/overview",
+    "/api/assignees/{id}/workpapers",
+)
+
+
+async def workpaper_page_loads(main, assignee_ids: List[int]) -> dict:
+    import httpx
+
+    async def timed_loads(fetch) -> dict:
+        samples = []
+        for aid in assignee_ids:
+            start = time.perf_counter()
+            await fetch(aid)
+            samples.append((time.perf_counter() - start) * 1000)
+        return percentiles(samples)
+
+    etags = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def separate(aid):
+            for path in WORKPAPER_PAGE_PATHS:
+                (await client.get(path.format(id=aid))).raise_for_status()
+
+        async def bundle(aid):
+            r = await client.get(f"/api/assignees/{aid}/bundle")
+            r.raise_for_status()
+            etags[aid] = r.headers["etag"]
+
+        async def revalidate(aid):
+            r = await client.get(f"/api/assignees/{aid}/bundle", headers={"If-None-Match": etags[aid]})
+            if r.status_code != 304:
+                raise SystemExit(f"bundle for assignee {aid} did not revalidate: {r.status_code}")
+
+        return {
+            "separate_requests": await timed_loads(separate),
+            "bundle_cold": await timed_loads(bundle),
+            "bundle_304": await timed_loads(revalidate),
+        }
+
+
+def bench_bundle(args) -> dict:
+    """Loading the workpaper pages: five requests vs one bundle, cold and revalidated."""
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        raise SystemExit("the bundle benchmark needs httpx (pip install httpx)")
+
+    def run(main, rng):
+        conn = main.get_db()
+        assignee_ids = [r[0] for r in conn.execute("SELECT id FROM assignees")]
+        conn.close()
+        sample = rng.sample(assignee_ids, min(args.pages, len(assignee_ids)))
+        results = asyncio.run(workpaper_page_loads(main, sample))
+        for name, stats in results.items():
+            print(f"  {name:18} p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f} ms per page load")
+        return results
+
+    print(f"clients={args.clients} page loads={args.pages}")
+    return with_seeded_db(args, run)
+
+
+def bench_seed(args) -> dict:
+    if not args.db:
+        raise SystemExit("seed needs --db (the database file to fill)")
+    return with_seeded_db(args, lambda main, rng: None)
+
+
+def bench_load(args) -> dict:
+    print(f"clients={args.clients} concurrency={args.concurrency} requests/endpoint={args.requests}")
+    return with_seeded_db(args, lambda main, rng: asyncio.run(run_load(main, args, rng)))
+
+
+def bench_micro(args) -> dict:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+        vocabulary = WORDS + ["urgent", "security", "risk", "cost", "customer"]
+        results = {}
+        for size in (100, 10_000, 1_000_000):
+            text = " ".join(rng.choice(vocabulary) for _ in range(size // 7))
+            loops = max(1, 100_000 // size)
+            stats = timed(lambda: [main.compute_score(text) for _ in range(loops)], args.repeat)
+            stats["per_call_ms"] = round(stats["p50_ms"] / loops, 4)
+            results[f"compute_score_{size}"] = stats
+        incomes = [(rng.uniform(0, 300_000), rng.uniform(0, 30_000)) for _ in range(100_000)]
+        results["tax_totals_100k"] = timed(lambda: [main.tax_totals(i, d) for i, d in incomes], args.repeat)
+        if main.REPORTLAB_AVAILABLE:
+            fields = {f"Field {i}": f"Value {i}" for i in range(40)}
+            results["render_pdf_40_fields"] = timed(lambda: main.render_pdf([("Form", fields)], "Form"), args.repeat)
+        for name, stats in results.items():
+            print(f"  {name:22} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms")
+        return results
+
+
+def bench_search(args) -> dict:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+        conn = main.get_db()
+        seed_clients(conn, args.clients, rng)
+        queries = [rng.choice(WORDS)[: rng.randint(2, 6)] for _ in range(50)]
+
+        def like_path():
+            for q in queries:
+                conn.execute(
+                    "SELECT id, name, owner, created_at FROM clients WHERE name LIKE ? ORDER BY name",
+                    (f"%{q}%",),
+                ).fetchall()
+
+        def fts_path():
+            for q in queries:
+                lo, hi = main.prefix_bounds(q)
+                rows = conn.execute(main.SEARCH_PREFIX_SQL, (lo, hi, *main.SEARCH_START[1], args.limit + 1)).fetchall()
+                if len(rows) <= args.limit:
+                    conn.execute(
+                        main.SEARCH_TOKEN_SQL,
+                        (main.fts_query(q), 0, lo, hi, args.limit - len(rows) + 1),
+                    ).fetchall()
+
+        print(f"clients={args.clients} queries/iteration={len(queries)} limit={args.limit}")
+        results = {}
+        for label, fn in (("like", like_path), ("fts5", fts_path)):
+            stats = timed(fn, args.repeat)
+            stats["per_query_p50_ms"] = round(stats["p50_ms"] / len(queries), 3)
+            results[label] = stats
+            print(f"  {label:5} per-iteration {stats}")
+        conn.close()
+        return results
+
+
+def bench_tax(args) -> dict:
+    """Progressive bracket tax per assignee in a Python loop vs NumPy arrays, plus the what-if evaluation."""
+    try:
+        import numpy as np
+    except ImportError:
+        raise SystemExit("the tax benchmark needs numpy (pip install numpy)")
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+    rng = np.random.default_rng(args.seed)
+    income = np.round(rng.lognormal(11, 0.8, args.assignees), 2)
+    deductions = np.round(rng.uniform(0, 30_000, args.assignees), 2)
+    taxable = np.maximum(income - deductions, 0.0)
+    schedule = main.tax_schedule()
+    values = taxable.tolist()
+
+    loop_result = [schedule.tax(t) for t in values]
+    mismatched = int(np.count_nonzero(np.asarray(loop_result) != schedule.tax_array(taxable)))
+    inputs = np.column_stack([income, deductions, schedule.tax_array(taxable)])
+    scenarios = [
+        main.TaxScenario(name="current"),
+        main.TaxScenario(name="raise", income_factor=1.05),
+        main.TaxScenario(name="prior year", year=2024),
+        main.TaxScenario(name="flat", jurisdiction="flat", extra_deductions=2000),
+    ]
+    results = {
+        "python_loop": timed(lambda: [schedule.tax(t) for t in values], args.repeat),
+        "numpy": timed(lambda: schedule.tax_array(taxable), args.repeat),
+        "what_if_4_scenarios": timed(lambda: main.scenario_results(inputs, scenarios), args.repeat),
+        "mismatched_cents": mismatched,
+    }
+    print(f"assignees={args.assignees} brackets={len(schedule.thresholds)} mismatches={mismatched}")
+    for name in ("python_loop", "numpy", "what_if_4_scenarios"):
+        stats = results[name]
+        print(f"  {name:20} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms")
+    return results
+
+
+def bench_calc(args) -> dict:
+    """Calculator inputs as JSON text in calculator_data (the old layout) vs the typed per-calculator table."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+        conn = main.get_db()
+        seed_clients(conn, max(1, args.assignees // 10), rng)
+        client_ids = [r[0] for r in conn.execute("SELECT id FROM clients")]
+        conn.executemany(
+            "INSERT INTO assignees (client_id, name) VALUES (?, ?)",
+            ((rng.choice(client_ids), f"Employee {i}") for i in range(args.assignees)),
+        )
+        conn.commit()
+        ids = [r[0] for r in conn.execute("SELECT id FROM assignees")]
+        bodies = [
+            {"salary": rng.randint(20_000, 250_000), "bonus": rng.randint(0, 50_000), "other": rng.randint(0, 10_000)}
+            for _ in ids
+        ]
+        schema = main.INCOME_SCHEMA
+        json_upsert = """
+            INSERT INTO calculator_data (assignee_id, calc_key, data) VALUES (?, 'income-tax-json', ?)
+            ON CONFLICT(assignee_id, calc_key) DO UPDATE SET data = excluded.data, updated_at = datetime('now')
+        """
+        typed_upsert = schema.upsert_sql()
+
+        def write_json():
+            with conn:
+                for aid, body in zip(ids, bodies):
+                    conn.execute(json_upsert, (aid, json.dumps(body)))
+
+        def write_typed():
+            with conn:
+                for aid, body in zip(ids, bodies):
+                    conn.execute(typed_upsert, (aid, *schema.values(body)))
+
+        def read_json():
+            sql = "SELECT data FROM calculator_data WHERE assignee_id = ? AND calc_key = 'income-tax-json'"
+            for aid in ids:
+                json.loads(conn.execute(sql, (aid,)).fetchone()[0])
+
+        def read_typed():
+            sql = schema.select_sql()
+            for aid in ids:
+                schema.to_dict(conn.execute(sql, (aid,)).fetchone())
+
+        json_terms = " + ".join(f"coalesce(json_extract(data, '$.{f}'), 0)" for f in schema.fields)
+
+        def totals_json():
+            conn.execute(
+                f"SELECT assignee_id, {json_terms} FROM calculator_data WHERE calc_key = 'income-tax-json'"
+            ).fetchall()
+
+        def totals_typed():
+            conn.execute(f"SELECT assignee_id, {schema.total_sql(schema.table)} FROM {schema.table}").fetchall()
+
+        results = {}
+        for name, fn in (
+            ("write_json", write_json), ("write_typed", write_typed),
+            ("read_json", read_json), ("read_typed", read_typed),
+            ("totals_json", totals_json), ("totals_typed", totals_typed),
+        ):
+            stats = timed(fn, args.repeat)
+            stats["per_row_us"] = round(stats["p50_ms"] * 1000 / len(ids), 3)
+            results[name] = stats
+        try:
+            for name, table in (("json", "calculator_data"), ("typed", schema.table)):
+                (size,) = conn.execute("SELECT sum(pgsize) FROM dbstat WHERE name = ?", (table,)).fetchone()
+                results[f"bytes_{name}"] = size
+        except sqlite3.OperationalError:
+            pass  # SQLite built without dbstat
+        conn.close()
+    print(f"assignees={len(ids)}")
+    for name, stats in results.items():
+        if isinstance(stats, dict):
+            print(f"  {name:13} p50 {stats['p50_ms']:9.2f} ms  {stats['per_row_us']:7.3f} us/row")
+        else:
+            print(f"  {name:13} {stats} bytes")
+    return results
+
+
+# The same numbers as /api/home/stats for 'all' and one owner, counted live
+LIVE_STATS_SQL = """
+    SELECT 'task', status, COUNT(*) FROM tasks GROUP BY status
+    UNION ALL
+    SELECT 'workpaper', status, COUNT(*) FROM workpapers GROUP BY status
+    UNION ALL
+    SELECT 'assignee', '', COUNT(*) FROM assignees
+    UNION ALL
+    SELECT 'task', t.status, COUNT(*) FROM tasks t JOIN clients c ON c.id = t.client_id WHERE c.owner = ? GROUP BY t.status
+    UNION ALL
+    SELECT 'workpaper', w.status, COUNT(*)
+    FROM workpapers w JOIN assignees a ON a.id = w.assignee_id JOIN clients c ON c.id = a.client_id
+    WHERE c.owner = ? GROUP BY w.status
+    UNION ALL
+    SELECT 'assignee', '', COUNT(*) FROM assignees a JOIN clients c ON c.id = a.client_id WHERE c.owner = ?
+"""
+
+
+def bench_stats(args) -> dict:
+    """Dashboard counts: live grouped queries vs the trigger-maintained counters, and what the triggers cost writes."""
+    print(f"clients={args.clients} tasks/client={args.tasks_per_client} assignees/client={args.assignees_per_client}")
+
+    def run(main, rng):
+        conn = main.get_db()
+        owner = "owner1"
+        scopes = main.stat_scopes(owner, 1)
+        results = {
+            "live_grouped": timed(lambda: conn.execute(LIVE_STATS_SQL, (owner,) * 3).fetchall(), args.repeat),
+            "counters": timed(lambda: conn.execute(main.STAT_SCOPES_SQL, scopes).fetchall(), args.repeat),
+            "awaiting_count_live": timed(
+                lambda: conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'awaiting'").fetchone(), args.repeat
+            ),
+            "awaiting_count_counter": timed(lambda: conn.execute(main.STAT_AWAITING_SQL).fetchone(), args.repeat),
+        }
+        client_ids = [r[0] for r in conn.execute("SELECT id FROM clients LIMIT 1000")]
+        rows = [(rng.choice(client_ids), "Bench task", rng.choice(TASK_STATUSES)) for _ in range(args.writes)]
+
+        def insert_tasks():
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            for row in rows:
+                conn.execute("INSERT INTO tasks (client_id, title, status) VALUES (?, ?, ?)", row)
+            conn.commit()
+            return round(args.writes / (time.perf_counter() - start), 1)
+
+        results["task_inserts_per_s_with_triggers"] = insert_tasks()
+        triggers = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stat_%'")]
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        results["task_inserts_per_s_without_triggers"] = insert_tasks()
+        main.add_stat_counters(conn)
+        conn.commit()
+        start = time.perf_counter()
+        mismatches = main.check_stat_counters(conn, repair=False)
+        results["check"] = {"seconds": round(time.perf_counter() - start, 3), "mismatches": len(mismatches)}
+        conn.close()
+        for name in ("live_grouped", "counters", "awaiting_count_live", "awaiting_count_counter"):
+            print(f"  {name:24} p50 {results[name]['p50_ms']:9.3f} ms  p95 {results[name]['p95_ms']:9.3f} ms")
+        print(f"  task inserts/s          {results['task_inserts_per_s_with_triggers']:10.1f} with triggers, "
+              f"{results['task_inserts_per_s_without_triggers']:.1f} without")
+        print(f"  consistency check       {results['check']['seconds']:10.3f} s, {len(mismatches)} mismatches")
+        if mismatches:
+            raise SystemExit(1)
+        return results
+
+    return with_seeded_db(args, run)
+
+
+def bench_audit(args) -> dict:
+    """Calculator saves with the audit triggers on and off, log size, as-of reads and compaction at scale."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+        conn = main.get_db()
+        seed_clients(conn, max(1, args.assignees // 10), rng)
+        client_ids = [r[0] for r in conn.execute("SELECT id FROM clients")]
+        conn.executemany(
+            "INSERT INTO assignees (client_id, name) VALUES (?, ?)",
+            ((rng.choice(client_ids), f"Employee {i}") for i in range(args.assignees)),
+        )
+        ids = [r[0] for r in conn.execute("SELECT id FROM assignees")]
+        schema = main.INCOME_SCHEMA
+        # Saves are spread over --days of simulated time, in order, so as-of dates land between versions
+        start_at = time.time() - args.days * 86400
+        step = args.days * 86400 / max(1, args.saves)
+        states = {aid: {"salary": 50_000.0, "bonus": 0.0, "other": 0.0} for aid in ids}
+        stamp = lambda i: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start_at + i * step))  # noqa: E731
+        conn.executemany(
+            f"INSERT INTO {schema.table} (assignee_id, salary, bonus, other, updated_at) VALUES (?, 50000, 0, 0, ?)",
+            ((aid, stamp(0)) for aid in ids),
+        )
+        conn.commit()
+        update = f"UPDATE {schema.table} SET {{}}, version = version + 1, updated_at = ? WHERE assignee_id = ?"
+
+        def save(i: int) -> int:
+            """One save changing one or two fields; returns the size of the whole state as a JSON blob."""
+            aid = rng.choice(ids)
+            state = states[aid]
+            fields = rng.sample(schema.fields, rng.choice((1, 1, 1, 2)))
+            for field in fields:
+                state[field] = float(rng.randint(0, 250_000))
+            sets = ", ".join(f"{f} = ?" for f in fields)
+            conn.execute(update.format(sets), (*(state[f] for f in fields), stamp(i), aid))
+            return len(json.dumps(state))
+
+        def saves_per_s(first: int, n: int) -> float:
+            begin = time.perf_counter()
+            for chunk in range(first, first + n, 1000):
+                conn.execute("BEGIN IMMEDIATE")
+                for i in range(chunk, min(first + n, chunk + 1000)):
+                    save(i)
+                conn.commit()
+            return round(n / (time.perf_counter() - begin), 1)
+
+        results = {}
+        timed_saves = min(args.timed, args.saves)
+        triggers = {
+            name: sql for name, sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (schema.table,)
+            )
+        }
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        results["saves_per_s_without_log"] = saves_per_s(0, timed_saves)
+        for sql in triggers.values():
+            conn.execute(sql)
+        conn.execute("DELETE FROM audit_log")
+        conn.execute(
+            "INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta) "
+            f"SELECT assignee_id, 'calc/income-tax', version, updated_at, 1, {schema.json_sql()} FROM {schema.table}"
+        )
+        conn.commit()
+        results["saves_per_s_with_log"] = saves_per_s(timed_saves, timed_saves)
+        begin = time.perf_counter()
+        blob_bytes = 0
+        for chunk in range(2 * timed_saves, args.saves + timed_saves, 1000):
+            conn.execute("BEGIN IMMEDIATE")
+            for i in range(chunk, min(args.saves + timed_saves, chunk + 1000)):
+                blob_bytes += save(i)
+            conn.commit()
+        results["bulk_saves_per_s"] = round((args.saves - timed_saves) / (time.perf_counter() - begin), 1)
+        entries, delta_bytes = conn.execute("SELECT count(*), sum(length(delta)) FROM audit_log WHERE snapshot = 0").fetchone()
+        results["log"] = {
+            "entries": conn.execute("SELECT count(*) FROM audit_log").fetchone()[0],
+            "delta_bytes_per_save": round((delta_bytes or 0) / max(1, entries), 1),
+            "blob_bytes_per_save": round(blob_bytes / max(1, args.saves - timed_saves), 1),
+        }
+        try:
+            (size,) = conn.execute("SELECT sum(pgsize) FROM dbstat WHERE name LIKE '%audit_log%'").fetchone()
+            results["log"]["bytes"] = size
+        except sqlite3.OperationalError:
+            pass  # SQLite built without dbstat
+        conn.execute("ANALYZE")
+
+        def as_of(aid: int, at: str):
+            entity = "calc/income-tax"
+            return main.audit_fold(conn.execute(main.AUDIT_STATE_SQL, (aid, entity, at, aid, entity, at)).fetchall())
+
+        probes = [(rng.choice(ids), stamp(rng.randrange(args.saves + timed_saves))) for _ in range(args.queries)]
+        samples = []
+        for aid, at in probes:
+            begin = time.perf_counter()
+            as_of(aid, at)
+            samples.append((time.perf_counter() - begin) * 1000)
+        results["as_of"] = percentiles(samples)
+        conn.close()
+
+        cutoff = stamp(args.saves + timed_saves - args.keep_days * 86400 / step) if args.keep_days else ""
+        begin = time.perf_counter()
+        compacted = asyncio.run(main.with_storage(lambda: main.storage.compact_audit(args.keep_versions, cutoff)))
+        results["compaction"] = {"seconds": round(time.perf_counter() - begin, 2), **compacted}
+        conn = main.get_db()
+        results["compaction"]["entries_after"] = conn.execute("SELECT count(*) FROM audit_log").fetchone()[0]
+        try:
+            (size,) = conn.execute("SELECT sum(pgsize) FROM dbstat WHERE name LIKE '%audit_log%'").fetchone()
+            results["compaction"]["bytes_after"] = size
+        except sqlite3.OperationalError:
+            pass
+        stale = [aid for aid in rng.sample(ids, min(1000, len(ids))) if as_of(aid, "9999-12-31")[2] != states[aid]]
+        conn.close()
+    print(f"assignees={len(ids)} saves={args.saves} over {args.days} days")
+    print(f"  saves/s               {results['saves_per_s_with_log']:10.1f} with the log, "
+          f"{results['saves_per_s_without_log']:.1f} without ({timed_saves} saves each)")
+    log = results["log"]
+    print(f"  log                   {log['entries']:10} entries, {log['delta_bytes_per_save']} delta bytes/save "
+          f"vs {log['blob_bytes_per_save']} for a whole-blob copy, {log.get('bytes', '?')} bytes on disk")
+    print(f"  as-of reads           p50 {results['as_of']['p50_ms']:7.3f} ms  p95 {results['as_of']['p95_ms']:7.3f} ms")
+    c = results["compaction"]
+    print(f"  compaction            {c['seconds']:10.2f} s, {c['removed']} removed, {c['entries_after']} entries "
+          f"and {c.get('bytes_after', '?')} bytes left")
+    print(f"  latest state matches  {1000 - len(stale) if len(ids) >= 1000 else len(ids) - len(stale)} sampled assignees")
+    if stale:
+        raise SystemExit(1)
+    return results
+
+
+def legacy_score(text: str) -> int:
+    """compute_score before the compiled scorer: the weights dict rebuilt on every call."""
+    text_l = text.lower()
+    score = 0
+    weights = {
+        "risk": 5, "impact": 4, "cost": 3, "urgent": 6,
+        "security": 5, "performance": 4, "reliability": 4, "innovation": 3,
+    }
+    for kw, w in weights.items():
+        if kw in text_l:
+            score += w
+    score += min(len(text) // 50, 6)
+    return score
+
+
+def bench_score(args) -> dict:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        main = load_app(os.path.join(tmp, "bench.db"))
+        # A large table: the default keywords plus made-up ones, some of which appear in the text
+        big = dict(main.DEFAULT_IDEA_WEIGHTS)
+        for i in range(args.keywords - len(big)):
+            big[f"{rng.choice(WORDS)}{rng.choice(WORDS)[:3]}{i}"] = rng.randint(1, 5)
+        vocabulary = WORDS + list(main.DEFAULT_IDEA_WEIGHTS) + rng.sample(list(big), min(20, len(big)))
+        descriptions = []
+        for _ in range(args.ideas):
+            words, size = [], 0
+            while size < args.chars:
+                word = rng.choice(vocabulary)
+                words.append(word.title() if rng.random() < 0.1 else word)
+                size += len(word) + 1
+            descriptions.append(" ".join(words))
+        print(f"ideas={args.ideas} chars={args.chars} large table={len(big)} keywords")
+
+        large = main.IdeaScorer(big)
+        scorers = [
+            ("legacy", legacy_score),
+            ("compiled", main.IdeaScorer(main.DEFAULT_IDEA_WEIGHTS).score),
+            ("large_substring", main.IdeaScorer(big, automaton=False).score),
+        ]
+        if large.matcher == "aho-corasick":
+            scorers.append(("large_automaton", large.score))
+        else:
+            print("  (pyahocorasick not installed: no automaton run)")
+
+        results, outputs = {}, {}
+        for name, score in scorers:
+            start = time.perf_counter()
+            outputs[name] = [score(d) for d in descriptions]
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "seconds": round(elapsed, 3),
+                "us_per_idea": round(elapsed / len(descriptions) * 1e6, 1),
+                "mb_per_s": round(sum(map(len, descriptions)) / elapsed / 1e6, 1),
+            }
+            print(f"  {name:16} {results[name]['us_per_idea']:10.1f} us/idea  {results[name]['mb_per_s']:8.1f} MB/s")
+        mismatches = [
+            f"{a} vs {b}" for a, b in (("legacy", "compiled"), ("large_substring", "large_automaton"))
+            if b in outputs and outputs[a] != outputs[b]
+        ]
+
+        conn = main.get_db()
+        conn.executemany(
+            "INSERT INTO ideas (title, description, score) VALUES (?, ?, ?)",
+            ((f"Idea {i}", d, 0) for i, d in enumerate(descriptions)),
+        )
+        conn.commit()
+        conn.close()
+        for name, scorer in (("rescore_all", main.idea_scorer), ("rescore_unchanged", main.idea_scorer), ("rescore_large", large)):
+            start = time.perf_counter()
+            outcome = asyncio.run(main.storage.rescore_ideas(scorer))
+            elapsed = time.perf_counter() - start
+            results[name] = {**outcome, "seconds": round(elapsed, 3), "ideas_per_s": round(outcome["ideas"] / elapsed, 1)}
+            del results[name]["fingerprint"]
+            print(f"  {name:16} {results[name]['ideas_per_s']:10.1f} ideas/s  changed {outcome['changed']}")
+        conn = main.get_db()
+        stored = [r[0] for r in conn.execute("SELECT score FROM ideas ORDER BY id")]
+        conn.close()
+        if stored != outputs["large_substring"]:
+            mismatches.append("stored scores after rescore_large")
+    for m in mismatches:
+        print(f"MISMATCH  {m}")
+    if mismatches:
+        raise SystemExit(1)
+    return results
+
+
+def bench_email(args) -> dict:
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit("the email benchmark needs aiosmtpd (pip install aiosmtpd)")
+    import smtplib
+
+    class Sink:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    controller = Controller(Sink(), hostname="127.0.0.1", port=args.port)
+    controller.start()
+    os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(args.port), SMTP_TLS="false")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            main = load_app(os.path.join(tmp, "bench.db"))
+            message = b"Subject: bench\r\nFrom: a@example.com\r\nTo: b@example.com\r\n\r\nhello\r\n"
+
+            start = time.perf_counter()
+            for _ in range(args.messages):
+                server = smtplib.SMTP("127.0.0.1", args.port, timeout=10)
+                server.sendmail("a@example.com", ["b@example.com"], message)
+                server.quit()
+            per_request = args.messages / (time.perf_counter() - start)
+
+            conn = main.get_db()
+            conn.executemany(
+                "INSERT INTO email_outbox (from_addr, to_addrs, subject, message) VALUES (?, ?, ?, ?)",
+                [("a@example.com", '["b@example.com"]', "bench", message)] * args.messages,
+            )
+            conn.commit()
+            worker = main.EmailWorker()
+
+            async def drain():
+                while await worker.drain_once():
+                    pass
+
+            start = time.perf_counter()
+            asyncio.run(drain())
+            queued = args.messages / (time.perf_counter() - start)
+            asyncio.run(worker.stop())
+            (sent,) = conn.execute("SELECT COUNT(*) FROM email_outbox WHERE status = 'sent'").fetchone()
+            conn.close()
+    finally:
+        controller.stop()
+    print(f"messages={args.messages}")
+    print(f"  connection per message  {per_request:8.1f} msg/s")
+    print(f"  queue + reused conns    {queued:8.1f} msg/s  (sent {sent})")
+    return {"connection_per_message_per_s": round(per_request, 1), "queued_per_s": round(queued, 1), "sent": sent}
+
+
+# Scripted API calls replayed against each storage backend. Both start from
+# the same sample data, so ids line up and responses must match exactly.
+PARITY_SCENARIO = [
+    ("GET", "/api/ideas", None),
+    ("POST", "/api/ideas", {"title": "Cache warmup", "description": "fast, cheap and secure"}),
+    ("POST", "/api/ideas", {"title": "Second", "description": ""}),
+    ("GET", "/api/ideas?limit=1", None),
+    ("DELETE", "/api/ideas/1", None),
+    ("DELETE", "/api/ideas/1", None),
+    ("GET", "/api/ideas/scoring", None),
+    ("POST", "/api/ideas:rescore", None),
+    ("GET", "/api/ideas/scoring", None),
+    ("GET", "/api/home/overview?owner=demo", None),
+    ("GET", "/api/home/stats?owner=demo", None),
+    ("GET", "/api/clients", None),
+    ("GET", "/api/clients?limit=2", None),
+    ("GET", "/api/clients?limit=2&after_id=1", None),
+    ("GET", "/api/clients?format=ndjson", None),
+    ("GET", "/api/clients/search?q=co", None),
+    ("GET", "/api/clients/search?q=wor", None),
+    ("GET", "/api/clients/search?q=&limit=2", None),
+    ("GET", "/api/clients/search?q=zzz", None),
+    ("POST", "/api/clients/3/assign", {"owner": "alice"}),
+    ("POST", "/api/clients/999/assign", {"owner": "alice"}),
+    ("GET", "/api/home/overview?owner=alice", None),
+    ("POST", "/api/clients/3/assignees", {"name": "Nancy Davolio", "email": "nancy@northwind.example"}),
+    ("POST", "/api/clients/999/assignees", {"name": "Nobody"}),
+    ("GET", "/api/home/my-assignees?owner=alice", None),
+    ("GET", "/api/clients/1/assignees", None),
+    ("GET", "/api/assignees/4", None),
+    ("GET", "/api/assignees/9999", None),
+    ("POST", "/api/assignees/4/workpapers", {"title": "2025 return", "notes": "first pass"}),
+    ("POST", "/api/assignees/4/workpapers", {"title": "Amendment"}),
+    ("POST", "/api/assignees/9999/workpapers", {"title": "Orphan"}),
+    ("GET", "/api/assignees/4/workpapers?limit=1", None),
+    ("GET", "/api/home/stats?owner=alice&client_id=3", None),
+    ("GET", "/api/home/stats?owner=alice&client_id=999", None),
+    ("POST", "/api/home/stats:check", None),
+    ("PUT", "/api/assignees/4/calc/income-tax", {"data": {"salary": 85000, "bonus": 5000.5, "other": None}}),
+    ("PUT", "/api/assignees/4/calc/deductions", {"data": {"retirement": 6000, "charity": 250}}),
+    ("PUT", "/api/assignees/4/calc/income-tax", {"data": {"salary": "lots"}}),
+    ("PUT", "/api/assignees/4/calc/deductions", {"data": {"mortgage": 1}}),
+    ("PUT", "/api/assignees/9999/calc/income-tax", {"data": {"salary": 1}}),
+    ("PUT", "/api/assignees/4/calc/notes", {"data": {"text": "call back", "flags": [1, 2]}}),
+    ("GET", "/api/assignees/4/calc/income-tax", None),
+    ("GET", "/api/assignees/4/calc/notes", None),
+    ("GET", "/api/assignees/4/calc/unknown", None),
+    ("PATCH", "/api/assignees/4/calc/income-tax", {"data": {"bonus": None, "other": 1200}}, {"If-Match": '"1"'}),
+    ("PATCH", "/api/assignees/4/calc/income-tax", {"data": {"salary": 1}}, {"If-Match": '"1"'}),
+    ("PUT", "/api/assignees/4/calc/income-tax", {"data": {"salary": 1}}, {"If-Match": "2"}),
+    ("PATCH", "/api/assignees/4/calc/notes", {"data": {"text": None, "meta": {"pinned": True}}}),
+    ("PATCH", "/api/assignees/4/calc/notes", {"data": {"meta": {"pinned": None, "color": "red"}}}),
+    ("PATCH", "/api/assignees/4/calc/todo", {"data": {"a": None, "b": 1}}, {"If-Match": '"0"'}),
+    ("PATCH", "/api/assignees/4/calc/todo", {"data": {"b": 2}}, {"If-Match": '"0"'}),
+    ("GET", "/api/assignees/4/calc/notes", None),
+    ("GET", "/api/assignees/4/calc/income-tax", None, {"If-None-Match": '"2"'}),
+    (
+        "POST",
+        "/api/assignees/4/calc:batch",
+        {"calcs": {"deductions": {"data": {"health": 800}, "version": 1}, "income-tax": {"data": {"bonus": 1}, "version": 2}}},
+    ),
+    (
+        "POST",
+        "/api/assignees/4/calc:batch",
+        {"patch": True, "calcs": {"income-tax": {"data": {"salary": 2}}, "deductions": {"data": {"health": 1}, "version": 1}}},
+    ),
+    ("POST", "/api/assignees/9999/calc:batch", {"calcs": {"notes": {"data": {}, "version": 3}}}),
+    ("GET", "/api/assignees/4/calc/deductions", None),
+    ("GET", "/api/assignees/4/overview", None),
+    ("GET", "/api/assignees/4/overview", None),
+    ("GET", "/api/assignees/4/overview?include_inputs=false", None),
+    ("GET", "/api/assignees/9999/overview", None),
+    ("GET", "/api/assignees/4/bundle", None),
+    ("GET", "/api/assignees/4/bundle?include=workpapers,assignee", None),
+    ("GET", "/api/assignees/4/bundle?include=calcs,nope", None),
+    ("GET", "/api/assignees/9999/bundle", None),
+    ("PUT", "/api/assignees/4/calc/deductions", {"data": {"retirement": 6500}}),
+    ("GET", "/api/assignees/4/bundle?include=calcs,overview,workpapers", None),
+    ("GET", "/api/assignees/4/audit?entity=calc/income-tax", None),
+    ("GET", "/api/assignees/4/audit?entity=calc/notes&limit=2", None),
+    ("GET", "/api/assignees/4/audit?entity=workpaper/1&format=ndjson", None),
+    ("GET", "/api/assignees/4/audit?entity=bogus", None),
+    ("GET", "/api/assignees/4/audit/state?entity=calc/notes&as_of=2100-01-01", None),
+    ("GET", "/api/assignees/4/audit/state?entity=workpaper/1&as_of=2100-01-01T00:00:00Z", None),
+    ("GET", "/api/assignees/4/calc/income-tax?as_of=2100-01-01", None),
+    ("GET", "/api/assignees/4/calc/income-tax?as_of=2000-01-01", None),
+    ("GET", "/api/assignees/4/calc/income-tax?as_of=yesterday", None),
+    ("POST", "/api/audit:compact?keep_versions=2&keep_days=0", None),
+    ("GET", "/api/assignees/4/audit?entity=calc/income-tax", None),
+    ("GET", "/api/assignees/4/calc/deductions?as_of=2100-01-01", None),
+    ("POST", "/api/assignees/overview:batch", {"assignee_ids": [1, 4, 999]}),
+    ("GET", "/api/clients/3/assignees/overview", None),
+    ("GET", "/api/home/my-assignees/overview?owner=alice&format=ndjson", None),
+    ("GET", "/api/clients/3/tax-summary", None),
+    ("GET", "/api/home/tax-summary?owner=alice", None),
+    ("GET", "/api/assignees/4/overview?include_inputs=false&jurisdiction=flat&year=2025", None),
+    ("GET", "/api/assignees/4/overview?jurisdiction=nowhere", None),
+    ("GET", "/api/tax/schedules", None),
+    (
+        "POST",
+        "/api/tax/what-if",
+        {
+            "owner": "alice",
+            "scenarios": [
+                {"name": "current"},
+                {"name": "raise", "income_factor": 1.1},
+                {"name": "flat", "jurisdiction": "flat", "extra_deductions": 1000},
+            ],
+        },
+    ),
+    ("POST", "/api/tax/what-if", {"client_id": 1, "scenarios": [{"name": "2024", "year": 2024}]}),
+    ("POST", "/api/tax/what-if", {"scenarios": []}),
+]
+
+
+def normalize(value):
+    """Blank out timestamps and timings, which are the only things allowed to differ between runs."""
+    if isinstance(value, dict):
+        return {
+            k: "<timestamp>" if k.endswith("_at") else "<seconds>" if k == "seconds" else normalize(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+def parity_responses(env: dict) -> list:
+    """Replay PARITY_SCENARIO in this (fresh) process with the given environment."""
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+    from backend import main
+
+    responses = []
+    with TestClient(main.app) as client:
+        for method, path, body, *request_headers in PARITY_SCENARIO:
+            r = client.request(method, path, json=body, headers=request_headers[0] if request_headers else None)
+            if "ndjson" in r.headers.get("content-type", ""):
+                content = [json.loads(line) for line in r.text.splitlines()]
+            else:
+                content = r.json() if r.content else None
+            headers = {k: r.headers[k] for k in ("x-next-after-id", "x-next-cursor") if k in r.headers}
+            if "/calc" in path and "etag" in r.headers:
+                headers["etag"] = r.headers["etag"]  # calculator versions; other ETags hash timestamps
+            responses.append((r.status_code, headers, normalize(content)))
+    return responses
+
+
+def bench_parity(args) -> dict:
+    try:
+        import httpx  # noqa: F401  (TestClient)
+    except ImportError:
+        raise SystemExit("the parity check needs httpx (pip install httpx)")
+    with tempfile.TemporaryDirectory() as tmp:
+        url, server = args.database_url, None
+        if not url:
+            try:
+                import pgserver
+            except ImportError:
+                raise SystemExit("pass --database-url (an empty database) or pip install pgserver")
+            server = pgserver.get_server(os.path.join(tmp, "pg"), cleanup_mode="stop")
+            url = server.get_uri()
+        # Each backend gets its own process: main picks its storage at import time
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            runs = {}
+            for backend, env in (
+                ("sqlite", {"DB_PATH": os.path.join(tmp, "sqlite.db"), "DATABASE_URL": "", "SEED_DEMO_DATA": "true"}),
+                # Lists built as models and validated by FastAPI, as with FAST_JSON off
+                (
+                    "validated",
+                    {"DB_PATH": os.path.join(tmp, "validated.db"), "DATABASE_URL": "", "SEED_DEMO_DATA": "true", "FAST_JSON": "false"},
+                ),
+                ("postgres", {"DB_PATH": os.path.join(tmp, "outbox.db"), "DATABASE_URL": url, "SEED_DEMO_DATA": "true"}),
+            ):
+                with ctx.Pool(1) as pool:
+                    start = time.perf_counter()
+                    runs[backend] = pool.apply(parity_responses, (env,))
+                    print(f"  {backend:9} {len(runs[backend])} calls in {time.perf_counter() - start:.2f}s")
+        finally:
+            if server is not None:
+                server.cleanup()
+    mismatches = []
+    for other in ("validated", "postgres"):
+        for (method, path, *_), expected, actual in zip(PARITY_SCENARIO, runs["sqlite"], runs[other]):
+            if expected != actual:
+                mismatches.append({"call": f"{method} {path}", "sqlite": expected, other: actual})
+                print(f"MISMATCH {method} {path}\n  sqlite:    {expected}\n  {other + ':':10} {actual}")
+    print(f"{2 * len(PARITY_SCENARIO) - len(mismatches)}/{2 * len(PARITY_SCENARIO)} calls identical")
+    if mismatches:
+        raise SystemExit(1)
+    return {"calls": len(PARITY_SCENARIO), "mismatches": mismatches}
+
+
+SERIALIZE_PATHS = (
+    "/api/clients/1/assignees",
+    "/api/clients/1/assignees/overview",
+    "/api/assignees/1/workpapers",
+    "/api/clients/1/assignees?format=ndjson",
+)
+
+
+def serialize_process(env: dict, repeat: int) -> dict:
+    """CPU time per request for SERIALIZE_PATHS in this (fresh) process with the given environment."""
+    os.environ.update(env)
+    from fastapi.testclient import TestClient
+    from backend import main
+
+    results = {}
+    with TestClient(main.app) as client:
+        for path in SERIALIZE_PATHS:
+            client.get(path)
+            samples = []
+            for _ in range(repeat):
+                start = time.process_time()
+                r = client.get(path)
+                samples.append((time.process_time() - start) * 1000)
+            rows = len(r.text.splitlines()) if "ndjson" in path else len(r.json())
+            results[path] = {"rows": rows, "bytes": len(r.content), "sha256": hashlib.sha256(r.content).hexdigest(), **percentiles(samples)}
+    return results
+
+
+def bench_serialize(args) -> dict:
+    """List responses with per-row models and response validation vs rows encoded straight to JSON."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        main = load_app(db_path)
+        conn = main.get_db()
+        conn.execute("INSERT INTO clients (name, owner) VALUES ('Serialize Ltd', 'demo')")
+        conn.executemany(
+            "INSERT INTO assignees (client_id, name, email) VALUES (1, ?, ?)",
+            ((f"Employee {i}", f"e{i}@example.com") for i in range(args.rows)),
+        )
+        conn.executemany(
+            "INSERT INTO workpapers (assignee_id, title, status, notes) VALUES (1, ?, ?, ?)",
+            ((f"Return {i}", rng.choice(WORKPAPER_STATUSES), "checked") for i in range(args.rows)),
+        )
+        conn.executemany(
+            main.INCOME_SCHEMA.upsert_sql(),
+            ((aid, rng.randint(20_000, 250_000), rng.randint(0, 50_000), rng.randint(0, 10_000)) for aid in range(1, args.rows + 1)),
+        )
+        main.refresh_tax_summary(conn)
+        conn.commit()
+        conn.close()
+        ctx = multiprocessing.get_context("spawn")
+        runs = {}
+        for mode, fast in (("validated", "false"), ("fast", "true")):
+            with ctx.Pool(1) as pool:
+                runs[mode] = pool.apply(serialize_process, ({"DB_PATH": db_path, "DATABASE_URL": "", "FAST_JSON": fast}, args.repeat))
+    print(f"rows={args.rows} (CPU ms per request, p50, scaled to 10k rows)")
+    results, mismatches = {}, []
+    for path in SERIALIZE_PATHS:
+        validated, fast = runs["validated"][path], runs["fast"][path]
+        per_10k = {mode: round(runs[mode][path]["p50_ms"] * 10_000 / max(1, runs[mode][path]["rows"]), 2) for mode in runs}
+        saving = 1 - per_10k["fast"] / per_10k["validated"] if per_10k["validated"] else 0
+        results[path] = {"rows": fast["rows"], "cpu_ms_per_10k": per_10k, "saving": round(saving, 3)}
+        print(f"  {path:42} validated {per_10k['validated']:8.1f} ms  fast {per_10k['fast']:8.1f} ms  saving {saving:6.1%}")
+        if validated["sha256"] != fast["sha256"]:
+            mismatches.append(path)
+    for path in mismatches:
+        print(f"MISMATCH  {path}: the two bodies differ")
+    if mismatches:
+        raise SystemExit(1)
+    return results
+
+
+# Run in a fresh interpreter per sample: time to import backend.main, then to
+# run the app's startup and shutdown hooks against an already migrated database.
+STARTUP_PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from backend import main
+imported = time.perf_counter()
+
+async def lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+started = asyncio.run(lifespan())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "loaded": sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+# Imported on first use only; none of them may load just by starting the app.
+# (The email package itself comes in through http.client, which Starlette imports.)
+LAZY_MODULES = ("reportlab", "numpy", "asyncpg", "smtplib", "ahocorasick")
+
+
+def bench_startup(args) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_PATH=os.path.join(tmp, "startup.db"),
+            DATABASE_URL="",
+            AUTO_MIGRATE="false",
+            SEED_DEMO_DATA="false",
+            PYTHONPATH=root,
+        )
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "backend.main", "migrate"], env=env, cwd=root, check=True)
+        migrate_ms = (time.perf_counter() - start) * 1000
+        samples = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE % (LAZY_MODULES,)],
+                env=env, cwd=root, capture_output=True, text=True, check=True,
+            )
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    results = {"migrate_ms": round(migrate_ms, 1)}
+    for key in ("import_ms", "startup_ms"):
+        values = sorted(s[key] for s in samples)
+        results[key] = {"p50": round(statistics.median(values), 1), "max": round(values[-1], 1)}
+    total = statistics.median(s["import_ms"] + s["startup_ms"] for s in samples)
+    results["total_p50_ms"] = round(total, 1)
+    results["eager_imports"] = sorted({m for s in samples for m in s["loaded"]})
+    print(f"  migrate (once per deploy)  {migrate_ms:8.1f} ms")
+    for key in ("import_ms", "startup_ms"):
+        print(f"  {key[:-3]:26} p50 {results[key]['p50']:8.1f} ms  max {results[key]['max']:8.1f} ms")
+    print(f"  total                      p50 {total:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    failures = []
+    if results["eager_imports"]:
+        failures.append(f"imported at startup: {', '.join(results['eager_imports'])}")
+    if args.budget_ms and total > args.budget_ms:
+        failures.append(f"startup p50 {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for f in failures:
+        print(f"FAIL  {f}")
+    if failures:
+        raise SystemExit(1)
+    return results
+
+
+async def drive_server(base_url: str, seconds: float, concurrency: int, values: dict, seed: int, only) -> dict:
+    """Send a mix of LOAD_SCENARIOS requests for `seconds` from `concurrency` connections."""
+    import httpx
+
+    rng = random.Random(seed)
+    scenarios = [s for s in LOAD_SCENARIOS if not only or s[0] in only]
+    latencies, errors = [], 0
+
+    def pick():
+        return {
+            "owner": rng.choice(values["owners"]),
+            "client_id": rng.choice(values["client_ids"]),
+            "assignee_id": rng.choice(values["assignee_ids"]),
+            "prefix": rng.choice(WORDS)[: rng.randint(2, 5)],
+        }
+
+    async def worker(client, deadline):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            _, method, path, body = rng.choice(scenarios)
+            picked = pick()
+            start = time.perf_counter()
+            r = await client.request(method, fill(path, picked), json=fill(body, picked))
+            latencies.append((time.perf_counter() - start) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(worker(client, deadline) for _ in range(concurrency)))
+    return {"errors": errors, "latencies": latencies}
+
+
+def load_process(base_url: str, seconds: float, concurrency: int, values: dict, seed: int, only) -> dict:
+    return asyncio.run(drive_server(base_url, seconds, concurrency, values, seed, only))
+
+
+async def check_coherence(base_url: str, client_ids: List[int], rounds: int, probes: int) -> int:
+    """Reassign a client, then read the cached home overview on fresh connections; returns stale reads.
+
+    Each probe opens its own connection, so the probes land on different
+    workers, all of which cached the owner's overview just before the write.
+    """
+    import httpx
+
+    async def overview(owner):
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            r = await client.get("/api/home/overview", params={"owner": owner})
+            r.raise_for_status()
+            return {c["id"] for c in r.json()["my_clients"]}
+
+    stale = 0
+    for i in range(rounds):
+        owner, client_id = f"coherence{i}", client_ids[i % len(client_ids)]
+        await asyncio.gather(*(overview(owner) for _ in range(probes)))
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            r = await client.post(f"/api/clients/{client_id}/assign", json={"owner": owner})
+            r.raise_for_status()
+        seen = await asyncio.gather(*(overview(owner) for _ in range(probes)))
+        stale += sum(client_id not in ids for ids in seen)
+    return stale
+
+
+def wait_for_server(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"server exited with status {server.returncode}")
+        try:
+            if httpx.get(base_url + "/api/hello", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"server did not answer within {timeout:.0f}s")
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_workers(args) -> dict:
+    try:
+        import httpx  # noqa: F401
+        import uvicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit("the workers benchmark needs httpx and uvicorn (pip install httpx uvicorn)")
+    cpus = os.cpu_count() or 1
+    print(
+        f"clients={args.clients} workers={args.workers} load processes={args.processes}"
+        f" x {args.concurrency} connections, {args.seconds:.0f}s each, {cpus} CPUs"
+    )
+    if max(args.workers) + args.processes > cpus:
+        print(f"  note: {max(args.workers)} workers + {args.processes} load processes exceed {cpus} CPUs; expect less than linear scaling")
+
+    def run(main, rng):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        conn = main.get_db()
+        values = {
+            "owners": owner_names(args.owners),
+            "client_ids": [r[0] for r in conn.execute("SELECT id FROM clients")],
+            "assignee_ids": [r[0] for r in conn.execute("SELECT id FROM assignees")],
+        }
+        conn.close()
+        env = dict(os.environ, DB_PATH=main.DB_PATH, DATABASE_URL="", AUTO_MIGRATE="false", PYTHONPATH=root)
+        env.pop("WEB_CONCURRENCY", None)
+        ctx = multiprocessing.get_context("spawn")
+        results = {}
+        for workers in args.workers:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = subprocess.Popen(
+                [sys.executable, "-m", "backend.main", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+                env=env, cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_server(base_url, server)
+                with ctx.Pool(args.processes) as pool:
+                    # Warm every worker's caches and connections before measuring
+                    pool.starmap(load_process, [(base_url, 1, args.concurrency, values, args.seed + i, args.only) for i in range(args.processes)])
+                    start = time.perf_counter()
+                    runs = pool.starmap(
+                        load_process,
+                        [(base_url, args.seconds, args.concurrency, values, args.seed + i, args.only) for i in range(args.processes)],
+                    )
+                    elapsed = time.perf_counter() - start
+                stale = asyncio.run(check_coherence(base_url, values["client_ids"], args.rounds, 2 * workers))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            latencies = [ms for r in runs for ms in r["latencies"]]
+            r = results[workers] = {
+                "requests": len(latencies),
+                "errors": sum(r["errors"] for r in runs),
+                "rps": round(len(latencies) / elapsed, 1),
+                **percentiles(latencies),
+                "stale_reads": stale,
+            }
+            r["speedup"] = round(r["rps"] / results[args.workers[0]]["rps"], 2)
+            print(
+                f"  {workers:2} workers  {r['rps']:8.1f} req/s  x{r['speedup']:<5}  p50 {r['p50_ms']:7.2f}"
+                f"  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}  stale reads {stale}/{args.rounds * 2 * workers}"
+            )
+        return results
+
+    out = with_seeded_db(args, run)
+    results = out["results"]
+    failures = [f"{w} workers served {r['stale_reads']} stale cached reads" for w, r in results.items() if r["stale_reads"]]
+    best = results[max(args.workers)]["speedup"]
+    if args.min_speedup and best < args.min_speedup:
+        failures.append(f"{max(args.workers)} workers scaled x{best}, below --min-speedup {args.min_speedup}")
+    for f in failures:
+        print(f"FAIL  {f}")
+    if failures:
+        raise SystemExit(1)
+    return out
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except OSError:
+        return ""
+    return out.stdout.strip()
+
+
+def scale_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--db", help="database file to seed/reuse (default: a temporary file)")
+    p.add_argument("--clients", type=int, default=10_000)
+    p.add_argument("--owners", type=int, default=1000)
+    p.add_argument("--tasks-per-client", type=int, default=3)
+    p.add_argument("--assignees-per-client", type=int, default=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.bench")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out", help="write results, parameters and git revision as JSON to this file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="fill a database file with synthetic data")
+    scale_arguments(p)
+    p.set_defaults(func=bench_seed)
+
+    p = sub.add_parser("load", help="concurrent in-process load against every main endpoint")
+    scale_arguments(p)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    p.add_argument("--only", nargs="*", help="scenario names to run (default: all)")
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser("bundle", help="workpaper page loads: separate requests vs the assignee bundle")
+    scale_arguments(p)
+    p.add_argument("--pages", type=int, default=500, help="assignees whose pages are loaded")
+    p.set_defaults(func=bench_bundle)
+
+    p = sub.add_parser("micro", help="compute_score, tax totals and PDF rendering")
+    p.set_defaults(func=bench_micro)
+
+    p = sub.add_parser("search", help="LIKE scan vs FTS5 client search")
+    p.add_argument("--clients", type=int, default=100_000)
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("tax", help="bracket tax over many assignees: Python loop vs NumPy, and what-if scenarios")
+    p.add_argument("--assignees", type=int, default=1_000_000)
+    p.set_defaults(func=bench_tax)
+
+    p = sub.add_parser("calc", help="calculator inputs as JSON text vs typed columns: writes, reads, totals")
+    p.add_argument("--assignees", type=int, default=50_000)
+    p.set_defaults(func=bench_calc)
+
+    p = sub.add_parser("score", help="idea scoring: legacy vs compiled scorer, large tables, batch re-scoring")
+    p.add_argument("--ideas", type=int, default=5000)
+    p.add_argument("--chars", type=int, default=10_000, help="description length")
+    p.add_argument("--keywords", type=int, default=300, help="size of the large weight table")
+    p.set_defaults(func=bench_score)
+
+    p = sub.add_parser("stats", help="dashboard counts: live grouped queries vs trigger-maintained counters")
+    scale_arguments(p)
+    p.add_argument("--writes", type=int, default=20_000, help="task inserts timed with and without the counter triggers")
+    p.set_defaults(func=bench_stats)
+
+    p = sub.add_parser("audit", help="calculator saves with and without the audit log; log size, as-of reads, compaction")
+    p.add_argument("--assignees", type=int, default=10_000)
+    p.add_argument("--saves", type=int, default=1_000_000)
+    p.add_argument("--timed", type=int, default=50_000, help="saves timed with the audit triggers and without")
+    p.add_argument("--days", type=int, default=1095, help="simulated time the saves are spread over")
+    p.add_argument("--queries", type=int, default=2000, help="random as-of reads")
+    p.add_argument("--keep-versions", type=int, default=50)
+    p.add_argument("--keep-days", type=int, default=365)
+    p.set_defaults(func=bench_audit)
+
+    p = sub.add_parser("email", help="outbox worker throughput against a local aiosmtpd sink")
+    p.add_argument("--messages", type=int, default=2000)
+    p.add_argument("--port", type=int, default=8025)
+    p.set_defaults(func=bench_email)
+
+    p = sub.add_parser("serialize", help="list responses: per-row models + response validation vs direct JSON encoding")
+    p.add_argument("--rows", type=int, default=10_000)
+    p.set_defaults(func=bench_serialize)
+
+    p = sub.add_parser("parity", help="replay the same API calls on SQLite and PostgreSQL and diff responses")
+    p.add_argument("--database-url", help="empty PostgreSQL database (default: a temporary pgserver instance)")
+    p.set_defaults(func=bench_parity)
+
+    p = sub.add_parser("startup", help="cold start: import and startup time in fresh processes, lazy imports")
+    p.add_argument("--budget-ms", type=float, default=1500, help="fail if the median import + startup is slower")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("workers", help="throughput of real uvicorn servers as workers are added; cross-worker cache coherence")
+    scale_arguments(p)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    p.add_argument("--processes", type=int, default=2, help="load generator processes")
+    p.add_argument("--concurrency", type=int, default=16, help="connections per load process")
+    p.add_argument("--seconds", type=float, default=10, help="measured seconds per worker count")
+    p.add_argument("--rounds", type=int, default=20, help="write-then-read coherence rounds")
+    p.add_argument("--only", nargs="*", help="scenario names to mix (default: all)")
+    p.add_argument("--min-speedup", type=float, default=0, help="fail if the most workers scale less than this")
+    p.set_defaults(func=bench_workers)
+
+    args = parser.parse_args(argv)
+    results = args.func(args)
+    if args.out:
+        params = {k: v for k, v in vars(args).items() if k not in ("func", "out")}
+        record = {
+            "command": args.command,
+            "params": params,
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
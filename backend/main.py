@@ -1,24 +1,332 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-import os
-import sqlite3
-from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+import anyio
+import asyncio
 import base64
+import contextvars
+import csv
+import datetime
+import functools
+import hashlib
+import importlib
+import importlib.util
 import io
-import smtplib
-from email.message import EmailMessage
+import json
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Literal, NamedTuple, Optional, Tuple
 
-try:
-    from reportlab.lib.pagesizes import LETTER
-    from reportlab.pdfgen import canvas
-    REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
+from . import tax
+from .tax import Portfolio, TaxSchedule, load_tax_schedules
+
+# Optional dependencies are imported on first use (optional_module) so a worker
+# only pays for reportlab, numpy or asyncpg if it renders a PDF, runs a what-if
+# or talks to PostgreSQL; the SMTP and email modules are likewise imported where used.
+REPORTLAB_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name: str):
+    """The imported module, or None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get("DB_PATH", os.path.join(os.path.dirname(__file__), "data.db"))
+# postgresql://... selects the PostgreSQL storage backend; otherwise SQLite at DB_PATH
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_STATEMENT_CACHE = int(os.environ.get("DB_STATEMENT_CACHE", "256"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+# Seconds a connection waits for another process's write lock, then retries of a busy call (with backoff)
+DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", "5"))
+DB_BUSY_RETRIES = int(os.environ.get("DB_BUSY_RETRIES", "3"))
+# Reader threads for async handlers; the single writer thread takes one more pooled connection
+DB_READERS = int(os.environ.get("DB_READERS", "0")) or max(1, DB_POOL_SIZE - 1)
+# Streamed responses (NDJSON listings, bulk exports) hold a connection until the client has read
+# the body, so they get connections of their own and cannot starve the readers and the writer
+DB_STREAMS = int(os.environ.get("DB_STREAMS", "4"))
+# Threads Starlette may use for the remaining sync work (streamed bodies, bulk import parsing)
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", "40"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "30"))
+# Worker processes serving the app (uvicorn and gunicorn read it too); above 1 the worker bus is on
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+# Files (.seq, .log) the workers share cache invalidations and change events through
+WORKER_BUS_PATH = os.environ.get("WORKER_BUS_PATH", "") or DB_PATH + "-bus"
+WORKER_BUS_POLL = float(os.environ.get("WORKER_BUS_POLL", "0.05"))
+WORKER_BUS_LOG_BYTES = int(os.environ.get("WORKER_BUS_LOG_BYTES", str(1024 * 1024)))
+# Render processes per worker: the CPUs are shared between the workers
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "0")) or max(1, min(4, (os.cpu_count() or 1) // WEB_CONCURRENCY))
+PDF_BATCH_MAX = int(os.environ.get("PDF_BATCH_MAX", "500"))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "5000"))
+BULK_MAX_ERRORS = int(os.environ.get("BULK_MAX_ERRORS", "1000"))
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "0"))
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_PER_CONNECTION = int(os.environ.get("EMAIL_MAX_PER_CONNECTION", "100"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE = int(os.environ.get("EMAIL_RETRY_BASE", "30"))
+EMAIL_POLL_INTERVAL = float(os.environ.get("EMAIL_POLL_INTERVAL", "5"))
+# Seconds a claimed message stays with its worker before another worker may requeue it
+EMAIL_CLAIM_TIMEOUT = int(os.environ.get("EMAIL_CLAIM_TIMEOUT", "600"))
+# JSON {jurisdiction: {year: [[threshold, rate], ...]}} replacing the built-in bracket tables
+TAX_BRACKETS_FILE = os.environ.get("TAX_BRACKETS_FILE", "")
+# JSON {"weights": {keyword: points}, "length_step": 50, "length_cap": 6} replacing the idea scoring table
+IDEA_SCORE_FILE = os.environ.get("IDEA_SCORE_FILE", "")
+# Bracket table used for stored estimates (tax_summary) and as the what-if default
+TAX_JURISDICTION = os.environ.get("TAX_JURISDICTION", "us-federal")
+TAX_YEAR = int(os.environ.get("TAX_YEAR", "2025"))
+# Change feed: events a subscriber may fall behind by, events kept for Last-Event-ID resume, keepalive seconds
+CHANGE_QUEUE_SIZE = int(os.environ.get("CHANGE_QUEUE_SIZE", "256"))
+CHANGE_HISTORY = int(os.environ.get("CHANGE_HISTORY", "1000"))
+CHANGE_HEARTBEAT = float(os.environ.get("CHANGE_HEARTBEAT", "15"))
+# Apply pending migrations at startup; set to false when `python -m backend.main migrate` runs once per deploy
+AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "true").lower() == "true"
+# Fill an empty database with the demo clients, tasks and assignees at startup
+SEED_DEMO_DATA = os.environ.get("SEED_DEMO_DATA", "false").lower() == "true"
+# List endpoints encode database rows straight to JSON (orjson when installed), without per-row models
+FAST_JSON = os.environ.get("FAST_JSON", "true").lower() == "true"
+# Audit log retention, applied by compact-audit: entries kept per calculator or workpaper, and days of history (0: no limit)
+AUDIT_KEEP_VERSIONS = int(os.environ.get("AUDIT_KEEP_VERSIONS", "500"))
+AUDIT_KEEP_DAYS = int(os.environ.get("AUDIT_KEEP_DAYS", "730"))
+
+
+# --------- Metrics ---------
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labelnames, buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labels, series in items:
+            base = format_labels(self.labelnames, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {series[-2]}')
+            plain = f"{{{base.rstrip(',')}}}" if base else ""
+            lines.append(f"{self.name}_count{plain} {series[-2]}")
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{format_labels(self.labelnames, labels).rstrip(',')}}} {value}")
+        return lines
+
+
+def format_labels(names, values) -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "".join(f'{n}="{esc(v)}",' for n, v in zip(names, values))
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route"), LATENCY_BUCKETS
+)
+http_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements issued per HTTP request.", ("route",), QUERY_COUNT_BUCKETS
+)
+http_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQLite per HTTP request.", ("route",), LATENCY_BUCKETS
+)
+db_query_seconds = Histogram(
+    "db_query_duration_seconds", "Duration of individual SQL statement calls.", (), LATENCY_BUCKETS
+)
+http_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+# [query count, seconds in SQLite] for the request being served; the list is
+# shared by reference with the DB threads that run the request's queries.
+_request_sql = contextvars.ContextVar("request_sql", default=None)
+
+
+def record_query(sql: str, seconds: float) -> None:
+    db_query_seconds.observe((), seconds)
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        logger.warning("slow query (%.1f ms): %s", seconds * 1000, " ".join(sql.split()))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute/fetch calls and attributes them to the current request."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            # Rows are stepped lazily, so fetch time belongs to the query but is not a new statement
+            elapsed = time.perf_counter() - start
+            stats = _request_sql.get()
+            if stats is not None:
+                stats[1] += elapsed
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute does not go through cursor(), so route it explicitly
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
 
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status, in-flight and SQL usage."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global http_in_flight
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        sql_stats = [0, 0.0]
+        token = _request_sql.set(sql_stats)
+        with _in_flight_lock:
+            http_in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            with _in_flight_lock:
+                http_in_flight -= 1
+            _request_sql.reset(token)
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc((method, route, str(status["code"])))
+            http_latency.observe((method, route), elapsed)
+            http_db_queries.observe((route,), sql_stats[0])
+            http_db_seconds.observe((route,), sql_stats[1])
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (http_requests, http_latency, http_db_queries, http_db_seconds, db_query_seconds):
+        lines.extend(metric.render())
+    lines += ["# HELP http_requests_in_flight HTTP requests being served.",
+              "# TYPE http_requests_in_flight gauge",
+              f"http_requests_in_flight {http_in_flight}"]
+    for name, value in storage.stats().items():
+        lines.append(f"db_pool_{name} {value}")
+    for name, value in response_cache.stats().items():
+        lines.append(f"response_cache_{name} {value}")
+    for name, value in change_broker.stats().items():
+        lines.append(f"change_feed_{name} {value}")
+    if worker_bus is not None:
+        for name, value in worker_bus.stats().items():
+            lines.append(f"worker_bus_{name} {value}")
+    return "\n".join(lines) + "\n"
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "data.db")
 
 app = FastAPI()
 
@@ -29,10 +337,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets a cross-origin frontend read download filenames
+    expose_headers=["Content-Disposition"],
 )
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/api/hello")
-def hello():
+async def hello():
     return {"message": "Hello from FastAPI!"}
 
 
@@ -52,653 +363,5315 @@ class Idea(BaseModel):
 
 
 def get_db():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        timeout=DB_BUSY_TIMEOUT,
+        cached_statements=DB_STATEMENT_CACHE,
+        factory=InstrumentedConnection,
+    )
+    # Per-connection settings; pooled connections pay for these only once
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    return conn
 
 
-def init_db():
-    conn = get_db()
-    try:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS ideas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL DEFAULT "",
-                score INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        # Clients and tasks for homepage overview
-        conn.execute(
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Fixed-size pool of configured SQLite connections, opened lazily."""
+
+    def __init__(self, factory, size: int, timeout: float):
+        self._factory = factory
+        self._size = max(1, size)
+        self._timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open_or_wait()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _open_or_wait(self) -> sqlite3.Connection:
+        with self._lock:
+            can_open = self._created < self._size
+            if can_open:
+                self._created += 1
+            else:
+                self._waits += 1
+        if can_open:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"no database connection available within {self._timeout}s")
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it so the next acquire opens a fresh one
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self._size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired_total": self._acquired,
+                "waits_total": self._waits,
+                "timeouts_total": self._timeouts,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+            }
+
+
+db_pool = ConnectionPool(get_db, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+stream_pool = ConnectionPool(get_db, DB_STREAMS, DB_POOL_TIMEOUT)
+
+
+class Database:
+    """Runs blocking SQLite work for async handlers off the event loop.
+
+    ``read(fn, *args)`` calls ``fn(conn, *args)`` on one of DB_READERS
+    threads; ``write`` queues it on a single writer thread, so a worker's
+    writers never contend for SQLite's write lock. Each call borrows a
+    connection from ``db_pool`` and sees the caller's context variables
+    (request metrics).
+
+    Other worker processes still do: a connection waits DB_BUSY_TIMEOUT for
+    the lock, and a call that fails with "database is locked" anyway (the
+    wait ran out, or a read snapshot went stale) is rolled back and run
+    again up to ``retries`` times with jittered backoff, then answered with
+    503. Functions passed in must therefore only touch the database.
+    """
+
+    def __init__(self, pool: ConnectionPool, readers: int, retries: int):
+        self._pool = pool
+        self._readers = max(1, readers)
+        self._retries = max(0, retries)
+        self._executors = None
+        self._lock = threading.Lock()
+        self._pending = {"read": 0, "write": 0}
+        self._busy_retries = 0
+        self._busy_failures = 0
+
+    def _executor(self, lane: str) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executors is None:
+                self._executors = {
+                    "read": ThreadPoolExecutor(self._readers, thread_name_prefix="db-read"),
+                    "write": ThreadPoolExecutor(1, thread_name_prefix="db-write"),
+                }
+            return self._executors[lane]
+
+    def _call(self, fn, args):
+        attempt = 0
+        while True:
+            try:
+                with self._pool.connection() as conn:
+                    return fn(conn, *args)
+            except PoolTimeout as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    raise
+                if attempt >= self._retries:
+                    with self._lock:
+                        self._busy_failures += 1
+                    raise HTTPException(status_code=503, detail="Database is busy", headers={"Retry-After": "1"})
+            with self._lock:
+                self._busy_retries += 1
+            # The pool rolled the transaction back on release; wait out the other writer
+            time.sleep(0.01 * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    async def _submit(self, lane: str, fn, args):
+        executor = self._executor(lane)
+        ctx = contextvars.copy_context()
+        with self._lock:
+            self._pending[lane] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, ctx.run, self._call, fn, args)
+        finally:
+            with self._lock:
+                self._pending[lane] -= 1
+
+    async def read(self, fn, *args):
+        return await self._submit("read", fn, args)
+
+    async def write(self, fn, *args):
+        return await self._submit("write", fn, args)
+
+    def close(self) -> None:
+        with self._lock:
+            executors, self._executors = self._executors, None
+        for executor in (executors or {}).values():
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "readers": self._readers,
+                "read_pending": self._pending["read"],
+                "write_pending": self._pending["write"],
+                "busy_retries_total": self._busy_retries,
+                "busy_failures_total": self._busy_failures,
+            }
+
+
+def is_busy_error(e: sqlite3.OperationalError) -> bool:
+    """SQLITE_BUSY / SQLITE_LOCKED: another connection holds the lock, the statement itself was fine."""
+    return str(e).startswith(("database is locked", "database table is locked"))
+
+
+db = Database(db_pool, DB_READERS, DB_BUSY_RETRIES)
+
+
+# Versioned schema changes on top of the base tables (create_base_schema()).
+# Applied in order, each in its own transaction, tracked in PRAGMA user_version.
+# A step is either a SQL statement or a callable taking the connection.
+MIGRATIONS = [
+    (
+        1,
+        "indexes for hot lookup paths",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_clients_owner_name ON clients(owner, name)",
+            "CREATE INDEX IF NOT EXISTS idx_tasks_client_status ON tasks(client_id, status)",
+            "CREATE INDEX IF NOT EXISTS idx_tasks_awaiting ON tasks(client_id) WHERE status = 'awaiting'",
+            "CREATE INDEX IF NOT EXISTS idx_assignees_client_name ON assignees(client_id, name)",
+            "CREATE INDEX IF NOT EXISTS idx_workpapers_assignee ON workpapers(assignee_id, id)",
+        ],
+    ),
+    (
+        2,
+        "full-text index on client names",
+        [
             """
-            CREATE TABLE IF NOT EXISTS clients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                owner TEXT NOT NULL DEFAULT '',
-                created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                name, content='clients', content_rowid='id', prefix='1 2 3'
+            )
+            """,
             """
-        )
-        conn.execute(
+            CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+                INSERT INTO clients_fts(rowid, name) VALUES (new.id, new.name);
+            END
+            """,
             """
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'awaiting', -- awaiting | in_progress | done
-                due_date TEXT,
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            );
+            CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+                INSERT INTO clients_fts(clients_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END
+            """,
             """
-        )
-        # Assignees (client employees) and workpapers (tracked per assignee)
-        conn.execute(
+            CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF name ON clients BEGIN
+                INSERT INTO clients_fts(clients_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO clients_fts(rowid, name) VALUES (new.id, new.name);
+            END
+            """,
+            "INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')",
+            "CREATE INDEX IF NOT EXISTS idx_clients_name_nocase ON clients(name COLLATE NOCASE)",
+        ],
+    ),
+    (
+        3,
+        "materialized per-assignee tax summary",
+        [
             """
-            CREATE TABLE IF NOT EXISTS assignees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS tax_summary (
+                assignee_id INTEGER PRIMARY KEY,
                 client_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                email TEXT NOT NULL DEFAULT '',
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
-                FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS workpapers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                assignee_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                status TEXT NOT NULL DEFAULT 'draft', -- draft | review | final
-                notes TEXT NOT NULL DEFAULT '',
-                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                income_total REAL NOT NULL DEFAULT 0,
+                deductions_total REAL NOT NULL DEFAULT 0,
+                taxable_income REAL NOT NULL DEFAULT 0,
+                estimated_tax REAL NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL DEFAULT (datetime('now')),
                 FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
-            );
-            """
-        )
-        # Calculator persisted data per assignee and calculator key
-        conn.execute(
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_tax_summary_client ON tax_summary(client_id)",
+            # Filled by step 6: refresh_tax_summary reads the typed calculator
+            # tables, which a file at this version does not have yet.
+        ],
+    ),
+    (
+        4,
+        "durable outbound email queue",
+        [
             """
-            CREATE TABLE IF NOT EXISTS calculator_data (
+            CREATE TABLE IF NOT EXISTS email_outbox (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                assignee_id INTEGER NOT NULL,
-                calc_key TEXT NOT NULL,
-                data TEXT NOT NULL DEFAULT '{}',
-                updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-                UNIQUE(assignee_id, calc_key),
-                FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
-            );
+                from_addr TEXT NOT NULL,
+                to_addrs TEXT NOT NULL, -- JSON array
+                subject TEXT NOT NULL DEFAULT '',
+                message BLOB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued', -- queued | sending | sent | failed
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                sent_at TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(next_attempt_at) WHERE status = 'queued'",
+        ],
+    ),
+    (
+        5,
+        "settings derived data depends on",
+        [
             """
-        )
-        conn.commit()
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        6,
+        "typed columns for registered calculators",
+        [
+            lambda conn: migrate_calculator_data(conn),
+            lambda conn: refresh_tax_summary(conn),
+        ],
+    ),
+    (
+        7,
+        "row versions on calculator data",
+        [lambda conn: add_calc_versions(conn)],
+    ),
+    (
+        8,
+        "trigger-maintained status counters for dashboard stats",
+        [lambda conn: add_stat_counters(conn)],
+    ),
+    (
+        9,
+        "append-only audit log of calculator and workpaper changes",
+        [lambda conn: add_audit_log(conn)],
+    ),
+    (
+        10,
+        "audit entries for every calculator version, kept when an assignee is deleted",
+        [lambda conn: rebuild_audit_log(conn)],
+    ),
+    (
+        11,
+        "expired outbox claims found by index",
+        [
+            # Every worker (and, on PostgreSQL, every host) requeues expired claims when it starts sending
+            "CREATE INDEX IF NOT EXISTS idx_email_outbox_claimed ON email_outbox(next_attempt_at) WHERE status = 'sending'",
+        ],
+    ),
+]
 
-        # Seed sample data if empty
-        cur = conn.execute("SELECT COUNT(*) FROM clients")
-        (count_clients,) = cur.fetchone()
-        if count_clients == 0:
-            sample_clients = [
-                ("Contoso Ltd", "demo"),
-                ("Fabrikam Inc", "demo"),
-                ("Northwind Traders", ""),
-                ("Adventure Works", ""),
-                ("Globex Corp", "demo"),
-            ]
-            conn.executemany("INSERT INTO clients (name, owner) VALUES (?, ?)", sample_clients)
-            conn.commit()
 
-            # Map names to ids
-            rows = conn.execute("SELECT id, name FROM clients").fetchall()
-            id_by_name = {name: cid for cid, name in rows}
+SCHEMA_VERSION = MIGRATIONS[-1][0]
 
-            sample_tasks = [
-                (id_by_name["Contoso Ltd"], "Security review", "awaiting"),
-                (id_by_name["Contoso Ltd"], "Q2 roadmap sync", "in_progress"),
-                (id_by_name["Fabrikam Inc"], "Cost optimization plan", "awaiting"),
-                (id_by_name["Globex Corp"], "Performance tuning", "done"),
-                (id_by_name["Northwind Traders"], "Kickoff meeting", "awaiting"),
-            ]
-            conn.executemany(
-                "INSERT INTO tasks (client_id, title, status) VALUES (?, ?, ?)", sample_tasks
-            )
-            conn.commit()
 
-        cur = conn.execute("SELECT COUNT(*) FROM assignees")
-        (count_assignees,) = cur.fetchone()
-        if count_assignees == 0:
-            # Create one sample assignee per first 3 clients
-            clients = conn.execute("SELECT id, name FROM clients ORDER BY id LIMIT 3").fetchall()
-            assignees = []
-            for cid, cname in clients:
-                assignees.append((cid, f"{cname.split()[0]} Employee", f"employee@{cname.split()[0].lower()}.example"))
-            conn.executemany(
-                "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)", assignees
-            )
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def schema_behind(version: int) -> RuntimeError:
+    return RuntimeError(
+        f"database schema is at version {version}, this build needs {SCHEMA_VERSION}: "
+        "run `python -m backend.main migrate` (or set AUTO_MIGRATE=true)"
+    )
+
+
+def run_migrations(conn) -> List[int]:
+    applied = []
+    current = schema_version(conn)
+    for version, _name, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for stmt in statements:
+                if callable(stmt):
+                    stmt(conn)
+                else:
+                    conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {version}")
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+class WorkerBus:
+    """Broadcast between the worker processes of one host (WEB_CONCURRENCY > 1).
+
+    Messages are JSON lines appended to ``{path}.log``. ``{path}.seq`` holds
+    the last sequence number, the log's epoch and the sequence number it
+    was last truncated at; every worker maps it, so ``sync()`` costs one
+    small read when nothing is new. Publishers hold an exclusive flock on
+    it, readers a shared one. Once the log passes ``max_bytes`` the next
+    publisher truncates it; a worker that had not read that far gets a
+    ``reset`` message instead of the lost ones, as does every worker when it
+    first joins. ``sync()`` hands messages to the handlers as
+    ``handler(message, local)``, ``local`` meaning this worker published it.
+    """
+
+    HEADER = struct.Struct("<QQQ")  # seq, epoch, seq at the last truncation
+
+    def __init__(self, path: str, max_bytes: int):
+        self._path = path
+        self._max_bytes = max(4096, max_bytes)
+        self._lock = threading.Lock()
+        self._handlers = []
+        self._header = None  # mmap of the .seq file, opened on first use
+        self._seq_fd = self._log_fd = None
+        self._pid = 0
+        self._seen = self._epoch = self._offset = 0
+        self._joined = None
+        self.published = 0
+        self.received = 0
+        self.resets = 0
+
+    def add_handler(self, handler) -> None:
+        self._handlers.append(handler)
+
+    @contextmanager
+    def _flock(self, shared: bool):
+        fcntl = optional_module("fcntl")
+        fcntl.flock(self._seq_fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._seq_fd, fcntl.LOCK_UN)
+
+    def _open(self) -> None:
+        if self._header is not None:
+            return
+        if optional_module("fcntl") is None:
+            raise RuntimeError("several workers (WEB_CONCURRENCY > 1) need fcntl file locks")
+        self._seq_fd = os.open(self._path + ".seq", os.O_RDWR | os.O_CREAT, 0o644)
+        self._log_fd = os.open(self._path + ".log", os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        with self._flock(shared=False):
+            if os.fstat(self._seq_fd).st_size < self.HEADER.size:
+                os.ftruncate(self._seq_fd, self.HEADER.size)
+            self._header = mmap.mmap(self._seq_fd, self.HEADER.size)
+            self._seen, self._epoch, _ = self.HEADER.unpack_from(self._header)
+            self._offset = os.fstat(self._log_fd).st_size
+        self._pid = os.getpid()
+        # Whatever was published before this worker joined is unknown to it
+        self._joined = self._seen
+
+    def publish(self, message: dict) -> int:
+        """Append ``message`` for every worker; returns its sequence number. Thread-safe."""
+        with self._lock:
+            self._open()
+            with self._flock(shared=False):
+                seq, epoch, truncated_at = self.HEADER.unpack_from(self._header)
+                if os.fstat(self._log_fd).st_size > self._max_bytes:
+                    os.ftruncate(self._log_fd, 0)
+                    epoch, truncated_at = epoch + 1, seq
+                seq += 1
+                line = json.dumps({**message, "seq": seq, "pid": self._pid}, separators=(",", ":"))
+                os.write(self._log_fd, line.encode() + b"\n")
+                self.HEADER.pack_into(self._header, 0, seq, epoch, truncated_at)
+            self.published += 1
+            return seq
+
+    def sync(self) -> None:
+        """Hand what was published since the last call, by any worker, to the handlers. Event loop only."""
+        with self._lock:
+            self._open()
+            messages = []
+            if self._joined is not None:
+                messages.append({"reset": True, "seq": self._joined})
+                self._joined = None
+            seq, epoch, _ = self.HEADER.unpack_from(self._header)
+            if seq != self._seen or epoch != self._epoch:
+                with self._flock(shared=True):
+                    seq, epoch, truncated_at = self.HEADER.unpack_from(self._header)
+                    if epoch != self._epoch:
+                        if self._seen < truncated_at:
+                            messages.append({"reset": True, "seq": truncated_at})
+                            self.resets += 1
+                        self._epoch, self._offset = epoch, 0
+                    size = os.fstat(self._log_fd).st_size
+                    data = os.pread(self._log_fd, size - self._offset, self._offset) if size > self._offset else b""
+                    self._offset += len(data)
+                for line in data.splitlines():
+                    message = json.loads(line)
+                    if message["seq"] > self._seen:
+                        messages.append(message)
+                        self.received += 1
+                self._seen = seq
+        for message in messages:
+            local = message.get("pid") == self._pid
+            for handler in self._handlers:
+                try:
+                    handler(message, local)
+                except Exception:
+                    logger.exception("worker bus handler failed")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._header is None:
+                return
+            self._header.close()
+            os.close(self._seq_fd)
+            os.close(self._log_fd)
+            self._header = None
+
+    def stats(self) -> dict:
+        return {
+            "seq": self._seen,
+            "published_total": self.published,
+            "received_total": self.received,
+            "resets_total": self.resets,
+        }
+
+
+worker_bus = WorkerBus(WORKER_BUS_PATH, WORKER_BUS_LOG_BYTES) if WEB_CONCURRENCY > 1 else None
+
+
+class ResponseCache:
+    """TTL + LRU cache of serialized JSON responses, invalidated by tag.
+
+    Write handlers call ``invalidate()`` with the tags their change affects.
+    Every invalidation bumps a generation counter, and ``put()`` drops
+    bodies computed under an older generation so a read racing a write
+    cannot re-cache stale data. With a ``bus``, invalidations are also
+    published to the other workers, which apply them on their next sync.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, bus: Optional[WorkerBus] = None):
+        self._max = max(1, max_entries)
+        self._ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, etag, body, tags)
+        self._lock = threading.Lock()
+        self._bus = bus
+        if bus is not None:
+            bus.add_handler(self._on_bus)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body: bytes, tags, generation: int) -> str:
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self._lock:
+            if generation != self.generation:
+                return etag
+            self._entries[key] = (time.monotonic() + self._ttl, etag, body, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return etag
+
+    def invalidate(self, *tags) -> None:
+        self._drop(frozenset(tags))
+        if self._bus is not None:
+            self._bus.publish({"cache": sorted(tags)})
+
+    def clear(self) -> None:
+        self._drop(None)
+        if self._bus is not None:
+            self._bus.publish({"cache": None})
+
+    def _drop(self, tags) -> None:
+        with self._lock:
+            self.generation += 1
+            if tags is None:
+                self._entries.clear()
+                return
+            stale = [k for k, e in self._entries.items() if e[3] & tags]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def _on_bus(self, message: dict, local: bool) -> None:
+        if message.get("reset"):
+            self._drop(None)
+        elif "cache" in message and not local:
+            tags = message["cache"]
+            self._drop(None if tags is None else frozenset(tags))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max,
+                "ttl_seconds": self._ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, worker_bus)
+
+
+class Subscription:
+    def __init__(self, topics, queue_size: int):
+        self.topics = frozenset(topics)
+        self.queue = asyncio.Queue(queue_size)
+
+
+class ChangeBroker:
+    """In-process pub/sub of change events, fanned out by topic.
+
+    Topics are ``assignee:{id}``, ``client:{id}`` and ``owner:{name}``. Write
+    handlers publish after their transaction commits. A subscriber that
+    falls ``queue_size`` events behind has its backlog replaced by a single
+    ``resync`` event (re-fetch instead of applying deltas), so a slow
+    client never holds up a writer. The last ``history`` events are kept
+    for clients resuming with Last-Event-ID. Only used from the event loop.
+
+    With a ``bus`` every event goes through it, so subscribers on any worker
+    see it, and event ids are the bus sequence numbers, the same on every
+    worker (with gaps where the bus carried other messages).
+    """
+
+    def __init__(self, queue_size: int, history: int, bus: Optional[WorkerBus] = None):
+        self._queue_size = max(1, queue_size)
+        self._topics = {}  # topic -> set of Subscription
+        self._history = deque(maxlen=max(1, history))  # (event, topics)
+        self._floor = 0  # events up to this id are no longer (or never were) in _history
+        self._bus = bus
+        if bus is not None:
+            bus.add_handler(self._on_bus)
+        self.subscribers = 0
+        self.last_id = 0
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    @property
+    def active(self) -> bool:
+        """Whether an event could reach anyone: a subscriber here, or on another worker."""
+        return self._bus is not None or self.subscribers > 0
+
+    def listening(self, topics) -> bool:
+        return self._bus is not None or any(t in self._topics for t in topics)
+
+    def subscribe(self, topics) -> Subscription:
+        if self._bus is not None:
+            # Catch up first, so a replay right after does not repeat what sync delivers
+            self._bus.sync()
+        sub = Subscription(topics, self._queue_size)
+        for t in sub.topics:
+            self._topics.setdefault(t, set()).add(sub)
+        self.subscribers += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for t in sub.topics:
+            subs = self._topics.get(t)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._topics[t]
+        self.subscribers -= 1
+
+    def publish(self, type: str, topics, **payload) -> None:
+        self.published += 1
+        if self._bus is not None:
+            self._bus.publish({"event": {"type": type, **payload}, "topics": sorted(topics)})
+            self._bus.sync()
+            return
+        self.last_id += 1
+        self._dispatch({"id": self.last_id, "type": type, **payload}, frozenset(topics))
+
+    def _dispatch(self, event: dict, topics: frozenset) -> None:
+        if len(self._history) == self._history.maxlen:
+            self._floor = self._history[0][0]["id"]
+        self._history.append((event, topics))
+        targets = set()
+        for t in topics:
+            targets.update(self._topics.get(t, ()))
+        for sub in targets:
+            self._deliver(sub, event)
+
+    def _on_bus(self, message: dict, local: bool) -> None:
+        if message.get("reset"):
+            # Events up to here were missed: nothing before it can be replayed
+            self._history.clear()
+            self._floor = self.last_id = max(self.last_id, message["seq"])
+            for sub in {sub for subs in self._topics.values() for sub in subs}:
+                self._resync(sub)
+        elif "event" in message:
+            self.last_id = message["seq"]
+            self._dispatch({"id": message["seq"], **message["event"]}, frozenset(message["topics"]))
+
+    def replay(self, sub: Subscription, last_id: int) -> None:
+        """Queue the missed events after ``last_id`` for ``sub``, or a resync if some were evicted."""
+        if last_id >= self.last_id:
+            return
+        if last_id < self._floor:
+            self._resync(sub)
+            return
+        for event, topics in self._history:
+            if event["id"] > last_id and topics & sub.topics:
+                self._deliver(sub, event)
+
+    def _deliver(self, sub: Subscription, event: dict) -> None:
+        try:
+            sub.queue.put_nowait(event)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            self._resync(sub)
+
+    def _resync(self, sub: Subscription) -> None:
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait({"id": self.last_id, "type": "resync"})
+        self.resyncs += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "published_total": self.published,
+            "delivered_total": self.delivered,
+            "resyncs_total": self.resyncs,
+        }
+
+
+change_broker = ChangeBroker(CHANGE_QUEUE_SIZE, CHANGE_HISTORY, worker_bus)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def json_body(value) -> bytes:
+    """Compact JSON for dicts, lists and models; orjson under FAST_JSON when installed."""
+    orjson = optional_module("orjson") if FAST_JSON else None
+    if orjson is not None:
+        # Models and anything else orjson does not know go through FastAPI's encoder
+        return orjson.dumps(value, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    # UTF-8 rather than \u escapes, as orjson and FastAPI's JSONResponse write it
+    return json.dumps(jsonable_encoder(value), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return json_body(content)
+
+
+def list_item(model, to_model):
+    """Row converter for list endpoints: ``to_model``, or under FAST_JSON a plain dict.
+
+    The dict maps the model's fields to the row's columns in order. The rows
+    come from our own tables, so skipping the model (and FastAPI's second
+    validation against ``response_model``) leaves the output unchanged.
+    FAST_JSON is checked per row, so tests can compare both paths in one process.
+    """
+    fields = tuple(model.model_fields)
+    return lambda row: dict(zip(fields, row)) if FAST_JSON else to_model(row)
+
+
+def list_response(response: Response, items):
+    """What a list handler returns: the items (validated by FastAPI) or, under FAST_JSON, the encoded body.
+
+    Headers set on ``response`` (``X-Next-After-Id``) are carried over;
+    streamed NDJSON responses pass through.
+    """
+    if not FAST_JSON or isinstance(items, Response):
+        return items
+    return FastJSONResponse(items, headers=dict(response.headers))
+
+
+async def cached_json(request: Request, key, tags, produce) -> Response:
+    """Serve ``await produce()`` as JSON through the response cache, honouring If-None-Match."""
+    if worker_bus is not None:
+        # Writes other workers finished before this request must not be served stale
+        worker_bus.sync()
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        # Serialized off the event loop: cached bodies are the large ones
+        body = await run_in_threadpool(json_body, await produce())
+        etag = response_cache.put(key, body, tags, generation)
+    else:
+        _, etag, body, _ = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class Page:
+    """Query parameters shared by list endpoints: keyset cursor, page size, output format."""
+
+    def __init__(
+        self,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = Query(None, ge=1, le=1000),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+    ):
+        self.after_id = after_id
+        self.limit = limit
+        self.format = format
+
+
+class ListQuery(NamedTuple):
+    """A list endpoint's query, completed per page by ``page_query``.
+
+    ``where`` holds the fixed filters, one ``?`` each; ``keyset`` is the
+    clause selecting rows after ``page.after_id`` in ``order``.
+    """
+
+    select: str
+    where: Tuple[str, ...]
+    keyset: str
+    order: str
+
+
+def page_query(page: Page, query: ListQuery, params: list):
+    """SQL and parameters for one page of ``query``.
+
+    JSON pages fetch one extra row to tell whether more remain.
+    """
+    clauses = list(query.where)
+    args = list(params)
+    if page.after_id is not None:
+        clauses.append(query.keyset)
+        args.append(page.after_id)
+    sql = query.select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + query.order
+    if page.limit is not None:
+        sql += " LIMIT ?"
+        args.append(page.limit + (0 if page.format == "ndjson" else 1))
+    return sql, args
+
+
+def page_items(response: Response, page: Page, rows, to_item):
+    """Trim the extra row and put the next ``after_id`` in the ``X-Next-After-Id`` header."""
+    if page.limit is not None and len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers["X-Next-After-Id"] = str(rows[-1][0])
+    return [to_item(r) for r in rows]
+
+
+def list_rows(conn, response: Response, page: Page, query: ListQuery, params: list, to_item):
+    """Run a JSON list query on SQLite with optional keyset pagination (see ``page_query``)."""
+    sql, args = page_query(page, query, params)
+    return page_items(response, page, conn.execute(sql, args).fetchall(), to_item)
+
+
+NDJSON_BATCH = 500
+
+
+def stream_rows(sql: str, params, batch: int):
+    """Batches of ``sql``'s rows from a ``stream_pool`` connection, held until the last batch is read."""
+    try:
+        conn = stream_pool.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        cur = conn.execute(sql, params)
+        while rows := cur.fetchmany(batch):
+            yield rows
     finally:
-        conn.close()
+        stream_pool.release(conn)
 
 
-def compute_score(text: str) -> int:
-    text_l = text.lower()
-    score = 0
-    # Simple keyword weights for demo purposes
-    weights = {
-        "risk": 5,
-        "impact": 4,
-        "cost": 3,
-        "urgent": 6,
-        "security": 5,
-        "performance": 4,
-        "reliability": 4,
-        "innovation": 3,
-    }
-    for kw, w in weights.items():
-        if kw in text_l:
-            score += w
-    # Add small length factor, capped
-    score += min(len(text) // 50, 6)
-    return score
+async def prefetched(chunks):
+    """``chunks`` (an async iterator) with its first chunk already produced.
 
+    Taking the connection and starting the query happen before the response
+    does, so a stream that gets no connection is answered with a 503 rather
+    than a 200 cut off after the headers.
+    """
+    try:
+        first = await anext(chunks)
+    except StopAsyncIteration:
+        return chunks
 
-@app.on_event("startup")
-def on_startup():
-    init_db()
+    async def rest():
+        yield first
+        async for chunk in chunks:
+            yield chunk
 
+    return rest()
 
-@app.get("/api/ideas", response_model=List[Idea])
-def list_ideas():
+
+async def ndjson_response(sql: str, params, to_item) -> StreamingResponse:
+    # Rows go out NDJSON_BATCH at a time, since each chunk of a sync generator is a threadpool hop
+    def generate():
+        for rows in stream_rows(sql, params, NDJSON_BATCH):
+            yield b"".join([json_body(to_item(row)) + b"\n" for row in rows])
+
+    return StreamingResponse(await prefetched(iterate_in_threadpool(generate())), media_type="application/x-ndjson")
+
+
+SAMPLE_CLIENTS = [
+    ("Contoso Ltd", "demo"),
+    ("Fabrikam Inc", "demo"),
+    ("Northwind Traders", ""),
+    ("Adventure Works", ""),
+    ("Globex Corp", "demo"),
+]
+
+SAMPLE_TASKS = [
+    ("Contoso Ltd", "Security review", "awaiting"),
+    ("Contoso Ltd", "Q2 roadmap sync", "in_progress"),
+    ("Fabrikam Inc", "Cost optimization plan", "awaiting"),
+    ("Globex Corp", "Performance tuning", "done"),
+    ("Northwind Traders", "Kickoff meeting", "awaiting"),
+]
+
+
+def sample_assignee(client_id: int, client_name: str) -> tuple:
+    first = client_name.split()[0]
+    return (client_id, f"{first} Employee", f"employee@{first.lower()}.example")
+
+
+def create_base_schema(conn) -> None:
+    """Tables that predate MIGRATIONS; created once, for a file at user_version 0."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ideas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT "",
+            score INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    # Clients and tasks for homepage overview
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            owner TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'awaiting', -- awaiting | in_progress | done
+            due_date TEXT,
+            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+        );
+        """
+    )
+    # Assignees (client employees) and workpapers (tracked per assignee)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS assignees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS workpapers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            assignee_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'draft', -- draft | review | final
+            notes TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
+        );
+        """
+    )
+    # Calculator persisted data per assignee and calculator key
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS calculator_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            assignee_id INTEGER NOT NULL,
+            calc_key TEXT NOT NULL,
+            data TEXT NOT NULL DEFAULT '{}',
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+            UNIQUE(assignee_id, calc_key),
+            FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
+        );
+        """
+    )
+    # Registered calculators: one row per assignee, one REAL column per field
+    for schema in CALCULATOR_SCHEMAS.values():
+        conn.execute(schema.create_sql())
+    conn.commit()
+
+
+def migrate_db(seed: bool = False) -> List[int]:
+    """Create or upgrade the SQLite schema; returns the migration versions applied.
+
+    Run once per deploy by ``python -m backend.main migrate``, and at startup
+    by ``open_db`` when AUTO_MIGRATE is on and the file is behind. Holds
+    ``migration_lock()`` so workers starting together migrate (and seed) once.
+    """
+    with migration_lock():
+        return _migrate_db(seed)
+
+
+@contextmanager
+def migration_lock():
+    """Exclusive lock on DB_PATH-migrate.lock for the duration; a no-op where fcntl is missing."""
+    fcntl = optional_module("fcntl")
+    if fcntl is None:
+        yield
+        return
+    with open(DB_PATH + "-migrate.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _migrate_db(seed: bool) -> List[int]:
     conn = get_db()
     try:
-        rows = conn.execute(
-            "SELECT id, title, description, score, created_at FROM ideas ORDER BY id DESC"
-        ).fetchall()
-        return [
-            Idea(
-                id=row[0], title=row[1], description=row[2], score=row[3], created_at=row[4]
-            )
-            for row in rows
-        ]
+        if schema_version(conn) == 0:
+            create_base_schema(conn)
+        applied = run_migrations(conn)
+        if sync_tax_summary(conn):
+            response_cache.clear()
+        if seed:
+            seed_demo_data(conn)
+        return applied
     finally:
         conn.close()
 
 
+def open_db(seed: bool) -> None:
+    """Startup: a current file costs one PRAGMA and one settings read; migrating is ``migrate``'s job.
+
+    ``migrate_db`` (and its lock) only runs when the file is behind and
+    AUTO_MIGRATE is on, to seed, or to rebuild tax_summary after the default
+    bracket table changed.
+    """
+    conn = get_db()
+    try:
+        version = schema_version(conn)
+        if version >= SCHEMA_VERSION and not seed and tax_summary_current(conn):
+            return
+    finally:
+        conn.close()
+    if version < SCHEMA_VERSION and not AUTO_MIGRATE:
+        raise schema_behind(version)
+    migrate_db(seed)
+
+
+def seed_demo_data(conn) -> None:
+    """Sample clients, tasks and assignees for an empty database (SEED_DEMO_DATA or ``migrate --seed``)."""
+    cur = conn.execute("SELECT COUNT(*) FROM clients")
+    (count_clients,) = cur.fetchone()
+    if count_clients == 0:
+        conn.executemany("INSERT INTO clients (name, owner) VALUES (?, ?)", SAMPLE_CLIENTS)
+        conn.commit()
+
+        # Map names to ids
+        rows = conn.execute("SELECT id, name FROM clients").fetchall()
+        id_by_name = {name: cid for cid, name in rows}
+
+        conn.executemany(
+            "INSERT INTO tasks (client_id, title, status) VALUES (?, ?, ?)",
+            [(id_by_name[client], title, status) for client, title, status in SAMPLE_TASKS],
+        )
+        conn.commit()
+        response_cache.clear()
+
+    cur = conn.execute("SELECT COUNT(*) FROM assignees")
+    (count_assignees,) = cur.fetchone()
+    if count_assignees == 0:
+        # Create one sample assignee per first 3 clients
+        clients = conn.execute("SELECT id, name FROM clients ORDER BY id LIMIT 3").fetchall()
+        assignees = [sample_assignee(cid, cname) for cid, cname in clients]
+        conn.executemany(
+            "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)", assignees
+        )
+        conn.commit()
+        response_cache.clear()
+
+
+# Simple keyword weights for demo purposes
+DEFAULT_IDEA_WEIGHTS = {
+    "risk": 5,
+    "impact": 4,
+    "cost": 3,
+    "urgent": 6,
+    "security": 5,
+    "performance": 4,
+    "reliability": 4,
+    "innovation": 3,
+}
+
+
+class IdeaScorer:
+    """An idea's score: the points of every keyword its text contains, plus a capped length bonus.
+
+    Keywords match case-insensitively anywhere in the text and count once.
+    The table is compiled when the scorer is built. Small tables become one
+    C-level substring scan per keyword over a single lowercased copy, which
+    beats any Python-level single pass. From AUTOMATON_MIN_KEYWORDS up, with
+    ``pyahocorasick`` installed, they become an Aho-Corasick automaton that
+    finds every keyword in one pass whatever the table size
+    (``automaton=False`` keeps the scans, for comparison).
+    """
+
+    AUTOMATON_MIN_KEYWORDS = 16
+
+    def __init__(self, weights: Dict[str, int], length_step: int = 50, length_cap: int = 6, automaton: bool = True):
+        self.weights = {str(k).lower(): int(w) for k, w in weights.items() if k}
+        self.length_step = max(1, int(length_step))
+        self.length_cap = int(length_cap)
+        self._items = tuple(self.weights.items())
+        self._automaton = None
+        large = automaton and len(self._items) >= self.AUTOMATON_MIN_KEYWORDS
+        ahocorasick = optional_module("ahocorasick") if large else None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for keyword, points in self._items:
+                automaton.add_word(keyword, (keyword, points))
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    @property
+    def matcher(self) -> str:
+        return "substring" if self._automaton is None else "aho-corasick"
+
+    def score(self, text: str) -> int:
+        lowered = text.lower()
+        if self._automaton is None:
+            points = sum(w for kw, w in self._items if kw in lowered)
+        else:
+            found = set()
+            for _, hit in self._automaton.iter(lowered):
+                found.add(hit)
+                if len(found) == len(self._items):
+                    break
+            points = sum(w for _, w in found)
+        return points + min(len(text) // self.length_step, self.length_cap)
+
+    def fingerprint(self) -> str:
+        return json.dumps([sorted(self._items), self.length_step, self.length_cap])
+
+
+def load_idea_scorer() -> IdeaScorer:
+    if not IDEA_SCORE_FILE:
+        return IdeaScorer(DEFAULT_IDEA_WEIGHTS)
+    with open(IDEA_SCORE_FILE) as f:
+        table = json.load(f)
+    return IdeaScorer(table["weights"], table.get("length_step", 50), table.get("length_cap", 6))
+
+
+idea_scorer = load_idea_scorer()
+
+
+def compute_score(text: str) -> int:
+    return idea_scorer.score(text)
+
+
+IDEA_SCORE_CHUNK_SQL = "SELECT id, description, score FROM ideas WHERE id > ? ORDER BY id LIMIT ?"
+IDEA_SCORE_UPDATE_SQL = "UPDATE ideas SET score = ? WHERE id = ?"
+
+
+def rescored(scorer: IdeaScorer, rows) -> List[tuple]:
+    """``(score, id)`` for the ``(id, description, score)`` rows whose stored score is out of date."""
+    updates = []
+    for idea_id, description, score in rows:
+        new = scorer.score(description or "")
+        if new != score:
+            updates.append((new, idea_id))
+    return updates
+
+
+async def follow_worker_bus():
+    """Apply other workers' invalidations and change events even while no request triggers a sync."""
+    while True:
+        await asyncio.sleep(WORKER_BUS_POLL)
+        try:
+            worker_bus.sync()
+        except Exception:
+            logger.exception("worker bus sync failed")
+
+
+_bus_follower = None
+
+
+@app.on_event("startup")
+async def on_startup():
+    global _bus_follower
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await storage.open()
+    if worker_bus is not None:
+        worker_bus.sync()
+        _bus_follower = asyncio.create_task(follow_worker_bus())
+    if smtp_settings()["host"]:
+        email_worker.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await email_worker.stop()
+    if _bus_follower is not None:
+        _bus_follower.cancel()
+        worker_bus.close()
+    await storage.close()
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@app.get("/api/db/pool")
+async def pool_stats():
+    return {"backend": storage.name, **storage.stats()}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def row_to_idea(row) -> Idea:
+    return Idea(id=row[0], title=row[1], description=row[2], score=row[3], created_at=row[4])
+
+
+idea_item = list_item(Idea, row_to_idea)
+
+IDEA_SQL = "SELECT id, title, description, score, created_at FROM ideas WHERE id = ?"
+IDEA_DELETE_SQL = "DELETE FROM ideas WHERE id = ?"
+
+
+@app.get("/api/ideas", response_model=List[Idea])
+async def list_ideas(response: Response, page: Page = Depends()):
+    return list_response(response, await storage.list_ideas(response, page))
+
+
 @app.post("/api/ideas", response_model=Idea, status_code=201)
-def create_idea(body: IdeaIn):
+async def create_idea(body: IdeaIn):
     if not body.title.strip():
         raise HTTPException(status_code=400, detail="Title is required")
     score = compute_score(body.description or "")
-    conn = get_db()
+    return await storage.create_idea(body.title.strip(), body.description.strip(), score)
+
+
+@app.delete("/api/ideas/{idea_id}")
+async def delete_idea(idea_id: int):
+    if not await storage.delete_idea(idea_id):
+        raise HTTPException(status_code=404, detail="Idea not found")
+    return {"status": "ok"}
+
+
+@app.get("/api/ideas/scoring")
+async def idea_scoring():
+    """The scoring table in use, and the one the stored scores were last recomputed with (null if never)."""
+    return {
+        "weights": idea_scorer.weights,
+        "length_step": idea_scorer.length_step,
+        "length_cap": idea_scorer.length_cap,
+        "matcher": idea_scorer.matcher,
+        "fingerprint": idea_scorer.fingerprint(),
+        "rescored_with": await storage.idea_scores_fingerprint(),
+    }
+
+
+@app.post("/api/ideas:rescore")
+async def rescore_ideas():
+    """Recompute every stored idea score with the current table, BULK_CHUNK_SIZE ideas per transaction."""
+    start = time.perf_counter()
+    result = await storage.rescore_ideas(idea_scorer)
+    return {**result, "seconds": round(time.perf_counter() - start, 3)}
+
+
+# --------- Clients + Home Overview API ---------
+
+class Client(BaseModel):
+    id: int
+    name: str
+    owner: str
+    created_at: str
+
+
+class OverviewResponse(BaseModel):
+    my_clients: List[Client]
+    awaiting_clients: List[Client]
+    stats: dict
+
+
+def row_to_client(row) -> Client:
+    return Client(id=row[0], name=row[1], owner=row[2], created_at=row[3])
+
+
+client_item = list_item(Client, row_to_client)
+
+
+@app.get("/api/home/overview", response_model=OverviewResponse)
+async def home_overview(request: Request, owner: str = "demo"):
+    # awaiting_clients lists every client's owner, so any client change invalidates it
+    return await cached_json(
+        request, ("home_overview", owner), {"clients", "tasks"}, lambda: storage.home_overview(owner)
+    )
+
+
+MY_CLIENTS_SQL = "SELECT id, name, owner, created_at FROM clients WHERE owner = ? ORDER BY name"
+AWAITING_CLIENTS_SQL = """
+    SELECT DISTINCT c.id, c.name, c.owner, c.created_at
+    FROM clients c
+    JOIN tasks t ON t.client_id = c.id
+    WHERE t.status = 'awaiting'
+    ORDER BY c.name
+"""
+
+
+def build_home_overview(conn, owner: str) -> OverviewResponse:
+    my_rows = conn.execute(MY_CLIENTS_SQL, (owner,)).fetchall()
+    awaiting_rows = conn.execute(AWAITING_CLIENTS_SQL).fetchall()
+    awaiting_count = conn.execute(STAT_AWAITING_SQL).fetchone()[0]
+    return OverviewResponse(
+        my_clients=[row_to_client(r) for r in my_rows],
+        awaiting_clients=[row_to_client(r) for r in awaiting_rows],
+        stats={
+            "my_clients_count": len(my_rows),
+            "awaiting_tasks_count": awaiting_count,
+        },
+    )
+
+
+# Dashboard counters: one row per (scope, kind, status), kept current by
+# triggers so /api/home/stats reads a handful of rows whatever the table
+# sizes. scope is 'all', 'client:<id>' or 'owner:<owner>'; kind is 'task',
+# 'workpaper' or 'assignee' (status '' for assignees).
+TASK_STATUSES = ("awaiting", "in_progress", "done")
+WORKPAPER_STATUSES = ("draft", "review", "final")
+
+STAT_COUNTERS_SQL = """
+    CREATE TABLE IF NOT EXISTS stat_counters (
+        scope TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (scope, kind, status)
+    ) WITHOUT ROWID
+"""
+
+STAT_UPSERT = "ON CONFLICT (scope, kind, status) DO UPDATE SET count = count + excluded.count"
+
+# What the counters should hold, derived from the tables (SQL both databases
+# accept); used to backfill them and by the consistency check
+STAT_EXPECTED_SQL = """
+    WITH per_client AS (
+        SELECT client_id, kind, status, COUNT(*) AS n FROM (
+            SELECT client_id, 'task' AS kind, status FROM tasks
+            UNION ALL
+            SELECT a.client_id, 'workpaper', w.status FROM workpapers w JOIN assignees a ON a.id = w.assignee_id
+            UNION ALL
+            SELECT client_id, 'assignee', '' FROM assignees
+        ) AS r
+        GROUP BY client_id, kind, status
+    )
+    SELECT 'client:' || client_id, kind, status, n FROM per_client
+    UNION ALL
+    SELECT 'owner:' || c.owner, p.kind, p.status, CAST(SUM(p.n) AS BIGINT)
+    FROM per_client p JOIN clients c ON c.id = p.client_id
+    GROUP BY c.owner, p.kind, p.status
+    UNION ALL
+    SELECT 'all', kind, status, CAST(SUM(n) AS BIGINT) FROM per_client GROUP BY kind, status
+"""
+
+STAT_SCOPES_SQL = "SELECT scope, kind, status, count FROM stat_counters WHERE scope IN (?, ?, ?)"
+
+STAT_AWAITING_SQL = (
+    "SELECT COALESCE((SELECT count FROM stat_counters WHERE scope = 'all' AND kind = 'task' AND status = 'awaiting'), 0)"
+)
+
+
+def stat_bump_sql(kind: str, status: str, n: int, client: str) -> str:
+    """Add ``n`` to one counter in the 'all' scope and in ``client``'s client and owner scopes.
+
+    The client scopes are skipped when ``client`` no longer resolves, which is
+    the case for rows removed by a cascading client or assignee delete: those
+    scopes are settled by the BEFORE DELETE trigger of the parent.
+    """
+    return f"""
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'all', '{kind}', {status}, {n}
+        UNION ALL
+        SELECT s.value, '{kind}', {status}, {n}
+        FROM clients c, json_each(json_array('client:' || c.id, 'owner:' || c.owner)) s
+        WHERE c.id = {client} {STAT_UPSERT};
+    """
+
+
+def stat_subtree_sql(assignee: str, client: str, sign: int) -> str:
+    """Add (sign 1) or remove (sign -1) an assignee and its workpapers in ``client``'s scopes."""
+    return f"""
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT s.value, r.kind, r.status, {sign} * r.n
+        FROM (
+            SELECT 'workpaper' AS kind, status, COUNT(*) AS n FROM workpapers WHERE assignee_id = {assignee} GROUP BY status
+            UNION ALL
+            SELECT 'assignee', '', 1
+        ) r, clients c, json_each(json_array('client:' || c.id, 'owner:' || c.owner)) s
+        WHERE c.id = {client} {STAT_UPSERT};
+    """
+
+
+def stat_triggers() -> List[str]:
+    workpaper_client = "(SELECT client_id FROM assignees WHERE id = {}.assignee_id)"
+    triggers = {}
+    for table, kind, client in (("tasks", "task", "{}.client_id"), ("workpapers", "workpaper", workpaper_client)):
+        old = stat_bump_sql(kind, "old.status", -1, client.format("old"))
+        new = stat_bump_sql(kind, "new.status", 1, client.format("new"))
+        moved = "old.client_id IS NOT new.client_id" if table == "tasks" else "old.assignee_id IS NOT new.assignee_id"
+        triggers[f"stat_{table}_ai AFTER INSERT ON {table}"] = new
+        triggers[f"stat_{table}_ad AFTER DELETE ON {table}"] = old
+        triggers[
+            f"stat_{table}_au AFTER UPDATE OF status, {'client_id' if table == 'tasks' else 'assignee_id'} ON {table} "
+            f"WHEN old.status IS NOT new.status OR {moved}"
+        ] = old + new
+    triggers["stat_assignees_ai AFTER INSERT ON assignees"] = stat_bump_sql("assignee", "''", 1, "new.client_id")
+    triggers["stat_assignees_bd BEFORE DELETE ON assignees"] = stat_subtree_sql("old.id", "old.client_id", -1)
+    triggers["stat_assignees_ad AFTER DELETE ON assignees"] = stat_bump_sql("assignee", "''", -1, "NULL")
+    triggers["stat_assignees_au AFTER UPDATE OF client_id ON assignees WHEN old.client_id IS NOT new.client_id"] = (
+        stat_subtree_sql("new.id", "old.client_id", -1) + stat_subtree_sql("new.id", "new.client_id", 1)
+    )
+    triggers["stat_clients_au AFTER UPDATE OF owner ON clients WHEN old.owner IS NOT new.owner"] = f"""
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'owner:' || old.owner, kind, status, -count FROM stat_counters WHERE scope = 'client:' || old.id {STAT_UPSERT};
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'owner:' || new.owner, kind, status, count FROM stat_counters WHERE scope = 'client:' || new.id {STAT_UPSERT};
+    """
+    triggers["stat_clients_bd BEFORE DELETE ON clients"] = f"""
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'owner:' || old.owner, kind, status, -count FROM stat_counters WHERE scope = 'client:' || old.id {STAT_UPSERT};
+        DELETE FROM stat_counters WHERE scope = 'client:' || old.id;
+    """
+    return [f"CREATE TRIGGER IF NOT EXISTS {head} BEGIN {body} END" for head, body in triggers.items()]
+
+
+def add_stat_counters(conn) -> None:
+    conn.execute(STAT_COUNTERS_SQL)
+    for trigger in stat_triggers():
+        conn.execute(trigger)
+    conn.execute("DELETE FROM stat_counters")
+    conn.execute("INSERT INTO stat_counters (scope, kind, status, count) " + STAT_EXPECTED_SQL)
+
+
+def counter_mismatches(actual, expected) -> List[dict]:
+    """Counters whose stored value differs from the derived one (zero and missing rows are equal)."""
+    actual = {(r[0], r[1], r[2]): r[3] for r in actual if r[3]}
+    expected = {(r[0], r[1], r[2]): r[3] for r in expected if r[3]}
+    return [
+        {"scope": key[0], "kind": key[1], "status": key[2], "stored": actual.get(key, 0), "expected": expected.get(key, 0)}
+        for key in sorted(actual.keys() | expected.keys())
+        if actual.get(key, 0) != expected.get(key, 0)
+    ]
+
+
+def check_stat_counters(conn, repair: bool) -> List[dict]:
+    """Re-derive the counters under the write lock; with ``repair``, replace them when they drifted."""
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cur = conn.execute(
-            "INSERT INTO ideas (title, description, score) VALUES (?, ?, ?)",
-            (body.title.strip(), body.description.strip(), score),
+        mismatches = counter_mismatches(
+            conn.execute("SELECT scope, kind, status, count FROM stat_counters").fetchall(),
+            conn.execute(STAT_EXPECTED_SQL).fetchall(),
         )
+        if mismatches and repair:
+            conn.execute("DELETE FROM stat_counters")
+            conn.execute("INSERT INTO stat_counters (scope, kind, status, count) " + STAT_EXPECTED_SQL)
         conn.commit()
-        new_id = cur.lastrowid
-        row = conn.execute(
-            "SELECT id, title, description, score, created_at FROM ideas WHERE id = ?",
-            (new_id,),
-        ).fetchone()
-        return Idea(
-            id=row[0], title=row[1], description=row[2], score=row[3], created_at=row[4]
+    except BaseException:
+        conn.rollback()
+        raise
+    return mismatches
+
+
+class StatusCounts(BaseModel):
+    tasks: Dict[str, int]
+    workpapers: Dict[str, int]
+    assignees: int
+
+
+class HomeStats(BaseModel):
+    all: StatusCounts
+    owner: StatusCounts
+    client: Optional[StatusCounts] = None
+
+
+def stat_scopes(owner: str, client_id: Optional[int]) -> tuple:
+    return ("all", f"owner:{owner}", f"client:{client_id}" if client_id is not None else "")
+
+
+def build_home_stats(rows, owner: str, client_id: Optional[int]) -> HomeStats:
+    """Fold counter rows into per-scope counts, with every known status present (zero if unused)."""
+    scopes = stat_scopes(owner, client_id)
+    counts = {
+        scope: StatusCounts(
+            tasks=dict.fromkeys(TASK_STATUSES, 0), workpapers=dict.fromkeys(WORKPAPER_STATUSES, 0), assignees=0
+        )
+        for scope in scopes
+    }
+    for scope, kind, status, n in rows:
+        if kind == "assignee":
+            counts[scope].assignees = n
+        else:
+            (counts[scope].tasks if kind == "task" else counts[scope].workpapers)[status] = n
+    return HomeStats(all=counts[scopes[0]], owner=counts[scopes[1]], client=counts[scopes[2]] if client_id is not None else None)
+
+
+@app.get("/api/home/stats", response_model=HomeStats)
+async def home_stats(owner: str = "demo", client_id: Optional[int] = None):
+    """Task, workpaper and assignee counts for every client, ``owner``'s clients and optionally one client."""
+    stats = await storage.home_stats(owner, client_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return stats
+
+
+@app.post("/api/home/stats:check")
+async def check_home_stats(repair: bool = False):
+    """Compare the counters with counts derived from the tables; ``repair`` rewrites them if they drifted."""
+    mismatches = await storage.check_stat_counters(repair)
+    return {"ok": not mismatches, "repaired": bool(mismatches) and repair, "mismatches": mismatches}
+
+
+def fts_query(q: str) -> str:
+    """Turn free text into an FTS5 query matching every token as a prefix."""
+    tokens = re.findall(r"\w+", q.lower())
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def prefix_bounds(q: str):
+    """Half-open [lo, hi) range of names starting with q under NOCASE.
+
+    Built from the lowercase query: NOCASE folds A-Z to a-z, so an upper
+    bound made from an uppercase letter (``Z`` + 1 is ``[``) would sort
+    below the names it should include.
+    """
+    q = q.lower()
+    return q, q[:-1] + chr(ord(q[-1]) + 1)
+
+
+def encode_cursor(tier: str, key) -> str:
+    return base64.urlsafe_b64encode(json.dumps([tier, key]).encode()).decode()
+
+
+# Where a search page starts: names are unique only case-sensitively, so the
+# prefix tier resumes after (name, id) rather than after the name alone
+SEARCH_START = ("prefix", ["", 0])
+
+
+def decode_cursor(cursor: str):
+    try:
+        tier, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    valid = {
+        "prefix": lambda k: isinstance(k, list) and len(k) == 2 and isinstance(k[0], str) and isinstance(k[1], int),
+        "token": lambda k: isinstance(k, int),
+    }
+    if tier not in valid or not valid[tier](key):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tier, key
+
+
+SEARCH_PREFIX_SQL = """
+    SELECT id, name, owner, created_at FROM clients
+    WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE AND (name COLLATE NOCASE, id) > (?, ?)
+    ORDER BY name COLLATE NOCASE, id
+    LIMIT ?
+"""
+
+SEARCH_TOKEN_SQL = """
+    SELECT c.id, c.name, c.owner, c.created_at
+    FROM clients_fts f
+    JOIN clients c ON c.id = f.rowid
+    WHERE clients_fts MATCH ? AND f.rowid > ?
+      AND NOT (c.name >= ? COLLATE NOCASE AND c.name < ? COLLATE NOCASE)
+    ORDER BY f.rowid
+    LIMIT ?
+"""
+
+
+@app.get("/api/clients/search", response_model=List[Client])
+async def search_clients(
+    response: Response,
+    q: str = "",
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """Typeahead search: names starting with q first, then token-prefix matches.
+
+    Both tiers are read in index order with keyset cursors, so a page costs
+    the same regardless of how many clients match.
+    """
+    q = q.strip()
+    match = fts_query(q)
+    if q and not match:
+        return []
+    tier, key = decode_cursor(cursor) if cursor else SEARCH_START
+    return list_response(response, await storage.search_clients(response, q, match, tier, key, limit))
+
+
+def search_rows(conn, response: Response, q: str, match: str, tier: str, key, limit: int) -> List[Client]:
+    lo, hi = prefix_bounds(q) if q else ("", "\U0010ffff")
+    rows = []
+    if tier == "prefix":
+        rows = conn.execute(SEARCH_PREFIX_SQL, (lo, hi, *key, limit + 1)).fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor("prefix", [rows[-1][1], rows[-1][0]])
+            return [client_item(r) for r in rows]
+        tier, key = "token", 0
+    if match:
+        remaining = limit - len(rows)
+        more = conn.execute(SEARCH_TOKEN_SQL, (match, key, lo, hi, remaining + 1)).fetchall()
+        if len(more) > remaining:
+            more = more[:remaining]
+            # An empty slice means the prefix tier filled the page; the next one starts the token tier
+            response.headers["X-Next-Cursor"] = encode_cursor("token", more[-1][0] if more else key)
+        rows.extend(more)
+    return [client_item(r) for r in rows]
+
+
+class AssignBody(BaseModel):
+    owner: str
+
+
+ASSIGN_CLIENT_SQL = "UPDATE clients SET owner = ? WHERE id = ?"
+
+
+@app.post("/api/clients/{client_id}/assign")
+async def assign_client(client_id: int, body: AssignBody):
+    owner = body.owner.strip()
+    previous = await storage.assign_client(client_id, owner)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    response_cache.invalidate("clients", f"owner:{previous}", f"owner:{owner}")
+    change_broker.publish(
+        "client.assigned", (f"client:{client_id}", f"owner:{previous}", f"owner:{owner}"),
+        client_id=client_id, owner=owner, previous_owner=previous,
+    )
+    return {"status": "ok"}
+
+
+# --------- Tools API ---------
+
+class CoverLetterRequest(BaseModel):
+    candidate_name: str
+    role: str
+    company: str
+    highlights: List[str] = []
+
+
+class CoverLetterResponse(BaseModel):
+    content: str
+
+
+@app.post("/api/tools/cover-letter", response_model=CoverLetterResponse)
+async def generate_cover_letter(body: CoverLetterRequest):
+    lines = [
+        f"Dear {body.company} Hiring Team,",
+        "",
+        f"I am excited to apply for the {body.role} role. With a strong track record in relevant domains and a passion for impact, I believe I can contribute immediately.",
+    ]
+    if body.highlights:
+        lines.append("")
+        lines.append("Highlights:")
+        for h in body.highlights:
+            lines.append(f"- {h}")
+    lines.extend([
+        "",
+        "Thank you for your consideration.",
+        f"Sincerely,",
+        f"{body.candidate_name}",
+    ])
+    return CoverLetterResponse(content="\n".join(lines))
+
+
+class PdfFillRequest(BaseModel):
+    title: str = "Generated Form"
+    fields: dict
+
+
+class PdfFillResponse(BaseModel):
+    filename: str
+    content_b64: str
+
+
+def render_pdf(forms, doc_title: str) -> bytes:
+    """Render (title, fields) forms into one PDF, each form starting on a new page.
+
+    Runs in the PDF worker processes, so it only takes picklable arguments.
+    """
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=LETTER)
+    width, height = LETTER
+    c.setTitle(doc_title)
+    for title, fields in forms:
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(72, height - 72, title)
+        c.setFont("Helvetica", 11)
+        y = height - 108
+        for k, v in fields.items():
+            c.drawString(72, y, f"{k}: {v}")
+            y -= 18
+            if y < 72:
+                c.showPage()
+                y = height - 72
+                c.setFont("Helvetica", 11)
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+
+def pdf_executor() -> ProcessPoolExecutor:
+    # Created on first use; spawn avoids forking a process that already runs threads
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_executor
+
+
+def require_pdf() -> None:
+    if not REPORTLAB_AVAILABLE:
+        raise HTTPException(status_code=501, detail="PDF generation not available (reportlab missing)")
+
+
+async def render_pdf_async(forms, doc_title: str) -> bytes:
+    require_pdf()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pdf_executor(), render_pdf, forms, doc_title)
+
+
+# Downloads are sent in chunks of this size rather than as one body
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+def attachment_headers(filename: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+def pdf_download(data: bytes, filename: str, media_type: str = "application/pdf") -> StreamingResponse:
+    async def chunks():
+        for start in range(0, len(data), DOWNLOAD_CHUNK):
+            yield data[start : start + DOWNLOAD_CHUNK]
+
+    headers = {**attachment_headers(filename), "Content-Length": str(len(data))}
+    return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+
+class ChunkSink(io.RawIOBase):
+    """Unseekable file that keeps what is written until ``take``; lets zipfile write to a stream."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def zip_forms(forms):
+    """ZIP with one PDF per form, yielded entry by entry as the documents are rendered.
+
+    PDFs are compressed already, so entries are STORED. At most two renders
+    per PDF worker are in flight or waiting to be written at a time.
+    """
+    sink = ChunkSink()
+    pending = deque()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for i, form in enumerate(forms, start=1):
+                pending.append((f"form_{i:04d}.pdf", asyncio.ensure_future(render_pdf_async([form], form[0]))))
+                while len(pending) >= 2 * PDF_WORKERS or (pending and i == len(forms)):
+                    name, doc = pending.popleft()
+                    await run_in_threadpool(zf.writestr, name, await doc)
+                    yield sink.take()
+        yield sink.take()
+    finally:
+        for _name, doc in pending:
+            doc.cancel()
+
+
+def prefers_media_type(request: Request, media_type: str, other: str) -> bool:
+    """Whether the Accept header ranks ``media_type`` above ``other`` (ties and no header: False)."""
+    quality = {}
+    for part in request.headers.get("accept", "").split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        q = next((p[2:] for p in params if p.startswith("q=")), "1")
+        try:
+            quality[name.lower()] = float(q)
+        except ValueError:
+            continue
+    anything = quality.get("*/*", 0)
+    return quality.get(media_type, anything) > quality.get(other, anything)
+
+
+@app.post("/api/tools/pdf-fill", response_model=PdfFillResponse)
+async def pdf_fill(
+    request: Request, body: PdfFillRequest, format: Optional[str] = Query(None, pattern="^(pdf|json)$")
+):
+    """The rendered form as application/pdf, an attachment named in Content-Disposition.
+
+    ``?format=json``, or an Accept header ranking application/json above
+    application/pdf, returns the older JSON shape (filename, base64 content).
+    """
+    pdf_bytes = await render_pdf_async([(body.title, body.fields)], body.title)
+    if format == "json" or (format is None and prefers_media_type(request, "application/json", "application/pdf")):
+        b64 = base64.b64encode(pdf_bytes).decode("utf-8")
+        return PdfFillResponse(filename="generated_form.pdf", content_b64=b64)
+    return pdf_download(pdf_bytes, "generated_form.pdf")
+
+
+class PdfBatchRequest(BaseModel):
+    forms: List[PdfFillRequest] = []
+    # Adds one form per workpaper of each listed assignee
+    assignee_ids: List[int] = []
+    output: str = "zip"  # zip | pdf (all forms merged into one document)
+
+
+def workpaper_form(r) -> tuple:
+    return (
+        f"Workpaper {r[0]}: {r[1]}",
+        {
+            "Assignee": r[5],
+            "Client": r[6],
+            "Status": r[2],
+            "Created": r[4],
+            "Income total": r[7],
+            "Deductions total": r[8],
+            "Taxable income": r[9],
+            "Estimated tax": r[10],
+            "Notes": r[3],
+        },
+    )
+
+
+WORKPAPER_FORMS_SQL = """
+    SELECT w.id, w.title, w.status, w.notes, w.created_at, a.name, c.name,
+        coalesce(ts.income_total, 0), coalesce(ts.deductions_total, 0),
+        coalesce(ts.taxable_income, 0), coalesce(ts.estimated_tax, 0)
+    FROM workpapers w
+    JOIN assignees a ON a.id = w.assignee_id
+    JOIN clients c ON c.id = a.client_id
+    LEFT JOIN tax_summary ts ON ts.assignee_id = a.id
+    WHERE w.assignee_id IN (SELECT value FROM json_each(?))
+    ORDER BY a.id, w.id
+"""
+
+
+def load_workpaper_forms(conn, assignee_ids: List[int]):
+    rows = conn.execute(WORKPAPER_FORMS_SQL, (json.dumps(assignee_ids),)).fetchall()
+    return [workpaper_form(r) for r in rows]
+
+
+@app.post("/api/tools/pdf-fill/batch")
+async def pdf_fill_batch(body: PdfBatchRequest):
+    if body.output not in ("zip", "pdf"):
+        raise HTTPException(status_code=400, detail="output must be 'zip' or 'pdf'")
+    forms = [(f.title, f.fields) for f in body.forms]
+    if body.assignee_ids:
+        forms += await storage.workpaper_forms(body.assignee_ids)
+    if not forms:
+        raise HTTPException(status_code=400, detail="No forms to render")
+    if len(forms) > PDF_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PDF_BATCH_MAX} forms per batch")
+    if body.output == "pdf":
+        return pdf_download(await render_pdf_async(forms, "Forms"), "forms.pdf")
+    # One document per form, rendered in parallel across the worker processes and streamed in order
+    require_pdf()
+    return StreamingResponse(zip_forms(forms), media_type="application/zip", headers=attachment_headers("forms.zip"))
+
+
+class Attachment(BaseModel):
+    filename: str
+    content_b64: str
+    mimetype: Optional[str] = None
+
+
+class SendEmailRequest(BaseModel):
+    to: List[str]
+    subject: str
+    body: str
+    attachments: List[Attachment] = []
+
+
+def smtp_settings() -> dict:
+    return {
+        "host": os.environ.get("SMTP_HOST"),
+        "port": int(os.environ.get("SMTP_PORT", "587")),
+        "user": os.environ.get("SMTP_USER"),
+        "password": os.environ.get("SMTP_PASS"),
+        "tls": os.environ.get("SMTP_TLS", "true").lower() == "true",
+    }
+
+
+EMAIL_CLAIM_SQL = """
+    UPDATE email_outbox SET status = 'sending', attempts = attempts + 1,
+        next_attempt_at = datetime('now', ?)
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE status = 'queued' AND next_attempt_at <= datetime('now')
+        ORDER BY next_attempt_at, id
+        LIMIT ?
+    )
+    RETURNING id, from_addr, to_addrs, message, attempts
+"""
+EMAIL_REQUEUE_SQL = (
+    "UPDATE email_outbox SET status = 'queued' WHERE status = 'sending' AND (? OR next_attempt_at <= datetime('now'))"
+)
+EMAIL_STATUS_SQL = """
+    SELECT id, status, attempts, last_error, next_attempt_at, created_at, sent_at
+    FROM email_outbox WHERE id = ?
+"""
+
+
+def requeue_emails(conn, everything: bool) -> None:
+    conn.execute(EMAIL_REQUEUE_SQL, (everything,))
+    conn.commit()
+
+
+def claim_emails(conn, claim_seconds: int, limit: int) -> list:
+    batch = conn.execute(EMAIL_CLAIM_SQL, (f"+{claim_seconds} seconds", limit)).fetchall()
+    conn.commit()
+    return batch
+
+
+def finish_emails(conn, sent: list, retry: list, failed: list) -> None:
+    """Record a batch's outcome: (id,) sent, (error, delay in seconds, id) retried later, (error, id) given up on."""
+    retry = [(error, f"+{delay} seconds", msg_id) for error, delay, msg_id in retry]
+    conn.executemany(
+        "UPDATE email_outbox SET status = 'sent', last_error = NULL, sent_at = datetime('now') WHERE id = ?",
+        sent,
+    )
+    conn.executemany(
+        """
+        UPDATE email_outbox SET status = 'queued', last_error = ?,
+            next_attempt_at = datetime('now', ?)
+        WHERE id = ?
+        """,
+        retry,
+    )
+    conn.executemany("UPDATE email_outbox SET status = 'failed', last_error = ? WHERE id = ?", failed)
+    conn.commit()
+
+
+class EmailWorker:
+    """Background task draining the storage's email outbox over a reused SMTP connection.
+
+    Due messages are claimed in batches and sent on one authenticated
+    connection, which is recycled after EMAIL_MAX_PER_CONNECTION messages or
+    when the relay drops it. Failures are retried with exponential backoff
+    up to EMAIL_MAX_ATTEMPTS, then marked failed. The SMTP conversation runs
+    on a worker thread; claims and status updates go through the storage
+    (on SQLite, the writer thread).
+    """
+
+    def __init__(self):
+        self._wake = None
+        self._stopping = False
+        self._task = None
+        self._smtp = None
+        self._sent_on_connection = 0
+
+    def start(self) -> None:
+        """Start draining on the running event loop, unless already started."""
+        if self._task is not None and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            # Let the batch in flight finish recording its outcome, then give up on it
+            self._stopping = True
+            self._wake.set()
+            await asyncio.wait([task], timeout=15)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await run_in_threadpool(self._close)
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        # Messages claimed by a worker that died mid-batch go back in the queue
+        await storage.requeue_emails()
+        while not self._stopping:
+            try:
+                sent = await self.drain_once()
+            except Exception:
+                logger.exception("email worker batch failed")
+                sent = 0
+            if sent == 0 and not self._stopping:
+                await run_in_threadpool(self._close)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), EMAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def drain_once(self) -> int:
+        batch = await storage.claim_emails(EMAIL_CLAIM_TIMEOUT, EMAIL_BATCH_SIZE)
+        if not batch:
+            return 0
+        sent, retry, failed = [], [], []
+        for msg_id, from_addr, to_addrs, message, attempts in batch:
+            try:
+                await run_in_threadpool(self._send, from_addr, json.loads(to_addrs), message)
+                sent.append((msg_id,))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempts >= EMAIL_MAX_ATTEMPTS:
+                    failed.append((error, msg_id))
+                else:
+                    delay = min(EMAIL_RETRY_BASE * 2 ** (attempts - 1), 3600)
+                    retry.append((error, delay, msg_id))
+        await storage.finish_emails(sent, retry, failed)
+        return len(sent)
+
+    def _send(self, from_addr: str, to_addrs: List[str], message: bytes) -> None:
+        import smtplib
+
+        try:
+            self._connection().sendmail(from_addr, to_addrs, message)
+        except (smtplib.SMTPServerDisconnected, OSError) as e:
+            if isinstance(e, smtplib.SMTPException) and not isinstance(e, smtplib.SMTPServerDisconnected):
+                raise  # the relay answered, so the message waits for the next attempt
+            # The reused connection may have gone stale; retry once on a fresh one
+            self._close()
+            self._connection().sendmail(from_addr, to_addrs, message)
+        self._sent_on_connection += 1
+
+    def _connection(self) -> "smtplib.SMTP":
+        import smtplib
+
+        if self._smtp is not None and self._sent_on_connection < EMAIL_MAX_PER_CONNECTION:
+            return self._smtp
+        self._close()
+        cfg = smtp_settings()
+        server = smtplib.SMTP(cfg["host"], cfg["port"], timeout=10)
+        try:
+            if cfg["tls"]:
+                server.starttls()
+            if cfg["user"]:
+                server.login(cfg["user"], cfg["password"] or "")
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        self._sent_on_connection = 0
+        return server
+
+    def _close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
+
+email_worker = EmailWorker()
+
+
+def build_email(body: SendEmailRequest, from_addr: str) -> bytes:
+    from email.message import EmailMessage
+
+    msg = EmailMessage()
+    msg["Subject"] = body.subject
+    msg["To"] = ", ".join(body.to)
+    msg["From"] = from_addr
+    msg.set_content(body.body)
+    for att in body.attachments:
+        data = base64.b64decode(att.content_b64)
+        maintype, subtype = (att.mimetype or "application/octet-stream").split("/", 1)
+        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=att.filename)
+    return msg.as_bytes()
+
+
+def queue_email(conn, from_addr: str, to: List[str], subject: str, message: bytes) -> int:
+    """Add a message to the outbox, due now; returns its id."""
+    cur = conn.execute(
+        "INSERT INTO email_outbox (from_addr, to_addrs, subject, message) VALUES (?, ?, ?, ?)",
+        (from_addr, json.dumps(to), subject, message),
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+@app.post("/api/tools/send-email", status_code=202)
+async def send_email(body: SendEmailRequest):
+    from_addr = os.environ.get("SMTP_FROM", "noreply@example.com")
+    # Attachments are decoded and encoded again, which is too slow for the event loop
+    message = await run_in_threadpool(build_email, body, from_addr)
+
+    # If SMTP not configured, return preview only
+    if not smtp_settings()["host"]:
+        return {"status": "preview", "from": from_addr, "to": body.to, "subject": body.subject, "body": body.body, "attachments": [a.filename for a in body.attachments]}
+
+    message_id = await storage.queue_email(from_addr, body.to, body.subject, message)
+    email_worker.start()
+    email_worker.notify()
+    return {"status": "queued", "id": message_id}
+
+
+@app.get("/api/tools/send-email/{message_id}")
+async def email_status(message_id: int):
+    row = await storage.email_status(message_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Message not found")
+    keys = ("id", "status", "attempts", "last_error", "next_attempt_at", "created_at", "sent_at")
+    return dict(zip(keys, row))
+
+
+# --------- Client/Assignee/Workpaper API ---------
+
+class Assignee(BaseModel):
+    id: int
+    client_id: int
+    name: str
+    email: str
+    created_at: str
+
+
+class Workpaper(BaseModel):
+    id: int
+    assignee_id: int
+    title: str
+    status: str
+    notes: str
+    created_at: str
+
+
+class AssigneeBrief(BaseModel):
+    id: int
+    name: str
+    client_name: str
+
+
+assignee_brief_item = list_item(AssigneeBrief, lambda r: AssigneeBrief(id=r[0], name=r[1], client_name=r[2]))
+
+
+class ClientDetail(Client):
+    pass
+
+
+class AssigneeDetail(Assignee):
+    client: ClientDetail
+
+
+@app.get("/api/clients", response_model=List[Client])
+async def list_clients(request: Request, response: Response, page: Page = Depends()):
+    # Only the full listing is cached; pages and streams go straight to the database
+    if page.after_id is None and page.limit is None and page.format == "json":
+        return await cached_json(request, ("list_clients",), {"clients"}, lambda: storage.list_clients(response, page))
+    return list_response(response, await storage.list_clients(response, page))
+
+
+@app.get("/api/home/my-assignees", response_model=List[AssigneeBrief])
+async def my_assignees(request: Request, owner: str = "demo"):
+    return await cached_json(
+        request, ("my_assignees", owner), {f"owner:{owner}"}, lambda: storage.my_assignees(owner)
+    )
+
+
+MY_ASSIGNEES_SQL = """
+    SELECT a.id, a.name, c.name as client_name
+    FROM assignees a
+    JOIN clients c ON c.id = a.client_id
+    WHERE c.owner = ?
+    ORDER BY a.name
+"""
+
+
+def build_my_assignees(conn, owner: str) -> List[AssigneeBrief]:
+    rows = conn.execute(MY_ASSIGNEES_SQL, (owner,)).fetchall()
+    return [assignee_brief_item(r) for r in rows]
+
+
+class AssigneeCreate(BaseModel):
+    name: str
+    email: str = ""
+
+
+def row_to_assignee(r) -> Assignee:
+    return Assignee(id=r[0], client_id=r[1], name=r[2], email=r[3], created_at=r[4])
+
+
+assignee_item = list_item(Assignee, row_to_assignee)
+
+ASSIGNEE_SQL = "SELECT id, client_id, name, email, created_at FROM assignees WHERE id = ?"
+CLIENT_SQL = "SELECT id, name, owner, created_at FROM clients WHERE id = ?"
+CLIENT_OWNER_SQL = "SELECT owner FROM clients WHERE id = ?"
+
+
+@app.get("/api/clients/{client_id}/assignees", response_model=List[Assignee])
+async def list_assignees(client_id: int, response: Response, page: Page = Depends()):
+    return list_response(response, await storage.list_assignees(response, page, client_id))
+
+
+@app.post("/api/clients/{client_id}/assignees", response_model=Assignee, status_code=201)
+async def create_assignee(client_id: int, body: AssigneeCreate):
+    created = await storage.create_assignee(client_id, body.name.strip(), body.email.strip())
+    if created is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    assignee, owner = created
+    response_cache.invalidate(f"owner:{owner}")
+    change_broker.publish(
+        "assignee.created", (f"assignee:{assignee.id}", f"client:{client_id}", f"owner:{owner}"),
+        assignee_id=assignee.id, client_id=client_id, assignee=assignee.model_dump(),
+    )
+    return assignee
+
+
+class WorkpaperCreate(BaseModel):
+    title: str
+    notes: str = ""
+
+
+def row_to_workpaper(r) -> Workpaper:
+    return Workpaper(id=r[0], assignee_id=r[1], title=r[2], status=r[3], notes=r[4], created_at=r[5])
+
+
+workpaper_item = list_item(Workpaper, row_to_workpaper)
+
+WORKPAPER_SQL = "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers WHERE id = ?"
+
+
+@app.get("/api/assignees/{assignee_id}/workpapers", response_model=List[Workpaper])
+async def list_workpapers(assignee_id: int, response: Response, page: Page = Depends()):
+    return list_response(response, await storage.list_workpapers(response, page, assignee_id))
+
+
+@app.post("/api/assignees/{assignee_id}/workpapers", response_model=Workpaper, status_code=201)
+async def create_workpaper(assignee_id: int, body: WorkpaperCreate):
+    workpaper = await storage.create_workpaper(assignee_id, body.title.strip(), body.notes.strip())
+    if workpaper is None:
+        raise HTTPException(status_code=404, detail="Assignee not found")
+    response_cache.invalidate(f"assignee:{assignee_id}")
+    topics = await assignee_topics(assignee_id)
+    if change_broker.listening(topics):
+        change_broker.publish("workpaper.created", topics, assignee_id=assignee_id, workpaper=workpaper.model_dump())
+    return workpaper
+
+
+@app.get("/api/assignees/{assignee_id}", response_model=AssigneeDetail)
+async def get_assignee(assignee_id: int):
+    detail = await storage.get_assignee(assignee_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Assignee not found")
+    return detail
+
+
+def load_assignee_detail(conn, assignee_id: int) -> Optional[AssigneeDetail]:
+    a = conn.execute(ASSIGNEE_SQL, (assignee_id,)).fetchone()
+    if not a:
+        return None
+    c = conn.execute(CLIENT_SQL, (a[1],)).fetchone()
+    if not c:
+        return None
+    return AssigneeDetail(
+        id=a[0], client_id=a[1], name=a[2], email=a[3], created_at=a[4],
+        client=ClientDetail(id=c[0], name=c[1], owner=c[2], created_at=c[3])
+    )
+
+
+# --------- Calculator schemas ---------
+
+INCOME_FIELDS = ("salary", "bonus", "other")
+DEDUCTION_FIELDS = ("retirement", "health", "charity")
+TAX_CALC_KEYS = ("income-tax", "deductions")
+
+
+class CalculatorSchema:
+    """A calculator whose inputs are numeric fields, stored as one REAL column per field.
+
+    Each registered calculator has its own table keyed by assignee. Bodies
+    are validated once on write and reads return the columns as they are,
+    with no JSON to parse; fields left empty are stored as NULL. Every
+    write bumps the row's ``version``. Unregistered calc keys keep
+    free-form JSON in ``calculator_data``.
+    """
+
+    def __init__(self, calc_key: str, fields):
+        self.calc_key = calc_key
+        self.fields = tuple(fields)
+        self.table = "calc_" + calc_key.replace("-", "_")
+        self.columns = ", ".join(self.fields)
+
+    def create_sql(self, id_type: str = "INTEGER", real_type: str = "REAL", now: str = "(datetime('now'))") -> str:
+        columns = "".join(f"{f} {real_type}, " for f in self.fields)
+        return (
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"assignee_id {id_type} PRIMARY KEY REFERENCES assignees(id) ON DELETE CASCADE, "
+            f"{columns}version INTEGER NOT NULL DEFAULT 1, updated_at TEXT NOT NULL DEFAULT {now})"
+        )
+
+    def select_sql(self) -> str:
+        """The fields, then the version."""
+        return f"SELECT {self.columns}, version FROM {self.table} WHERE assignee_id = ?"
+
+    def upsert_sql(self, now: str = "datetime('now')") -> str:
+        placeholders = ", ".join("?" * (len(self.fields) + 1))
+        updates = ", ".join(f"{f} = excluded.{f}" for f in self.fields)
+        return (
+            f"INSERT INTO {self.table} (assignee_id, {self.columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT(assignee_id) DO UPDATE SET {updates}, "
+            f"version = {self.table}.version + 1, updated_at = {now}"
+        )
+
+    def json_sql(self, alias: str = "") -> str:
+        """SQLite expression rebuilding the JSON body from the columns (json_patch drops the NULLs)."""
+        prefix = f"{alias}." if alias else ""
+        pairs = ", ".join(f"'{f}', {prefix}{f}" for f in self.fields)
+        return f"json_patch('{{}}', json_object({pairs}))"
+
+    def pg_json_sql(self) -> str:
+        """PostgreSQL counterpart of ``json_sql``."""
+        pairs = ", ".join(f"'{f}', {f}" for f in self.fields)
+        return f"jsonb_strip_nulls(jsonb_build_object({pairs}))"
+
+    def total_sql(self, alias: str) -> str:
+        return " + ".join(f"coalesce({alias}.{f}, 0)" for f in self.fields)
+
+    def values(self, data: dict) -> tuple:
+        """Column values for a request body; ValueError unless every key is a field holding a number or null."""
+        self._check_fields(data)
+        return tuple(self._number(f, data.get(f)) for f in self.fields)
+
+    def patch_values(self, patch: dict) -> dict:
+        """Columns to set for a JSON merge patch: only the fields it names, null clearing one."""
+        self._check_fields(patch)
+        return {f: self._number(f, patch[f]) for f in self.fields if f in patch}
+
+    def _check_fields(self, data: dict) -> None:
+        unknown = sorted(set(data) - set(self.fields))
+        if unknown:
+            raise ValueError(f"unknown {self.calc_key} fields: {', '.join(unknown)}")
+
+    def _number(self, field: str, v):
+        if v is None:
+            return None
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            raise ValueError(f"{self.calc_key}.{field} must be a number")
+        return float(v)
+
+    def coerce(self, data) -> tuple:
+        """Best-effort column values for a legacy JSON blob: numbers and numeric strings kept, the rest dropped."""
+        values = []
+        for f in self.fields:
+            v = data.get(f) if isinstance(data, dict) else None
+            try:
+                v = None if v is None or isinstance(v, bool) else float(v)
+            except (TypeError, ValueError):
+                v = None
+            values.append(v if v is None or math.isfinite(v) else None)
+        return tuple(values)
+
+    def to_dict(self, values) -> dict:
+        return {f: v for f, v in zip(self.fields, values) if v is not None}
+
+
+CALCULATOR_SCHEMAS = {
+    schema.calc_key: schema
+    for schema in (
+        CalculatorSchema("income-tax", INCOME_FIELDS),
+        CalculatorSchema("deductions", DEDUCTION_FIELDS),
+    )
+}
+INCOME_SCHEMA = CALCULATOR_SCHEMAS["income-tax"]
+DEDUCTION_SCHEMA = CALCULATOR_SCHEMAS["deductions"]
+
+
+def calc_values(calc_key: str, data: dict, patch: bool = False):
+    """Validated {column: value} for a registered calculator, or the body unchanged for a free-form one.
+
+    A full save sets every field (absent ones to NULL); a ``patch`` only the fields it names.
+    """
+    schema = CALCULATOR_SCHEMAS.get(calc_key)
+    if schema is None:
+        return data
+    try:
+        return schema.patch_values(data) if patch else dict(zip(schema.fields, schema.values(data)))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+class CalcWrite(NamedTuple):
+    """One calculator save, as built by the handlers from ``calc_values``."""
+
+    calc_key: str
+    values: dict  # columns to set for a registered calculator, else the JSON body or merge patch
+    patch: bool = False
+    expected: Optional[int] = None  # only apply on top of this version (0: the row must not exist yet)
+
+
+class VersionConflict(Exception):
+    """A conditional calculator save found a different version than the one it was based on."""
+
+    def __init__(self, calc_key: str, version: int):
+        super().__init__(f"{calc_key} is at version {version}")
+        self.calc_key = calc_key
+        self.version = version
+
+
+def calc_write_sql(assignee_id: int, write: CalcWrite, now: str = "datetime('now')", encode=json.dumps):
+    """SQL and parameters for ``write``, returning the new version, or no row if ``expected`` did not match.
+
+    Only the given columns are written. Free-form merge patches are applied
+    in the statement with ``json_patch`` (a PL/pgSQL function of the same
+    name on PostgreSQL), so the stored document is never read back first.
+    """
+    schema = CALCULATOR_SCHEMAS.get(write.calc_key)
+    if schema is not None:
+        table, keys, key_params = schema.table, ("assignee_id",), (assignee_id,)
+        columns = list(write.values)
+        inserts = ["?"] * len(columns)
+        sets = [f"{c} = ?" for c in columns]
+        params = list(write.values.values())
+    else:
+        table, keys, key_params = "calculator_data", ("assignee_id", "calc_key"), (assignee_id, write.calc_key)
+        columns = ["data"]
+        if write.patch:
+            inserts, sets = ["json_patch('{}', ?)"], ["data = json_patch(calculator_data.data, ?)"]
+        else:
+            inserts, sets = ["?"], ["data = ?"]
+        params = [encode(write.values)]
+    sets = ", ".join(sets + [f"version = {table}.version + 1", f"updated_at = {now}"])
+    if write.expected:
+        where = " AND ".join(f"{k} = ?" for k in keys)
+        sql = f"UPDATE {table} SET {sets} WHERE {where} AND version = ? RETURNING version"
+        return sql, (*params, *key_params, write.expected)
+    sql = (
+        f"INSERT INTO {table} ({', '.join((*keys, *columns))}) "
+        f"VALUES ({', '.join(['?'] * len(keys) + inserts)}) ON CONFLICT({', '.join(keys)}) "
+    )
+    if write.expected == 0:
+        return sql + "DO NOTHING RETURNING version", (*key_params, *params)
+    return sql + f"DO UPDATE SET {sets} RETURNING version", (*key_params, *params, *params)
+
+
+FREE_CALC_SQL = "SELECT data, version FROM calculator_data WHERE assignee_id = ? AND calc_key = ?"
+
+
+def calc_version_query(assignee_id: int, calc_key: str):
+    schema = CALCULATOR_SCHEMAS.get(calc_key)
+    if schema is not None:
+        return f"SELECT version FROM {schema.table} WHERE assignee_id = ?", (assignee_id,)
+    return "SELECT version FROM calculator_data WHERE assignee_id = ? AND calc_key = ?", (assignee_id, calc_key)
+
+
+def add_calc_versions(conn) -> None:
+    """Add ``version`` to calculator tables created before it existed."""
+    for table in ("calculator_data", *(schema.table for schema in CALCULATOR_SCHEMAS.values())):
+        if "version" not in {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def migrate_calculator_data(conn) -> None:
+    """Move registered calculators' JSON rows into their typed tables.
+
+    Idempotent; call it from a new migration after registering another schema.
+    A moved row takes the next version after its JSON row's, so it does not
+    reuse a version the audit log already has an entry for.
+    """
+    versioned = "version" in {r[1] for r in conn.execute("PRAGMA table_info(calculator_data)")}
+    for schema in CALCULATOR_SCHEMAS.values():
+        conn.execute(schema.create_sql())
+        rows = conn.execute(
+            f"SELECT assignee_id, data, {'version + 1' if versioned else '1'}, updated_at FROM calculator_data "
+            "WHERE calc_key = ?",
+            (schema.calc_key,),
+        ).fetchall()
+        migrated = []
+        for assignee_id, data, version, updated_at in rows:
+            try:
+                data = json.loads(data)
+            except ValueError:
+                data = {}
+            migrated.append((assignee_id, *schema.coerce(data), version, updated_at))
+        placeholders = ", ".join("?" * (len(schema.fields) + 3))
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {schema.table} (assignee_id, {schema.columns}, version, updated_at) "
+            f"VALUES ({placeholders})",
+            migrated,
+        )
+        conn.execute("DELETE FROM calculator_data WHERE calc_key = ?", (schema.calc_key,))
+
+
+def calc_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_version(request: Request) -> Optional[int]:
+    """The version an If-Match header makes a save conditional on (None without one, or for ``*``)."""
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    match = re.fullmatch(r'\s*(?:W/)?"(\d+)"\s*', header)
+    if match is None:
+        raise HTTPException(status_code=400, detail="If-Match must be a calculator ETag")
+    return int(match.group(1))
+
+
+@app.get("/api/assignees/{assignee_id}/calc/{calc_key}")
+async def get_calc_data(request: Request, assignee_id: int, calc_key: str, as_of: Optional[str] = None):
+    """Calculator inputs and their ``version`` (0 before the first save), which is also the ETag.
+
+    With ``as_of`` (an ISO date or date-time, UTC) the inputs are rebuilt
+    from the audit log as they stood then, with the time of that version.
+    """
+    if as_of is not None:
+        state = await audit_state(assignee_id, f"calc/{calc_key}", as_of)
+        return {"data": calc_audit_data(calc_key, state.data), "version": state.version, "changed_at": state.changed_at}
+    data, version = await storage.get_calc(assignee_id, calc_key) or ({}, 0)
+    headers = {"ETag": calc_etag(version), "Cache-Control": "no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(json_body({"data": data, "version": version}), media_type="application/json", headers=headers)
+
+
+class SaveCalcBody(BaseModel):
+    data: dict
+
+
+async def save_calcs(assignee_id: int, writes: List[CalcWrite]) -> Dict[str, int]:
+    try:
+        versions = await storage.write_calcs(assignee_id, writes)
+    except VersionConflict as e:
+        raise HTTPException(
+            status_code=412,
+            detail=f"{e.calc_key} was changed since version was read (now version {e.version})",
+            headers={"ETag": calc_etag(e.version)},
+        )
+    if versions is None:
+        raise HTTPException(status_code=404, detail="Assignee not found")
+    response_cache.invalidate(f"assignee:{assignee_id}")
+    for calc_key in versions:
+        await publish_calc_change(assignee_id, calc_key)
+    return versions
+
+
+@app.put("/api/assignees/{assignee_id}/calc/{calc_key}")
+async def put_calc_data(request: Request, response: Response, assignee_id: int, calc_key: str, body: SaveCalcBody):
+    """Replace calculator inputs; registered calculators (income-tax, deductions) take numeric fields only.
+
+    With ``If-Match: "<version>"`` the save only applies on top of that
+    version; otherwise it gets a 412 carrying the current version's ETag.
+    """
+    write = CalcWrite(calc_key, calc_values(calc_key, body.data or {}), expected=if_match_version(request))
+    version = (await save_calcs(assignee_id, [write]))[calc_key]
+    response.headers["ETag"] = calc_etag(version)
+    return {"status": "ok", "version": version}
+
+
+@app.patch("/api/assignees/{assignee_id}/calc/{calc_key}")
+async def patch_calc_data(request: Request, response: Response, assignee_id: int, calc_key: str, body: SaveCalcBody):
+    """Apply ``data`` as a JSON merge patch (RFC 7396): keys present are set, null removes one, the rest stay.
+
+    Send only the fields that changed. If-Match works as for PUT.
+    """
+    write = CalcWrite(calc_key, calc_values(calc_key, body.data, patch=True), True, if_match_version(request))
+    version = (await save_calcs(assignee_id, [write]))[calc_key]
+    response.headers["ETag"] = calc_etag(version)
+    return {"status": "ok", "version": version}
+
+
+class CalcChange(BaseModel):
+    data: dict
+    version: Optional[int] = None  # as If-Match: only save on top of this version
+
+
+class SaveCalcsBody(BaseModel):
+    calcs: Dict[str, CalcChange]
+    patch: bool = False  # apply each ``data`` as a JSON merge patch instead of replacing
+
+
+@app.post("/api/assignees/{assignee_id}/calc:batch")
+async def save_calc_batch(assignee_id: int, body: SaveCalcsBody):
+    """Save several calculators in one transaction: every one is written, or (on a 412 or 422) none."""
+    if not body.calcs:
+        raise HTTPException(status_code=422, detail="calcs must not be empty")
+    writes = [
+        CalcWrite(calc_key, calc_values(calc_key, change.data, body.patch), body.patch, change.version)
+        for calc_key, change in body.calcs.items()
+    ]
+    return {"versions": await save_calcs(assignee_id, writes)}
+
+
+async def publish_calc_change(assignee_id: int, calc_key: str) -> None:
+    """Publish the calculator's stored data (and new tax totals) to anyone watching the assignee.
+
+    The event carries what is stored at publish time, not the request body,
+    so whichever event of two racing writes arrives last is the current state.
+    """
+    topics = await assignee_topics(assignee_id)
+    if not change_broker.listening(topics):
+        return
+    data, version = await storage.get_calc(assignee_id, calc_key) or ({}, 0)
+    payload = {"assignee_id": assignee_id, "calc_key": calc_key, "data": data, "version": version}
+    if calc_key in TAX_CALC_KEYS:
+        payload["totals"] = await storage.assignee_overview(assignee_id, False)
+    change_broker.publish("calc.updated", topics, **payload)
+
+
+# --------- Audit log API ---------
+
+# Every calculator save and workpaper change appends an entry to audit_log
+# from a trigger, in the writing transaction. Entities are 'calc/<calc_key>'
+# and 'workpaper/<id>'; an entry holds a JSON merge patch (RFC 7396) of the
+# top-level fields that changed, or with ``snapshot`` the whole state, which
+# is written on insert, when the change is not expressible as a merge patch
+# (an object or null value), and every AUDIT_SNAPSHOT_EVERY versions, so a
+# state is rebuilt from at most that many entries. Every calculator version
+# has an entry ({} when a save changed nothing). Entries are only inserted,
+# and outlive the assignee; compact-audit's retention is the one thing that
+# rewrites or removes them.
+AUDIT_SNAPSHOT_EVERY = 32
+AUDIT_COMPACT_BATCH = 200
+
+AUDIT_LOG_SQL = """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        assignee_id INTEGER NOT NULL,
+        entity TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        changed_at TEXT NOT NULL,
+        snapshot INTEGER NOT NULL DEFAULT 0,
+        delta TEXT NOT NULL,
+        PRIMARY KEY (assignee_id, entity, version)
+    ) WITHOUT ROWID
+"""
+
+AUDIT_SNAPSHOTS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_snapshots ON audit_log(assignee_id, entity, changed_at) WHERE snapshot = 1"
+)
+
+AUDIT_ENTRIES_SELECT = "SELECT version, changed_at, snapshot, delta FROM audit_log"
+
+# The newest snapshot at or before a time, then the entries up to that time
+AUDIT_STATE_SQL = AUDIT_ENTRIES_SELECT + """
+    WHERE assignee_id = ? AND entity = ? AND changed_at <= ? AND version >= (
+        SELECT max(version) FROM audit_log
+        WHERE assignee_id = ? AND entity = ? AND snapshot = 1 AND changed_at <= ?
+    )
+    ORDER BY version
+"""
+
+AUDIT_ENTITY_SQL = AUDIT_ENTRIES_SELECT + " WHERE assignee_id = ? AND entity = ? ORDER BY version"
+AUDIT_SNAPSHOT_SQL = "UPDATE audit_log SET snapshot = 1, delta = ? WHERE assignee_id = ? AND entity = ? AND version = ?"
+AUDIT_TRIM_SQL = "DELETE FROM audit_log WHERE assignee_id = ? AND entity = ? AND version < ?"
+
+# Entities past a retention limit, in key order from a cursor: more entries
+# than kept, or more than one older than the cutoff (the newest of those stays)
+AUDIT_COMPACT_SQL = """
+    SELECT assignee_id, entity FROM audit_log
+    WHERE (assignee_id, entity) > (?, ?)
+    GROUP BY assignee_id, entity
+    HAVING count(*) > ? OR sum(CASE WHEN changed_at < ? THEN 1 ELSE 0 END) > 1
+    ORDER BY assignee_id, entity
+    LIMIT ?
+"""
+
+AUDIT_ENTITY_PATTERN = re.compile(r"calc/[^/]+|workpaper/\d+")
+
+
+def audit_record_sql(entity: str, old: str, new: str) -> str:
+    """Append the change from JSON document ``old`` to ``new`` as one entry ({} if no top-level field changed)."""
+    return f"""
+        INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta)
+        SELECT new.assignee_id, {entity}, new.version, new.updated_at, d.whole, CASE WHEN d.whole THEN {new} ELSE d.patch END
+        FROM (
+            SELECT
+                json_group_object(key, CASE WHEN type IN ('true', 'false') THEN json(type)
+                    WHEN type IN ('array', 'object') THEN json(value) ELSE value END) AS patch,
+                new.version % {AUDIT_SNAPSHOT_EVERY} = 0 OR json_type({old}) IS NOT 'object'
+                    OR json_type({new}) IS NOT 'object' OR coalesce(max(type IN ('object', 'null')), 0) AS whole
+            FROM (
+                SELECT n.key AS key, n.type AS type, n.value AS value
+                FROM json_each({new}) n LEFT JOIN json_each({old}) o ON o.key = n.key
+                WHERE o.key IS NULL OR o.type IS NOT n.type OR o.value IS NOT n.value
+                UNION ALL
+                SELECT o.key, 'removed', NULL FROM json_each({old}) o
+                WHERE NOT EXISTS (SELECT 1 FROM json_each({new}) n WHERE n.key = o.key)
+            )
+        ) d;
+    """
+
+
+def audit_columns_sql(entity: str, version: str, at: str, fields, new: str) -> str:
+    """Append an UPDATE of scalar columns: the changed ones, null where cleared, or ``new`` as a snapshot.
+
+    Calculator triggers run on every version bump, so an unchanged save
+    appends ``{}``; the workpaper trigger only runs when ``audit_changed``.
+    """
+    changed = " UNION ALL ".join(f"SELECT '{f}' AS field, new.{f} AS value WHERE old.{f} IS NOT new.{f}" for f in fields)
+    snapshot = f"{version} % {AUDIT_SNAPSHOT_EVERY} = 0"
+    return f"""
+        INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta)
+        VALUES (
+            new.assignee_id, {entity}, {version}, {at}, {snapshot},
+            CASE WHEN {snapshot} THEN {new} ELSE (SELECT json_group_object(field, value) FROM ({changed})) END
+        );
+    """
+
+
+def audit_snapshot_sql(entity: str, version: str, at: str, new: str) -> str:
+    return f"""
+        INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta)
+        VALUES (new.assignee_id, {entity}, {version}, {at}, 1, {new});
+    """
+
+
+def audit_changed(fields) -> str:
+    return " OR ".join(f"old.{f} IS NOT new.{f}" for f in fields)
+
+
+WORKPAPER_AUDIT_FIELDS = ("title", "status", "notes")
+WORKPAPER_AUDIT_JSON = "json_object('title', {0}.title, 'status', {0}.status, 'notes', {0}.notes)"
+# Free-form calculator data is written as JSON; anything else is logged as a JSON string
+CALC_DATA_AUDIT_JSON = "CASE WHEN json_valid({0}.data) THEN {0}.data ELSE json_quote({0}.data) END"
+
+
+def audit_triggers() -> List[str]:
+    triggers = {}
+    for schema in CALCULATOR_SCHEMAS.values():
+        entity, new = f"'calc/{schema.calc_key}'", schema.json_sql("new")
+        triggers[f"audit_{schema.table}_ai AFTER INSERT ON {schema.table}"] = audit_snapshot_sql(
+            entity, "new.version", "new.updated_at", new
+        )
+        triggers[
+            f"audit_{schema.table}_au AFTER UPDATE ON {schema.table} "
+            "WHEN new.version IS NOT old.version"
+        ] = audit_columns_sql(entity, "new.version", "new.updated_at", schema.fields, new)
+    entity = "'calc/' || new.calc_key"
+    triggers["audit_calculator_data_ai AFTER INSERT ON calculator_data"] = audit_snapshot_sql(
+        entity, "new.version", "new.updated_at", CALC_DATA_AUDIT_JSON.format("new")
+    )
+    triggers["audit_calculator_data_au AFTER UPDATE ON calculator_data WHEN new.version IS NOT old.version"] = (
+        audit_record_sql(entity, CALC_DATA_AUDIT_JSON.format("old"), CALC_DATA_AUDIT_JSON.format("new"))
+    )
+    # Workpapers have no version column; entries number their changes
+    entity = "'workpaper/' || new.id"
+    triggers["audit_workpapers_ai AFTER INSERT ON workpapers"] = audit_snapshot_sql(
+        entity, "1", "new.created_at", WORKPAPER_AUDIT_JSON.format("new")
+    )
+    next_version = f"(SELECT coalesce(max(version), 0) + 1 FROM audit_log WHERE assignee_id = new.assignee_id AND entity = {entity})"
+    triggers[
+        f"audit_workpapers_au AFTER UPDATE OF {', '.join(WORKPAPER_AUDIT_FIELDS)} ON workpapers "
+        f"WHEN {audit_changed(WORKPAPER_AUDIT_FIELDS)}"
+    ] = audit_columns_sql(entity, next_version, "datetime('now')", WORKPAPER_AUDIT_FIELDS, WORKPAPER_AUDIT_JSON.format("new"))
+    return [f"CREATE TRIGGER IF NOT EXISTS {head} BEGIN {body} END" for head, body in triggers.items()]
+
+
+def add_audit_log(conn) -> None:
+    """Create the log and its triggers; what is stored now becomes each entity's first entry."""
+    conn.execute(AUDIT_LOG_SQL)
+    conn.execute(AUDIT_SNAPSHOTS_INDEX)
+    for trigger in audit_triggers():
+        conn.execute(trigger)
+    insert = "INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta) "
+    for schema in CALCULATOR_SCHEMAS.values():
+        conn.execute(
+            insert + f"SELECT assignee_id, 'calc/{schema.calc_key}', version, updated_at, 1, {schema.json_sql()} FROM {schema.table}"
+        )
+    conn.execute(
+        insert + "SELECT c.assignee_id, 'calc/' || c.calc_key, c.version, c.updated_at, 1, "
+        + CALC_DATA_AUDIT_JSON.format("c") + " FROM calculator_data c"
+    )
+    conn.execute(
+        insert + "SELECT w.assignee_id, 'workpaper/' || w.id, 1, w.created_at, 1, "
+        + WORKPAPER_AUDIT_JSON.format("w") + " FROM workpapers w"
+    )
+
+
+def rebuild_audit_log(conn) -> None:
+    """Recreate the audit triggers, and audit_log without the cascading foreign key it had at version 9."""
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'audit%'").fetchall()
+    for (name,) in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    if conn.execute("SELECT 1 FROM pragma_foreign_key_list('audit_log')").fetchone():
+        columns = "assignee_id, entity, version, changed_at, snapshot, delta"
+        conn.execute("ALTER TABLE audit_log RENAME TO audit_log_cascading")
+        conn.execute(AUDIT_LOG_SQL)
+        conn.execute(f"INSERT INTO audit_log ({columns}) SELECT {columns} FROM audit_log_cascading")
+        conn.execute("DROP TABLE audit_log_cascading")
+        conn.execute(AUDIT_SNAPSHOTS_INDEX)
+    for trigger in audit_triggers():
+        conn.execute(trigger)
+
+
+def merge_patch(target, patch):
+    """RFC 7396 merge patch, as SQLite's json_patch."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def audit_delta(value):
+    """An entry's delta: JSON text from SQLite, already decoded from PostgreSQL's JSONB."""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def audit_fold(rows):
+    """(version, changed_at, state) after the ``(version, changed_at, snapshot, delta)`` rows, or None for none."""
+    state = None
+    for version, changed_at, snapshot, delta in rows:
+        delta = audit_delta(delta)
+        state = delta if snapshot else merge_patch(state, delta)
+    return (rows[-1][0], rows[-1][1], state) if rows else None
+
+
+def audit_compaction(rows, keep: int, cutoff: str):
+    """(version, state) of the entry that becomes an entity's oldest, as a snapshot; None if nothing goes.
+
+    ``rows`` are all of the entity's entries in version order. At most
+    ``keep`` of them stay, and of those older than ``cutoff`` only the newest.
+    """
+    boundary = len(rows) - keep if keep else 0
+    for i, row in enumerate(rows):
+        if row[1] < cutoff:
+            boundary = max(boundary, i)
+    if boundary <= 0:
+        return None
+    return rows[boundary][0], audit_fold(rows[:boundary + 1])[2]
+
+
+def audit_cutoff(days: int) -> str:
+    """Timestamp before which entries are past ``days`` of retention ('' when unlimited)."""
+    if not days:
+        return ""
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_as_of(value: str) -> str:
+    """``as_of`` in the stored timestamps' format (UTC); a bare date means the end of that day."""
+    try:
+        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+            return datetime.date.fromisoformat(value).isoformat() + " 23:59:59"
+        at = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="as_of must be an ISO date or date-time")
+    if at.tzinfo is not None:
+        at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return at.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def check_audit_entity(entity: str) -> str:
+    if not AUDIT_ENTITY_PATTERN.fullmatch(entity):
+        raise HTTPException(status_code=400, detail="entity must be calc/<calc_key> or workpaper/<id>")
+    return entity
+
+
+def calc_audit_data(calc_key: str, data) -> dict:
+    """A rebuilt calculator state shaped as ``get_calc`` returns it (floats for registered fields)."""
+    schema = CALCULATOR_SCHEMAS.get(calc_key)
+    return schema.to_dict(schema.coerce(data)) if schema is not None else data
+
+
+class AuditEntry(BaseModel):
+    version: int
+    changed_at: str
+    snapshot: bool  # changes is the whole state rather than a merge patch on the previous version
+    changes: dict
+
+
+def audit_item(row) -> dict:
+    return {"version": row[0], "changed_at": row[1], "snapshot": bool(row[2]), "changes": audit_delta(row[3])}
+
+
+class AuditState(BaseModel):
+    entity: str
+    version: int
+    changed_at: str
+    data: dict
+
+
+async def audit_state(assignee_id: int, entity: str, as_of: str) -> AuditState:
+    found = await storage.audit_state(assignee_id, check_audit_entity(entity), parse_as_of(as_of))
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"No {entity} history as of {as_of}")
+    version, changed_at, data = found
+    return AuditState(entity=entity, version=version, changed_at=changed_at, data=data)
+
+
+@app.get("/api/assignees/{assignee_id}/audit", response_model=List[AuditEntry])
+async def list_audit(response: Response, assignee_id: int, entity: str, page: Page = Depends()):
+    """Recorded changes of one calculator (``calc/<calc_key>``) or workpaper (``workpaper/<id>``), newest first."""
+    return list_response(response, await storage.list_audit(response, page, assignee_id, check_audit_entity(entity)))
+
+
+@app.get("/api/assignees/{assignee_id}/audit/state", response_model=AuditState)
+async def get_audit_state(assignee_id: int, entity: str, as_of: str):
+    """An entity's state as of ``as_of`` (ISO date or date-time, UTC), rebuilt from the log.
+
+    404 if it did not exist then, or that time is past the retention limit.
+    """
+    return await audit_state(assignee_id, entity, as_of)
+
+
+@app.post("/api/audit:compact")
+async def compact_audit(keep_versions: int = Query(AUDIT_KEEP_VERSIONS, ge=0), keep_days: int = Query(AUDIT_KEEP_DAYS, ge=0)):
+    """Drop entries past retention (0: no limit); each entity's oldest remaining entry becomes a snapshot."""
+    return await storage.compact_audit(keep_versions, audit_cutoff(keep_days))
+
+
+# --------- Tax summary API ---------
+
+# The bracket arithmetic lives in tax.py; this section picks the schedules
+# and keeps the per-assignee results in tax_summary.
+TAX_SCHEDULES = load_tax_schedules(TAX_BRACKETS_FILE)
+if (TAX_JURISDICTION, TAX_YEAR) not in TAX_SCHEDULES:
+    raise RuntimeError(f"no tax brackets for TAX_JURISDICTION={TAX_JURISDICTION} TAX_YEAR={TAX_YEAR}")
+
+
+def tax_schedule(jurisdiction: Optional[str] = None, year: Optional[int] = None) -> TaxSchedule:
+    key = (jurisdiction or TAX_JURISDICTION, year or TAX_YEAR)
+    schedule = TAX_SCHEDULES.get(key)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail=f"No tax brackets for {key[0]} {key[1]}")
+    return schedule
+
+
+def tax_totals(income_total: float, deductions_total: float, schedule: Optional[TaxSchedule] = None) -> dict:
+    return tax.tax_totals(income_total, deductions_total, schedule or tax_schedule())
+
+
+# Income and deduction totals per assignee, in SQL both databases accept
+TAX_TOTALS_SELECT = f"""
+    SELECT a.id, a.client_id, {INCOME_SCHEMA.total_sql("i")}, {DEDUCTION_SCHEMA.total_sql("d")}
+    FROM assignees a
+    LEFT JOIN {INCOME_SCHEMA.table} i ON i.assignee_id = a.id
+    LEFT JOIN {DEDUCTION_SCHEMA.table} d ON d.assignee_id = a.id
+"""
+
+
+def tax_totals_query(assignee_ids: Optional[List[int]]):
+    """SQL and parameters reading the summed inputs of ``assignee_ids`` (all if None)."""
+    if assignee_ids is None:
+        return TAX_TOTALS_SELECT, ()
+    return TAX_TOTALS_SELECT + " WHERE a.id IN (SELECT value FROM json_each(?))", (json.dumps(assignee_ids),)
+
+
+def refresh_tax_summary(conn, assignee_ids: Optional[List[int]] = None) -> None:
+    """Recompute tax_summary rows from the typed calculator tables (all assignees if ids is None).
+
+    Runs inside the caller's transaction; write_calcs calls it for the
+    assignee it just wrote so the summary never lags the inputs.
+    """
+    sql, params = tax_totals_query(assignee_ids)
+    rows = []
+    for aid, cid, income_total, deductions_total in conn.execute(sql, params):
+        t = tax_totals(income_total, deductions_total)
+        rows.append((aid, cid, t["income_total"], t["deductions_total"], t["taxable_income"], t["estimated_tax"]))
+    conn.executemany(
+        """
+        INSERT INTO tax_summary
+            (assignee_id, client_id, income_total, deductions_total, taxable_income, estimated_tax)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(assignee_id) DO UPDATE SET
+            client_id = excluded.client_id,
+            income_total = excluded.income_total,
+            deductions_total = excluded.deductions_total,
+            taxable_income = excluded.taxable_income,
+            estimated_tax = excluded.estimated_tax,
+            updated_at = datetime('now')
+        """,
+        rows,
+    )
+
+
+def tax_summary_current(conn) -> bool:
+    """Whether tax_summary was computed with the current default bracket table."""
+    row = conn.execute("SELECT value FROM settings WHERE key = 'tax_schedule'").fetchone()
+    return row is not None and row[0] == tax_schedule().fingerprint()
+
+
+def sync_tax_summary(conn) -> bool:
+    """Rebuild tax_summary if it was computed with a different bracket table than the current default.
+
+    Returns True when it rebuilt, so the caller can drop cached responses.
+    """
+    if tax_summary_current(conn):
+        return False
+    fingerprint = tax_schedule().fingerprint()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        refresh_tax_summary(conn)
+        conn.execute(
+            "INSERT INTO settings (key, value) VALUES ('tax_schedule', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (fingerprint,),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+TAX_SUMMARY_COLUMNS = """
+    coalesce(ts.income_total, 0.0), coalesce(ts.deductions_total, 0.0),
+    coalesce(ts.taxable_income, 0.0), coalesce(ts.estimated_tax, 0.0)
+"""
+
+
+ASSIGNEE_OVERVIEW_SQL = f"""
+    SELECT {TAX_SUMMARY_COLUMNS},
+        {", ".join(f"i.{f}" for f in INCOME_SCHEMA.fields)},
+        {", ".join(f"d.{f}" for f in DEDUCTION_SCHEMA.fields)}
+    FROM assignees a
+    LEFT JOIN tax_summary ts ON ts.assignee_id = a.id
+    LEFT JOIN {INCOME_SCHEMA.table} i ON i.assignee_id = a.id
+    LEFT JOIN {DEDUCTION_SCHEMA.table} d ON d.assignee_id = a.id
+    WHERE a.id = ?
+"""
+
+ASSIGNEE_TOTALS_SQL = f"""
+    SELECT {TAX_SUMMARY_COLUMNS}
+    FROM assignees a
+    LEFT JOIN tax_summary ts ON ts.assignee_id = a.id
+    WHERE a.id = ?
+"""
+
+
+@app.get("/api/assignees/{assignee_id}/overview")
+async def assignee_overview(
+    assignee_id: int, include_inputs: bool = True, jurisdiction: Optional[str] = None, year: Optional[int] = None
+):
+    """Stored totals for one assignee; ``jurisdiction``/``year`` re-estimate the tax under other brackets."""
+    schedule = tax_schedule(jurisdiction, year)
+    result = await storage.assignee_overview(assignee_id, include_inputs)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Assignee not found")
+    if schedule is not tax_schedule():
+        result["estimated_tax"] = schedule.tax(result["taxable_income"])
+    return result
+
+
+BUNDLE_SECTIONS = ("assignee", "calcs", "overview", "workpapers")
+
+WORKPAPERS_SQL = "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers WHERE assignee_id = ? ORDER BY id DESC"
+FREE_CALCS_SQL = "SELECT calc_key, data, version FROM calculator_data WHERE assignee_id = ? ORDER BY calc_key"
+
+
+def bundle_sections(include: str) -> tuple:
+    """The sections named in ``include`` (comma-separated), in BUNDLE_SECTIONS order; all of them if empty."""
+    names = {n.strip() for n in include.split(",") if n.strip()}
+    unknown = names - set(BUNDLE_SECTIONS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown bundle section(s): {', '.join(sorted(unknown))}; expected {', '.join(BUNDLE_SECTIONS)}",
+        )
+    return tuple(n for n in BUNDLE_SECTIONS if n in names or not names)
+
+
+def bundle_calcs(typed_rows: dict, free_calcs) -> dict:
+    """Every registered calculator (version 0 and no data before the first save), then the free-form ones."""
+    calcs = {}
+    for calc_key, schema in CALCULATOR_SCHEMAS.items():
+        row = typed_rows.get(calc_key)
+        calcs[calc_key] = {"data": schema.to_dict(tuple(row)[:-1]), "version": row[-1]} if row else {"data": {}, "version": 0}
+    for calc_key, data, version in free_calcs:
+        calcs[calc_key] = {"data": data, "version": version}
+    return calcs
+
+
+@app.get("/api/assignees/{assignee_id}/bundle")
+async def assignee_bundle(request: Request, assignee_id: int, include: str = ""):
+    """What the workpaper pages show for one assignee, read in one transaction.
+
+    ``include`` picks sections: assignee (with its client), calcs (every
+    calculator's data and version), overview (stored totals and inputs) and
+    workpapers; all of them by default. The body is cached per assignee and
+    section set, with an ETag for If-None-Match; calculator saves, new
+    workpapers and client changes invalidate it.
+    """
+    sections = bundle_sections(include)
+
+    async def produce():
+        bundle = await storage.assignee_bundle(assignee_id, sections)
+        if bundle is None:
+            raise HTTPException(status_code=404, detail="Assignee not found")
+        return bundle
+
+    return await cached_json(
+        request, ("assignee_bundle", assignee_id, sections), {f"assignee:{assignee_id}", "clients"}, produce
+    )
+
+
+class AssigneeTaxSummary(BaseModel):
+    assignee_id: int
+    client_id: int
+    name: str
+    income_total: float
+    deductions_total: float
+    taxable_income: float
+    estimated_tax: float
+
+
+class OverviewBatchBody(BaseModel):
+    assignee_ids: List[int]
+
+
+TAX_SUMMARY_SELECT = f"""
+    SELECT a.id, a.client_id, a.name, {TAX_SUMMARY_COLUMNS}
+    FROM assignees a
+    LEFT JOIN tax_summary ts ON ts.assignee_id = a.id
+"""
+TAX_SUMMARIES_SQL = TAX_SUMMARY_SELECT + " WHERE a.id IN (SELECT value FROM json_each(?)) ORDER BY a.id"
+
+
+def row_to_tax_summary(r) -> AssigneeTaxSummary:
+    return AssigneeTaxSummary(
+        assignee_id=r[0], client_id=r[1], name=r[2],
+        income_total=r[3], deductions_total=r[4], taxable_income=r[5], estimated_tax=r[6],
+    )
+
+
+tax_summary_item = list_item(AssigneeTaxSummary, row_to_tax_summary)
+
+
+@app.post("/api/assignees/overview:batch", response_model=List[AssigneeTaxSummary])
+async def assignee_overview_batch(body: OverviewBatchBody, response: Response):
+    if len(body.assignee_ids) > 10000:
+        raise HTTPException(status_code=400, detail="At most 10000 assignee ids per batch")
+    return list_response(response, await storage.tax_summaries(body.assignee_ids))
+
+
+@app.get("/api/clients/{client_id}/assignees/overview", response_model=List[AssigneeTaxSummary])
+async def client_assignees_overview(client_id: int, response: Response, page: Page = Depends()):
+    return list_response(response, await storage.list_client_tax_summaries(response, page, client_id))
+
+
+@app.get("/api/home/my-assignees/overview", response_model=List[AssigneeTaxSummary])
+async def owner_assignees_overview(response: Response, owner: str = "demo", page: Page = Depends()):
+    return list_response(response, await storage.list_owner_tax_summaries(response, page, owner))
+
+
+class TaxAggregate(BaseModel):
+    assignees: int
+    income_total: float
+    deductions_total: float
+    taxable_income: float
+    estimated_tax: float
+
+
+TAX_AGGREGATE_SELECT = """
+    SELECT count(*), total(income_total), total(deductions_total),
+        total(taxable_income), round(total(estimated_tax), 2)
+    FROM tax_summary
+"""
+CLIENT_TAX_AGGREGATE_SQL = TAX_AGGREGATE_SELECT + " WHERE client_id = ?"
+OWNER_TAX_AGGREGATE_SQL = TAX_AGGREGATE_SELECT + " WHERE client_id IN (SELECT id FROM clients WHERE owner = ?)"
+
+
+def row_to_tax_aggregate(r) -> TaxAggregate:
+    return TaxAggregate(
+        assignees=r[0], income_total=r[1], deductions_total=r[2], taxable_income=r[3], estimated_tax=r[4]
+    )
+
+
+@app.get("/api/clients/{client_id}/tax-summary", response_model=TaxAggregate)
+async def client_tax_summary(client_id: int):
+    return await storage.client_tax_aggregate(client_id)
+
+
+@app.get("/api/home/tax-summary", response_model=TaxAggregate)
+async def owner_tax_summary(owner: str = "demo"):
+    return await storage.owner_tax_aggregate(owner)
+
+
+# --------- Change feed API ---------
+
+async def assignee_topics(assignee_id: int) -> List[str]:
+    """Change feed topics an assignee's events go to: the assignee, its client and the client's owner."""
+    if not change_broker.active:
+        return []
+    scope = await storage.assignee_scope(assignee_id)
+    if scope is None:
+        return []
+    client_id, owner = scope
+    return [f"assignee:{assignee_id}", f"client:{client_id}", f"owner:{owner}"]
+
+
+def change_topics(assignee_id: Optional[int], client_id: Optional[int], owner: Optional[str]) -> List[str]:
+    topics = []
+    if assignee_id is not None:
+        topics.append(f"assignee:{assignee_id}")
+    if client_id is not None:
+        topics.append(f"client:{client_id}")
+    if owner is not None:
+        topics.append(f"owner:{owner}")
+    return topics
+
+
+@app.get("/api/changes/stream")
+async def change_stream(
+    request: Request, assignee_id: Optional[int] = None, client_id: Optional[int] = None, owner: Optional[str] = None
+):
+    """Server-Sent Events feed of changes to an assignee, a client and/or an owner's clients.
+
+    Each event is one JSON ``data:`` line with its ``type`` (calc.updated,
+    workpaper.created, assignee.created, client.assigned, resync) and the
+    changed data, so clients apply it instead of re-fetching. Reconnects
+    resume from the Last-Event-ID header.
+    """
+    topics = change_topics(assignee_id, client_id, owner)
+    if not topics:
+        raise HTTPException(status_code=400, detail="Pass assignee_id, client_id and/or owner")
+    last_id = request.headers.get("last-event-id", "")
+
+    async def generate():
+        sub = change_broker.subscribe(topics)
+        try:
+            if last_id.isdigit():
+                change_broker.replay(sub, int(last_id))
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), CHANGE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/api/changes/ws")
+async def change_socket(
+    websocket: WebSocket, assignee_id: Optional[int] = None, client_id: Optional[int] = None, owner: Optional[str] = None
+):
+    """The same events as ``/api/changes/stream`` as JSON WebSocket messages, with ``ping`` keepalives."""
+    topics = change_topics(assignee_id, client_id, owner)
+    if not topics:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    sub = change_broker.subscribe(topics)
+
+    async def pump():
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), CHANGE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_text(json.dumps(event))
+
+    sender = asyncio.create_task(pump())
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass  # nothing to read from clients; wait for the close
+    finally:
+        sender.cancel()
+        change_broker.unsubscribe(sub)
+
+
+# --------- Tax what-if API ---------
+
+class TaxScenario(BaseModel):
+    name: str
+    jurisdiction: Optional[str] = None
+    year: Optional[int] = None
+    income_factor: float = 1.0
+    extra_deductions: float = 0.0
+
+
+class WhatIfBody(BaseModel):
+    client_id: Optional[int] = None
+    owner: Optional[str] = None
+    scenarios: List[TaxScenario]
+
+
+class ScenarioResult(BaseModel):
+    name: str
+    jurisdiction: str
+    year: int
+    assignees: int
+    income_total: float
+    deductions_total: float
+    taxable_income: float
+    estimated_tax: float
+    change: float
+
+
+TAX_INPUTS_SELECT = "SELECT income_total, deductions_total, estimated_tax FROM tax_summary"
+
+
+def tax_inputs_query(client_id: Optional[int], owner: Optional[str]):
+    """SQL and parameters for the stored totals of a portfolio: one client, one owner's clients, or everyone."""
+    where, params = [], []
+    if client_id is not None:
+        where.append("client_id = ?")
+        params.append(client_id)
+    if owner is not None:
+        where.append("client_id IN (SELECT id FROM clients WHERE owner = ?)")
+        params.append(owner)
+    return TAX_INPUTS_SELECT + (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def scenario_results(inputs, scenarios: List[TaxScenario]) -> List[ScenarioResult]:
+    """Totals for each scenario over (income_total, deductions_total, estimated_tax) rows.
+
+    ``change`` is relative to the stored estimates.
+    """
+    portfolio = Portfolio(inputs)
+    results = []
+    for scenario in scenarios:
+        schedule = tax_schedule(scenario.jurisdiction, scenario.year)
+        totals = portfolio.totals(schedule, scenario.income_factor, scenario.extra_deductions)
+        income_total, deductions_total, taxable_income, estimated_tax = (round(t, 2) for t in totals)
+        results.append(ScenarioResult(
+            name=scenario.name, jurisdiction=schedule.jurisdiction, year=schedule.year, assignees=portfolio.size,
+            income_total=income_total, deductions_total=deductions_total, taxable_income=taxable_income,
+            estimated_tax=estimated_tax, change=round(totals[3] - portfolio.current_tax, 2),
+        ))
+    return results
+
+
+@app.get("/api/tax/schedules")
+async def list_tax_schedules():
+    default = tax_schedule()
+    return [
+        {
+            "jurisdiction": s.jurisdiction,
+            "year": s.year,
+            "default": s is default,
+            "brackets": [[t, r] for t, r in zip(s.thresholds, s.rates)],
+        }
+        for s in TAX_SCHEDULES.values()
+    ]
+
+
+@app.post("/api/tax/what-if", response_model=List[ScenarioResult])
+async def tax_what_if(body: WhatIfBody):
+    """Re-estimate a portfolio's tax under each scenario (bracket table, income factor, extra deductions)."""
+    if not 1 <= len(body.scenarios) <= 20:
+        raise HTTPException(status_code=400, detail="Between 1 and 20 scenarios per request")
+    for scenario in body.scenarios:
+        tax_schedule(scenario.jurisdiction, scenario.year)
+    inputs = await storage.tax_inputs(body.client_id, body.owner)
+    return await run_in_threadpool(scenario_results, inputs, body.scenarios)
+
+
+# --------- Storage backends ---------
+
+# List queries, written once in the SQL both databases accept with ``?``
+# placeholders; each backend runs them through its ``list_rows``.
+IDEAS_LIST = ListQuery("SELECT id, title, description, score, created_at FROM ideas", (), "id < ?", "id DESC")
+CLIENTS_LIST = ListQuery(
+    "SELECT id, name, owner, created_at FROM clients", (), "name > (SELECT name FROM clients WHERE id = ?)", "name"
+)
+ASSIGNEES_LIST = ListQuery(
+    "SELECT id, client_id, name, email, created_at FROM assignees", ("client_id = ?",),
+    "(name, id) > (SELECT name, id FROM assignees WHERE id = ?)", "name, id",
+)
+WORKPAPERS_LIST = ListQuery(
+    "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers", ("assignee_id = ?",), "id < ?", "id DESC"
+)
+CLIENT_TAX_SUMMARIES_LIST = ListQuery(TAX_SUMMARY_SELECT, ("a.client_id = ?",), "a.id > ?", "a.id")
+OWNER_TAX_SUMMARIES_LIST = ListQuery(
+    TAX_SUMMARY_SELECT, ("a.client_id IN (SELECT id FROM clients WHERE owner = ?)",), "a.id > ?", "a.id"
+)
+AUDIT_LIST = ListQuery(AUDIT_ENTRIES_SELECT, ("assignee_id = ?", "entity = ?"), "version < ?", "version DESC")
+
+
+class Storage:
+    """Data access used by the handlers, one implementation per database.
+
+    Methods return None where the handler should answer 404.
+    """
+
+    name = ""
+
+    async def list_ideas(self, response: Response, page: Page):
+        return await self.list_rows(response, page, IDEAS_LIST, [], idea_item)
+
+    async def list_clients(self, response: Response, page: Page):
+        return await self.list_rows(response, page, CLIENTS_LIST, [], client_item)
+
+    async def list_assignees(self, response: Response, page: Page, client_id: int):
+        return await self.list_rows(response, page, ASSIGNEES_LIST, [client_id], assignee_item)
+
+    async def list_workpapers(self, response: Response, page: Page, assignee_id: int):
+        return await self.list_rows(response, page, WORKPAPERS_LIST, [assignee_id], workpaper_item)
+
+    async def list_client_tax_summaries(self, response: Response, page: Page, client_id: int):
+        return await self.list_rows(response, page, CLIENT_TAX_SUMMARIES_LIST, [client_id], tax_summary_item)
+
+    async def list_owner_tax_summaries(self, response: Response, page: Page, owner: str):
+        return await self.list_rows(response, page, OWNER_TAX_SUMMARIES_LIST, [owner], tax_summary_item)
+
+    async def list_audit(self, response: Response, page: Page, assignee_id: int, entity: str):
+        return await self.list_rows(response, page, AUDIT_LIST, [assignee_id, entity], audit_item)
+
+
+ASSIGNEE_SCOPE_SQL = "SELECT a.client_id, c.owner FROM assignees a JOIN clients c ON c.id = a.client_id WHERE a.id = ?"
+
+
+def assignee_overview_result(row, include_inputs: bool) -> dict:
+    result = {
+        "income_total": row[0],
+        "deductions_total": row[1],
+        "taxable_income": row[2],
+        "estimated_tax": row[3],
+    }
+    if include_inputs:
+        split = 4 + len(INCOME_SCHEMA.fields)
+        result["inputs"] = {
+            "income": INCOME_SCHEMA.to_dict(row[4:split]),
+            "deductions": DEDUCTION_SCHEMA.to_dict(row[split:]),
+        }
+    return result
+
+
+def load_assignee_bundle(conn, assignee_id: int, sections: tuple) -> Optional[dict]:
+    conn.execute("BEGIN")  # one snapshot for every section
+    try:
+        detail = load_assignee_detail(conn, assignee_id)
+        if detail is None:
+            return None
+        bundle = {}
+        if "assignee" in sections:
+            bundle["assignee"] = detail
+        if "calcs" in sections:
+            typed = {
+                calc_key: conn.execute(schema.select_sql(), (assignee_id,)).fetchone()
+                for calc_key, schema in CALCULATOR_SCHEMAS.items()
+            }
+            free = [(k, json.loads(data), v) for k, data, v in conn.execute(FREE_CALCS_SQL, (assignee_id,))]
+            bundle["calcs"] = bundle_calcs(typed, free)
+        if "overview" in sections:
+            bundle["overview"] = assignee_overview_result(conn.execute(ASSIGNEE_OVERVIEW_SQL, (assignee_id,)).fetchone(), True)
+        if "workpapers" in sections:
+            bundle["workpapers"] = [workpaper_item(r) for r in conn.execute(WORKPAPERS_SQL, (assignee_id,))]
+        return bundle
+    finally:
+        conn.rollback()
+
+
+class SqliteStorage(Storage):
+    """The local SQLite file, accessed through the ``db`` reader/writer threads."""
+
+    name = "sqlite"
+
+    async def open(self) -> None:
+        await run_in_threadpool(open_db, SEED_DEMO_DATA)
+
+    async def migrate(self, seed: bool = False) -> List[int]:
+        return await run_in_threadpool(migrate_db, seed)
+
+    async def close(self) -> None:
+        db.close()
+        db_pool.close()
+        stream_pool.close()
+
+    def stats(self) -> dict:
+        streams = {f"streams_{name}": value for name, value in stream_pool.stats().items()}
+        return {**db_pool.stats(), **db.stats(), **streams}
+
+    async def list_rows(self, response, page, query, params, to_item):
+        if page.format == "ndjson":
+            return await ndjson_response(*page_query(page, query, params), to_item)
+        return await db.read(list_rows, response, page, query, params, to_item)
+
+    async def create_idea(self, title: str, description: str, score: int) -> Idea:
+        def txn(conn):
+            cur = conn.execute(
+                "INSERT INTO ideas (title, description, score) VALUES (?, ?, ?)",
+                (title, description, score),
+            )
+            conn.commit()
+            return row_to_idea(conn.execute(IDEA_SQL, (cur.lastrowid,)).fetchone())
+
+        return await db.write(txn)
+
+    async def delete_idea(self, idea_id: int) -> bool:
+        def txn(conn):
+            cur = conn.execute(IDEA_DELETE_SQL, (idea_id,))
+            conn.commit()
+            return cur.rowcount > 0
+
+        return await db.write(txn)
+
+    async def rescore_ideas(self, scorer: IdeaScorer) -> dict:
+        def score_chunk(conn, after_id):
+            rows = conn.execute(IDEA_SCORE_CHUNK_SQL, (after_id, BULK_CHUNK_SIZE)).fetchall()
+            return rows[-1][0] if rows else None, len(rows), rescored(scorer, rows)
+
+        def txn(conn, updates):
+            conn.executemany(IDEA_SCORE_UPDATE_SQL, updates)
+            conn.commit()
+
+        def record(conn):
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES ('idea_scorer', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (scorer.fingerprint(),),
+            )
+            conn.commit()
+
+        after_id, scanned, changed = 0, 0, 0
+        while True:
+            # Scored on a reader thread; only the changed rows take the write lock
+            last_id, count, updates = await db.read(score_chunk, after_id)
+            if last_id is None:
+                break
+            if updates:
+                await db.write(txn, updates)
+            after_id, scanned, changed = last_id, scanned + count, changed + len(updates)
+        await db.write(record)
+        return {"ideas": scanned, "changed": changed, "fingerprint": scorer.fingerprint()}
+
+    async def idea_scores_fingerprint(self) -> Optional[str]:
+        def query(conn):
+            row = conn.execute("SELECT value FROM settings WHERE key = 'idea_scorer'").fetchone()
+            return row[0] if row else None
+
+        return await db.read(query)
+
+    async def home_overview(self, owner: str) -> OverviewResponse:
+        return await db.read(build_home_overview, owner)
+
+    async def home_stats(self, owner: str, client_id: Optional[int]) -> Optional[HomeStats]:
+        def query(conn):
+            if client_id is not None and not conn.execute(CLIENT_OWNER_SQL, (client_id,)).fetchone():
+                return None
+            rows = conn.execute(STAT_SCOPES_SQL, stat_scopes(owner, client_id)).fetchall()
+            return build_home_stats(rows, owner, client_id)
+
+        return await db.read(query)
+
+    async def check_stat_counters(self, repair: bool) -> List[dict]:
+        return await db.write(check_stat_counters, repair)
+
+    async def audit_state(self, assignee_id: int, entity: str, as_of: str) -> Optional[tuple]:
+        """(version, changed_at, state) of the newest entry at or before ``as_of``, or None."""
+        rows = await db.read(lambda conn: conn.execute(
+            AUDIT_STATE_SQL, (assignee_id, entity, as_of, assignee_id, entity, as_of)
+        ).fetchall())
+        return audit_fold(rows)
+
+    async def compact_audit(self, keep: int, cutoff: str) -> dict:
+        """Apply retention in batches of entities, each batch one short write transaction."""
+        def txn(conn, entities):
+            removed = 0
+            for assignee_id, entity in entities:
+                compacted = audit_compaction(conn.execute(AUDIT_ENTITY_SQL, (assignee_id, entity)).fetchall(), keep, cutoff)
+                if compacted is None:
+                    continue
+                version, state = compacted
+                conn.execute(AUDIT_SNAPSHOT_SQL, (json.dumps(state), assignee_id, entity, version))
+                removed += conn.execute(AUDIT_TRIM_SQL, (assignee_id, entity, version)).rowcount
+            conn.commit()
+            return removed
+
+        result = {"entities": 0, "removed": 0}
+        if not keep and not cutoff:
+            return result
+        after = (0, "")
+        while True:
+            batch = await db.read(lambda conn: conn.execute(
+                AUDIT_COMPACT_SQL, (*after, keep or sys.maxsize, cutoff, AUDIT_COMPACT_BATCH)
+            ).fetchall())
+            if not batch:
+                return result
+            result["removed"] += await db.write(txn, batch)
+            result["entities"] += len(batch)
+            after = tuple(batch[-1])
+
+    async def search_clients(self, response: Response, q: str, match: str, tier: str, key, limit: int):
+        return await db.read(search_rows, response, q, match, tier, key, limit)
+
+    async def assign_client(self, client_id: int, owner: str) -> Optional[str]:
+        def txn(conn):
+            row = conn.execute(CLIENT_OWNER_SQL, (client_id,)).fetchone()
+            if not row:
+                return None
+            conn.execute(ASSIGN_CLIENT_SQL, (owner, client_id))
+            conn.commit()
+            return row[0]
+
+        return await db.write(txn)
+
+    async def my_assignees(self, owner: str) -> List[AssigneeBrief]:
+        return await db.read(build_my_assignees, owner)
+
+    async def create_assignee(self, client_id: int, name: str, email: str):
+        """Returns (assignee, client owner), or None if the client does not exist."""
+        def txn(conn):
+            try:
+                cur = conn.execute(
+                    "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)",
+                    (client_id, name, email),
+                )
+            except sqlite3.IntegrityError:
+                return None
+            conn.commit()
+            (owner,) = conn.execute(CLIENT_OWNER_SQL, (client_id,)).fetchone()
+            return row_to_assignee(conn.execute(ASSIGNEE_SQL, (cur.lastrowid,)).fetchone()), owner
+
+        return await db.write(txn)
+
+    async def get_assignee(self, assignee_id: int) -> Optional[AssigneeDetail]:
+        return await db.read(load_assignee_detail, assignee_id)
+
+    async def assignee_scope(self, assignee_id: int) -> Optional[tuple]:
+        """(client_id, owner) of an assignee, or None."""
+        return await db.read(lambda conn: conn.execute(ASSIGNEE_SCOPE_SQL, (assignee_id,)).fetchone())
+
+    async def create_workpaper(self, assignee_id: int, title: str, notes: str) -> Optional[Workpaper]:
+        def txn(conn):
+            try:
+                cur = conn.execute(
+                    "INSERT INTO workpapers (assignee_id, title, notes) VALUES (?, ?, ?)",
+                    (assignee_id, title, notes),
+                )
+            except sqlite3.IntegrityError:
+                return None
+            conn.commit()
+            return row_to_workpaper(conn.execute(WORKPAPER_SQL, (cur.lastrowid,)).fetchone())
+
+        return await db.write(txn)
+
+    async def workpaper_forms(self, assignee_ids: List[int]):
+        return await db.read(load_workpaper_forms, assignee_ids)
+
+    async def get_calc(self, assignee_id: int, calc_key: str) -> Optional[tuple]:
+        """(data, version), or None if nothing was saved."""
+        schema = CALCULATOR_SCHEMAS.get(calc_key)
+        if schema is not None:
+            row = await db.read(lambda conn: conn.execute(schema.select_sql(), (assignee_id,)).fetchone())
+            return (schema.to_dict(row[:-1]), row[-1]) if row else None
+        row = await db.read(lambda conn: conn.execute(FREE_CALC_SQL, (assignee_id, calc_key)).fetchone())
+        return (json.loads(row[0]), row[1]) if row else None
+
+    async def write_calcs(self, assignee_id: int, writes: List[CalcWrite]) -> Optional[Dict[str, int]]:
+        """Apply ``writes`` in one transaction; {calc_key: new version}, or None if the assignee is missing.
+
+        Raises VersionConflict, having written nothing, if any expected version does not match.
+        """
+        statements = [(w.calc_key, *calc_write_sql(assignee_id, w)) for w in writes]
+
+        def txn(conn):
+            versions = {}
+            for calc_key, sql, params in statements:
+                try:
+                    row = conn.execute(sql, params).fetchone()
+                except sqlite3.IntegrityError:
+                    return None
+                if row is None:
+                    if conn.execute("SELECT 1 FROM assignees WHERE id = ?", (assignee_id,)).fetchone() is None:
+                        return None
+                    current = conn.execute(*calc_version_query(assignee_id, calc_key)).fetchone()
+                    raise VersionConflict(calc_key, current[0] if current else 0)
+                versions[calc_key] = row[0]
+            if any(calc_key in TAX_CALC_KEYS for calc_key in versions):
+                refresh_tax_summary(conn, [assignee_id])
+            conn.commit()
+            return versions
+
+        return await db.write(txn)
+
+    async def assignee_overview(self, assignee_id: int, include_inputs: bool) -> Optional[dict]:
+        sql = ASSIGNEE_OVERVIEW_SQL if include_inputs else ASSIGNEE_TOTALS_SQL
+        row = await db.read(lambda conn: conn.execute(sql, (assignee_id,)).fetchone())
+        return assignee_overview_result(row, include_inputs) if row else None
+
+    async def assignee_bundle(self, assignee_id: int, sections: tuple) -> Optional[dict]:
+        return await db.read(load_assignee_bundle, assignee_id, sections)
+
+    async def tax_summaries(self, assignee_ids: List[int]) -> List[AssigneeTaxSummary]:
+        rows = await db.read(lambda conn: conn.execute(TAX_SUMMARIES_SQL, (json.dumps(assignee_ids),)).fetchall())
+        return [tax_summary_item(r) for r in rows]
+
+    async def client_tax_aggregate(self, client_id: int) -> TaxAggregate:
+        row = await db.read(lambda conn: conn.execute(CLIENT_TAX_AGGREGATE_SQL, (client_id,)).fetchone())
+        return row_to_tax_aggregate(row)
+
+    async def tax_inputs(self, client_id: Optional[int], owner: Optional[str]) -> list:
+        sql, params = tax_inputs_query(client_id, owner)
+        return await db.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def owner_tax_aggregate(self, owner: str) -> TaxAggregate:
+        row = await db.read(lambda conn: conn.execute(OWNER_TAX_AGGREGATE_SQL, (owner,)).fetchone())
+        return row_to_tax_aggregate(row)
+
+    async def queue_email(self, from_addr: str, to: List[str], subject: str, message: bytes) -> int:
+        return await db.write(queue_email, from_addr, to, subject, message)
+
+    async def email_status(self, message_id: int) -> Optional[tuple]:
+        return await db.read(lambda conn: conn.execute(EMAIL_STATUS_SQL, (message_id,)).fetchone())
+
+    async def requeue_emails(self) -> None:
+        # Other workers on the file may still be sending theirs, so with several only once the claim expired
+        await db.write(requeue_emails, WEB_CONCURRENCY == 1)
+
+    async def claim_emails(self, claim_seconds: int, limit: int) -> list:
+        return await db.write(claim_emails, claim_seconds, limit)
+
+    async def finish_emails(self, sent: list, retry: list, failed: list) -> None:
+        await db.write(finish_emails, sent, retry, failed)
+
+    async def import_chunk(self, entity: str, batch) -> tuple:
+        return await db.write(import_chunk, entity, batch)
+
+    def export_rows(self, entity: str):
+        return iterate_in_threadpool(stream_rows(bulk_select_sql(entity), (), BULK_EXPORT_BATCH))
+
+
+def pg_sql(sql: str) -> str:
+    """Number ``?`` placeholders as $1, $2, ... for asyncpg."""
+    counter = iter(range(1, sql.count("?") + 1))
+    return re.sub(r"\?", lambda _: f"${next(counter)}", sql)
+
+
+PG_NOW = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+def pg_triggers(triggers) -> List[str]:
+    """(Re)create row triggers given as (name, event, function call, WHEN condition or '')."""
+    statements = []
+    for name, event, function, when in triggers:
+        table = event.rsplit(" ", 1)[1]
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {name} {event} FOR EACH ROW {f'WHEN ({when}) ' if when else ''}EXECUTE FUNCTION {function}"
+        )
+    return statements
+
+
+def pg_stat_triggers() -> List[str]:
+    return pg_triggers([
+        ("stat_tasks_change", "AFTER INSERT OR DELETE ON tasks", "stat_tasks()", ""),
+        (
+            "stat_tasks_update", "AFTER UPDATE OF status, client_id ON tasks", "stat_tasks()",
+            "OLD.status IS DISTINCT FROM NEW.status OR OLD.client_id IS DISTINCT FROM NEW.client_id",
+        ),
+        ("stat_workpapers_change", "AFTER INSERT OR DELETE ON workpapers", "stat_workpapers()", ""),
+        (
+            "stat_workpapers_update", "AFTER UPDATE OF status, assignee_id ON workpapers", "stat_workpapers()",
+            "OLD.status IS DISTINCT FROM NEW.status OR OLD.assignee_id IS DISTINCT FROM NEW.assignee_id",
+        ),
+        ("stat_assignees_change", "AFTER INSERT OR DELETE ON assignees", "stat_assignees()", ""),
+        ("stat_assignees_before_delete", "BEFORE DELETE ON assignees", "stat_assignees()", ""),
+        ("stat_assignees_update", "AFTER UPDATE OF client_id ON assignees", "stat_assignees()", "OLD.client_id IS DISTINCT FROM NEW.client_id"),
+        ("stat_clients_before_delete", "BEFORE DELETE ON clients", "stat_clients()", ""),
+        ("stat_clients_update", "AFTER UPDATE OF owner ON clients", "stat_clients()", "OLD.owner IS DISTINCT FROM NEW.owner"),
+    ])
+
+
+def pg_audit_triggers() -> List[str]:
+    """Audit triggers; the calculator tables are created after PG_SCHEMA, so these run after them."""
+    return pg_triggers([
+        *(
+            (f"audit_{schema.table}", f"AFTER INSERT OR UPDATE ON {schema.table}", f"audit_calc('{schema.calc_key}')", "")
+            for schema in CALCULATOR_SCHEMAS.values()
+        ),
+        ("audit_calculator_data", "AFTER INSERT OR UPDATE ON calculator_data", "audit_calculator_data()", ""),
+        ("audit_workpapers", "AFTER INSERT OR UPDATE OF title, status, notes ON workpapers", "audit_workpapers()", ""),
+    ])
+
+
+# Same tables as SQLite, with calculator data as JSONB. Timestamps stay text
+# in SQLite's format so responses are identical on both backends.
+PG_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS ideas (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        title text NOT NULL,
+        description text NOT NULL DEFAULT '',
+        score integer NOT NULL DEFAULT 0,
+        created_at text NOT NULL DEFAULT {PG_NOW}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS clients (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name text NOT NULL UNIQUE,
+        owner text NOT NULL DEFAULT '',
+        created_at text NOT NULL DEFAULT {PG_NOW}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        client_id bigint NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        title text NOT NULL,
+        status text NOT NULL DEFAULT 'awaiting',
+        due_date text
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS assignees (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        client_id bigint NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+        name text NOT NULL,
+        email text NOT NULL DEFAULT '',
+        created_at text NOT NULL DEFAULT {PG_NOW}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS workpapers (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        assignee_id bigint NOT NULL REFERENCES assignees(id) ON DELETE CASCADE,
+        title text NOT NULL,
+        status text NOT NULL DEFAULT 'draft',
+        notes text NOT NULL DEFAULT '',
+        created_at text NOT NULL DEFAULT {PG_NOW}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS calculator_data (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        assignee_id bigint NOT NULL REFERENCES assignees(id) ON DELETE CASCADE,
+        calc_key text NOT NULL,
+        data jsonb NOT NULL DEFAULT '{{}}',
+        version integer NOT NULL DEFAULT 1,
+        updated_at text NOT NULL DEFAULT {PG_NOW},
+        UNIQUE (assignee_id, calc_key)
+    )
+    """,
+    "ALTER TABLE calculator_data ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    # SQLite's json_patch (RFC 7396 merge patch), for calc_write_sql
+    """
+    CREATE OR REPLACE FUNCTION json_patch(target jsonb, patch jsonb) RETURNS jsonb
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        k text;
+        v jsonb;
+    BEGIN
+        IF jsonb_typeof(patch) IS DISTINCT FROM 'object' THEN
+            RETURN patch;
+        END IF;
+        IF jsonb_typeof(target) IS DISTINCT FROM 'object' THEN
+            target := '{}';
+        END IF;
+        FOR k, v IN SELECT * FROM jsonb_each(patch) LOOP
+            IF jsonb_typeof(v) = 'null' THEN
+                target := target - k;
+            ELSE
+                target := jsonb_set(target, ARRAY[k], json_patch(target -> k, v));
+            END IF;
+        END LOOP;
+        RETURN target;
+    END
+    $$
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS tax_summary (
+        assignee_id bigint PRIMARY KEY REFERENCES assignees(id) ON DELETE CASCADE,
+        client_id bigint NOT NULL,
+        income_total float8 NOT NULL DEFAULT 0,
+        deductions_total float8 NOT NULL DEFAULT 0,
+        taxable_income float8 NOT NULL DEFAULT 0,
+        estimated_tax float8 NOT NULL DEFAULT 0,
+        updated_at text NOT NULL DEFAULT {PG_NOW}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS settings (
+        key text PRIMARY KEY,
+        value text NOT NULL
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        from_addr text NOT NULL,
+        to_addrs text NOT NULL,
+        subject text NOT NULL DEFAULT '',
+        message bytea NOT NULL,
+        status text NOT NULL DEFAULT 'queued',
+        attempts integer NOT NULL DEFAULT 0,
+        last_error text,
+        next_attempt_at text NOT NULL DEFAULT {PG_NOW},
+        created_at text NOT NULL DEFAULT {PG_NOW},
+        sent_at text
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_clients_owner_name ON clients(owner, name)",
+    "CREATE INDEX IF NOT EXISTS idx_clients_name_lower ON clients((lower(name) COLLATE \"C\"))",
+    "CREATE INDEX IF NOT EXISTS idx_clients_name_tsv ON clients USING gin (to_tsvector('simple', name))",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_client_status ON tasks(client_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_awaiting ON tasks(client_id) WHERE status = 'awaiting'",
+    "CREATE INDEX IF NOT EXISTS idx_assignees_client_name ON assignees(client_id, name)",
+    "CREATE INDEX IF NOT EXISTS idx_workpapers_assignee ON workpapers(assignee_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tax_summary_client ON tax_summary(client_id)",
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(next_attempt_at) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS idx_email_outbox_claimed ON email_outbox(next_attempt_at) WHERE status = 'sending'",
+    """
+    CREATE TABLE IF NOT EXISTS stat_counters (
+        scope text NOT NULL,
+        kind text NOT NULL,
+        status text NOT NULL,
+        count bigint NOT NULL,
+        PRIMARY KEY (scope, kind, status)
+    )
+    """,
+    # Same bookkeeping as the SQLite triggers (see stat_triggers)
+    """
+    CREATE OR REPLACE FUNCTION stat_bump(p_client bigint, p_kind text, p_status text, p_n bigint) RETURNS void
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO stat_counters (scope, kind, status, count) VALUES ('all', p_kind, p_status, p_n)
+        ON CONFLICT (scope, kind, status) DO UPDATE SET count = stat_counters.count + excluded.count;
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT s.scope, p_kind, p_status, p_n
+        FROM clients c CROSS JOIN LATERAL (VALUES ('client:' || c.id), ('owner:' || c.owner)) AS s(scope)
+        WHERE c.id = p_client
+        ON CONFLICT (scope, kind, status) DO UPDATE SET count = stat_counters.count + excluded.count;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stat_subtree(p_assignee bigint, p_client bigint, p_sign bigint) RETURNS void
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT s.scope, r.kind, r.status, p_sign * r.n
+        FROM (
+            SELECT 'workpaper' AS kind, status, count(*) AS n FROM workpapers WHERE assignee_id = p_assignee GROUP BY status
+            UNION ALL
+            SELECT 'assignee', '', 1
+        ) r
+        CROSS JOIN clients c CROSS JOIN LATERAL (VALUES ('client:' || c.id), ('owner:' || c.owner)) AS s(scope)
+        WHERE c.id = p_client
+        ON CONFLICT (scope, kind, status) DO UPDATE SET count = stat_counters.count + excluded.count;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stat_tasks() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM stat_bump(OLD.client_id, 'task', OLD.status, -1);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM stat_bump(NEW.client_id, 'task', NEW.status, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stat_workpapers() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM stat_bump((SELECT client_id FROM assignees WHERE id = OLD.assignee_id), 'workpaper', OLD.status, -1);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM stat_bump((SELECT client_id FROM assignees WHERE id = NEW.assignee_id), 'workpaper', NEW.status, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stat_assignees() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM stat_bump(NEW.client_id, 'assignee', '', 1);
+        ELSIF TG_OP = 'UPDATE' THEN
+            PERFORM stat_subtree(NEW.id, OLD.client_id, -1);
+            PERFORM stat_subtree(NEW.id, NEW.client_id, 1);
+        ELSIF TG_WHEN = 'BEFORE' THEN
+            PERFORM stat_subtree(OLD.id, OLD.client_id, -1);
+            RETURN OLD;
+        ELSE
+            PERFORM stat_bump(NULL, 'assignee', '', -1);
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION stat_clients() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'owner:' || OLD.owner, kind, status, -count FROM stat_counters WHERE scope = 'client:' || OLD.id
+        ON CONFLICT (scope, kind, status) DO UPDATE SET count = stat_counters.count + excluded.count;
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM stat_counters WHERE scope = 'client:' || OLD.id;
+            RETURN OLD;
+        END IF;
+        INSERT INTO stat_counters (scope, kind, status, count)
+        SELECT 'owner:' || NEW.owner, kind, status, count FROM stat_counters WHERE scope = 'client:' || NEW.id
+        ON CONFLICT (scope, kind, status) DO UPDATE SET count = stat_counters.count + excluded.count;
+        RETURN NULL;
+    END
+    $$
+    """,
+    *pg_stat_triggers(),
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        assignee_id bigint NOT NULL,
+        entity text NOT NULL,
+        version bigint NOT NULL,
+        changed_at text NOT NULL,
+        snapshot smallint NOT NULL DEFAULT 0,
+        delta jsonb NOT NULL,
+        PRIMARY KEY (assignee_id, entity, version)
+    )
+    """,
+    # Created with a cascading foreign key at schema version 9
+    "ALTER TABLE audit_log DROP CONSTRAINT IF EXISTS audit_log_assignee_id_fkey",
+    AUDIT_SNAPSHOTS_INDEX,
+    # Same entries as the SQLite triggers (see audit_record_sql)
+    f"""
+    CREATE OR REPLACE FUNCTION audit_record(
+        p_assignee bigint, p_entity text, p_version bigint, p_at text, p_old jsonb, p_new jsonb
+    ) RETURNS void LANGUAGE plpgsql AS $$
+    DECLARE
+        patch jsonb := '{{}}';
+        whole boolean := p_old IS NULL OR p_version % {AUDIT_SNAPSHOT_EVERY} = 0
+            OR jsonb_typeof(p_old) <> 'object' OR jsonb_typeof(p_new) <> 'object';
+    BEGIN
+        IF NOT whole THEN
+            SELECT coalesce(jsonb_object_agg(k, v), '{{}}'), coalesce(bool_or(jsonb_typeof(v) IN ('object', 'null')), false)
+            INTO patch, whole
+            FROM (
+                SELECT coalesce(n.key, o.key) AS k, n.value AS v
+                FROM jsonb_each(p_new) n FULL JOIN jsonb_each(p_old) o ON o.key = n.key
+                WHERE n.value IS DISTINCT FROM o.value
+            ) d;
+        END IF;
+        INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta)
+        VALUES (p_assignee, p_entity, p_version, p_at, CASE WHEN whole THEN 1 ELSE 0 END, CASE WHEN whole THEN p_new ELSE patch END);
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION audit_calc() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.version = OLD.version THEN
+            RETURN NULL;
+        END IF;
+        PERFORM audit_record(
+            NEW.assignee_id, 'calc/' || TG_ARGV[0], NEW.version, NEW.updated_at,
+            CASE WHEN TG_OP = 'UPDATE' THEN jsonb_strip_nulls(to_jsonb(OLD) - 'assignee_id' - 'version' - 'updated_at') END,
+            jsonb_strip_nulls(to_jsonb(NEW) - 'assignee_id' - 'version' - 'updated_at')
+        );
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION audit_calculator_data() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.version = OLD.version THEN
+            RETURN NULL;
+        END IF;
+        PERFORM audit_record(
+            NEW.assignee_id, 'calc/' || NEW.calc_key, NEW.version, NEW.updated_at,
+            CASE WHEN TG_OP = 'UPDATE' THEN OLD.data END, NEW.data
+        );
+        RETURN NULL;
+    END
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION audit_workpapers() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM audit_record(
+                NEW.assignee_id, 'workpaper/' || NEW.id, 1, NEW.created_at, NULL,
+                jsonb_build_object('title', NEW.title, 'status', NEW.status, 'notes', NEW.notes)
+            );
+        ELSIF (OLD.title, OLD.status, OLD.notes) IS DISTINCT FROM (NEW.title, NEW.status, NEW.notes) THEN
+            PERFORM audit_record(
+                NEW.assignee_id, 'workpaper/' || NEW.id,
+                (SELECT coalesce(max(version), 0) + 1 FROM audit_log WHERE assignee_id = NEW.assignee_id AND entity = 'workpaper/' || NEW.id),
+                {PG_NOW},
+                jsonb_build_object('title', OLD.title, 'status', OLD.status, 'notes', OLD.notes),
+                jsonb_build_object('title', NEW.title, 'status', NEW.status, 'notes', NEW.notes)
+            );
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+
+PG_SEARCH_PREFIX_SQL = """
+    SELECT id, name, owner, created_at FROM clients
+    WHERE lower(name) COLLATE "C" >= $1 AND lower(name) COLLATE "C" < $2
+      AND (lower(name) COLLATE "C", id) > ($3, $4)
+    ORDER BY lower(name) COLLATE "C", id
+    LIMIT $5
+"""
+
+PG_SEARCH_TOKEN_SQL = """
+    SELECT id, name, owner, created_at FROM clients
+    WHERE to_tsvector('simple', name) @@ to_tsquery('simple', $1) AND id > $2
+      AND NOT (lower(name) COLLATE "C" >= $3 AND lower(name) COLLATE "C" < $4)
+    ORDER BY id
+    LIMIT $5
+"""
+
+PG_TAX_AGGREGATE_SELECT = """
+    SELECT count(*), coalesce(sum(income_total), 0), coalesce(sum(deductions_total), 0),
+        coalesce(sum(taxable_income), 0), round(coalesce(sum(estimated_tax), 0)::numeric, 2)::float8
+    FROM tax_summary
+"""
+
+
+def pg_now_plus(seconds: str) -> str:
+    """PG_NOW, ``seconds`` (a SQL expression) from now."""
+    return f"to_char((now() + make_interval(secs => {seconds})) AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+
+# The outbox statements of the email section; claims skip rows another host has locked
+PG_EMAIL_CLAIM_SQL = f"""
+    UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, next_attempt_at = {pg_now_plus("$1")}
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE status = 'queued' AND next_attempt_at <= {PG_NOW}
+        ORDER BY next_attempt_at, id
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, from_addr, to_addrs, message, attempts
+"""
+PG_EMAIL_REQUEUE_SQL = f"UPDATE email_outbox SET status = 'queued' WHERE status = 'sending' AND next_attempt_at <= {PG_NOW}"
+PG_EMAIL_SENT_SQL = f"UPDATE email_outbox SET status = 'sent', last_error = NULL, sent_at = {PG_NOW} WHERE id = $1"
+PG_EMAIL_RETRY_SQL = (
+    f"UPDATE email_outbox SET status = 'queued', last_error = $1, next_attempt_at = {pg_now_plus('$2')} WHERE id = $3"
+)
+PG_EMAIL_FAILED_SQL = "UPDATE email_outbox SET status = 'failed', last_error = $1 WHERE id = $2"
+
+
+PG_ASSIGNEE_DETAIL_SQL = """
+    SELECT a.id, a.client_id, a.name, a.email, a.created_at, c.name, c.owner, c.created_at
+    FROM assignees a JOIN clients c ON c.id = a.client_id
+    WHERE a.id = $1
+"""
+
+
+def row_to_assignee_detail(r) -> Optional[AssigneeDetail]:
+    if not r:
+        return None
+    return AssigneeDetail(
+        id=r[0], client_id=r[1], name=r[2], email=r[3], created_at=r[4],
+        client=ClientDetail(id=r[1], name=r[5], owner=r[6], created_at=r[7]),
+    )
+
+
+def pg_tsquery(q: str) -> str:
+    return " & ".join(f"'{t}':*" for t in re.findall(r"\w+", q.lower()))
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL through a pool of asyncpg connections (DATABASE_URL).
+
+    Calculator data is JSONB, NDJSON listings stream from a server-side
+    cursor, and schema creation is serialized across instances with an
+    advisory lock.
+    """
+
+    name = "postgres"
+
+    def __init__(self, url: str):
+        self._url = url
+        self._pool = None
+        self._asyncpg = optional_module("asyncpg")
+        if self._asyncpg is None:
+            raise RuntimeError("DATABASE_URL points at PostgreSQL but asyncpg is not installed")
+
+    async def open(self) -> None:
+        self._pool = await self._asyncpg.create_pool(
+            self._url, min_size=1, max_size=DB_POOL_SIZE, init=self._init_connection
+        )
+        async with self._pool.acquire() as conn:
+            version = await self._schema_version(conn)
+            if version < SCHEMA_VERSION and not AUTO_MIGRATE:
+                raise schema_behind(version)
+            # Current schema and summary: no advisory lock, no DDL
+            if version < SCHEMA_VERSION or SEED_DEMO_DATA or not await self._tax_summary_current(conn):
+                await self._migrate(conn, SEED_DEMO_DATA)
+
+    async def migrate(self, seed: bool = False) -> List[int]:
+        conn = await self._asyncpg.connect(self._url)
+        try:
+            await self._init_connection(conn)
+            applied = await self._migrate(conn, seed)
+        finally:
+            await conn.close()
+        return applied
+
+    async def _schema_version(self, conn) -> int:
+        if await conn.fetchval("SELECT to_regclass('settings')") is None:
+            return 0
+        return int(await conn.fetchval("SELECT value FROM settings WHERE key = 'schema_version'") or 0)
+
+    async def _migrate(self, conn, seed: bool) -> List[int]:
+        """Run the (idempotent) DDL if the recorded schema version is behind, then sync and seed.
+
+        PostgreSQL has no PRAGMA user_version; the version is kept in ``settings``.
+        """
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('app_schema'))")
+            behind = await self._schema_version(conn) < SCHEMA_VERSION
+            if behind:
+                for stmt in PG_SCHEMA:
+                    await conn.execute(stmt)
+                for schema in CALCULATOR_SCHEMAS.values():
+                    await conn.execute(schema.create_sql("bigint", "float8", PG_NOW))
+                    await conn.execute(
+                        f"ALTER TABLE {schema.table} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1"
+                    )
+                for stmt in pg_audit_triggers():
+                    await conn.execute(stmt)
+                for schema in CALCULATOR_SCHEMAS.values():
+                    await self._migrate_calculator_data(conn, schema)
+                await self._backfill_audit_log(conn)
+                await conn.execute("LOCK TABLE stat_counters IN EXCLUSIVE MODE")
+                await self._rebuild_stat_counters(conn)
+                await conn.execute(
+                    "INSERT INTO settings (key, value) VALUES ('schema_version', $1) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                    str(SCHEMA_VERSION),
+                )
+            await self._sync_tax_summary(conn)
+            if seed:
+                await self._seed(conn)
+        return [SCHEMA_VERSION] if behind else []
+
+    @staticmethod
+    async def _init_connection(conn) -> None:
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def _seed(self, conn) -> None:
+        if await conn.fetchval("SELECT count(*) FROM clients"):
+            return
+        await conn.executemany("INSERT INTO clients (name, owner) VALUES ($1, $2)", SAMPLE_CLIENTS)
+        id_by_name = {r["name"]: r["id"] for r in await conn.fetch("SELECT id, name FROM clients")}
+        await conn.executemany(
+            "INSERT INTO tasks (client_id, title, status) VALUES ($1, $2, $3)",
+            [(id_by_name[client], title, status) for client, title, status in SAMPLE_TASKS],
+        )
+        clients = await conn.fetch("SELECT id, name FROM clients ORDER BY id LIMIT 3")
+        await conn.executemany(
+            "INSERT INTO assignees (client_id, name, email) VALUES ($1, $2, $3)",
+            [sample_assignee(cid, cname) for cid, cname in clients],
+        )
+
+    async def _migrate_calculator_data(self, conn, schema: CalculatorSchema) -> None:
+        """PostgreSQL side of ``migrate_calculator_data``: move JSONB rows of a registered calculator."""
+        columns = ", ".join(
+            f"CASE WHEN jsonb_typeof(data->'{f}') = 'number' THEN (data->>'{f}')::float8 END" for f in schema.fields
+        )
+        moved = await conn.execute(
+            f"""
+            INSERT INTO {schema.table} (assignee_id, {schema.columns}, version, updated_at)
+            SELECT assignee_id, {columns}, version + 1, updated_at FROM calculator_data WHERE calc_key = $1
+            ON CONFLICT (assignee_id) DO NOTHING
+            """,
+            schema.calc_key,
+        )
+        if moved != "INSERT 0 0":
+            await conn.execute("DELETE FROM calculator_data WHERE calc_key = $1", schema.calc_key)
+            await self._refresh_tax_summary(conn)
+
+    @staticmethod
+    async def _backfill_audit_log(conn) -> None:
+        """PostgreSQL side of ``add_audit_log``'s backfill: current states become first entries."""
+        insert = "INSERT INTO audit_log (assignee_id, entity, version, changed_at, snapshot, delta) "
+        for schema in CALCULATOR_SCHEMAS.values():
+            await conn.execute(
+                insert + f"SELECT assignee_id, 'calc/{schema.calc_key}', version, updated_at, 1, "
+                f"{schema.pg_json_sql()} FROM {schema.table} ON CONFLICT DO NOTHING"
+            )
+        await conn.execute(
+            insert + "SELECT assignee_id, 'calc/' || calc_key, version, updated_at, 1, data FROM calculator_data "
+            "ON CONFLICT DO NOTHING"
+        )
+        await conn.execute(
+            insert + "SELECT assignee_id, 'workpaper/' || id, 1, created_at, 1, "
+            "jsonb_build_object('title', title, 'status', status, 'notes', notes) FROM workpapers ON CONFLICT DO NOTHING"
+        )
+
+    @staticmethod
+    async def _tax_summary_current(conn) -> bool:
+        stored = await conn.fetchval("SELECT value FROM settings WHERE key = 'tax_schedule'")
+        return stored == tax_schedule().fingerprint()
+
+    async def _sync_tax_summary(self, conn) -> None:
+        """PostgreSQL side of ``sync_tax_summary``; runs inside ``_migrate``'s transaction."""
+        if await self._tax_summary_current(conn):
+            return
+        fingerprint = tax_schedule().fingerprint()
+        await self._refresh_tax_summary(conn)
+        await conn.execute(
+            "INSERT INTO settings (key, value) VALUES ('tax_schedule', $1) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            fingerprint,
+        )
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def stats(self) -> dict:
+        if self._pool is None:
+            return {"size": DB_POOL_SIZE, "open": 0, "idle": 0}
+        return {
+            "size": self._pool.get_max_size(),
+            "open": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+        }
+
+    @asynccontextmanager
+    async def _conn(self):
+        try:
+            conn = await self._pool.acquire(timeout=DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail=f"no database connection available within {DB_POOL_TIMEOUT}s")
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    async def fetch(self, sql: str, *args):
+        async with self._conn() as conn:
+            return await conn.fetch(sql, *args)
+
+    async def fetchrow(self, sql: str, *args):
+        async with self._conn() as conn:
+            return await conn.fetchrow(sql, *args)
+
+    async def list_rows(self, response, page, query, params, to_item):
+        sql, args = page_query(page, query, params)
+        sql = pg_sql(sql)
+        if page.format == "ndjson":
+            async def generate():
+                async with self._conn() as conn:
+                    async with conn.transaction():
+                        cur = await conn.cursor(sql, *args)
+                        while rows := await cur.fetch(NDJSON_BATCH):
+                            yield b"".join([json_body(to_item(row)) + b"\n" for row in rows])
+
+            return StreamingResponse(await prefetched(generate()), media_type="application/x-ndjson")
+        rows = await self.fetch(sql, *args)
+        return page_items(response, page, rows, to_item)
+
+    async def create_idea(self, title: str, description: str, score: int) -> Idea:
+        row = await self.fetchrow(
+            """
+            INSERT INTO ideas (title, description, score) VALUES ($1, $2, $3)
+            RETURNING id, title, description, score, created_at
+            """,
+            title, description, score,
         )
-    finally:
-        conn.close()
+        return row_to_idea(row)
 
+    async def delete_idea(self, idea_id: int) -> bool:
+        return await self.fetchrow(pg_sql(IDEA_DELETE_SQL + " RETURNING id"), idea_id) is not None
 
-@app.delete("/api/ideas/{idea_id}")
-def delete_idea(idea_id: int):
-    conn = get_db()
-    try:
-        cur = conn.execute("DELETE FROM ideas WHERE id = ?", (idea_id,))
-        conn.commit()
-        if cur.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Idea not found")
-        return {"status": "ok"}
-    finally:
-        conn.close()
+    async def rescore_ideas(self, scorer: IdeaScorer) -> dict:
+        after_id, scanned, changed = 0, 0, 0
+        async with self._conn() as conn:
+            while True:
+                rows = await conn.fetch(pg_sql(IDEA_SCORE_CHUNK_SQL), after_id, BULK_CHUNK_SIZE)
+                if not rows:
+                    break
+                updates = await run_in_threadpool(rescored, scorer, rows)
+                if updates:
+                    await conn.executemany(pg_sql(IDEA_SCORE_UPDATE_SQL), updates)
+                after_id, scanned, changed = rows[-1][0], scanned + len(rows), changed + len(updates)
+            await conn.execute(
+                "INSERT INTO settings (key, value) VALUES ('idea_scorer', $1) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                scorer.fingerprint(),
+            )
+        return {"ideas": scanned, "changed": changed, "fingerprint": scorer.fingerprint()}
 
+    async def idea_scores_fingerprint(self) -> Optional[str]:
+        async with self._conn() as conn:
+            return await conn.fetchval("SELECT value FROM settings WHERE key = 'idea_scorer'")
 
-# --------- Clients + Home Overview API ---------
+    async def home_overview(self, owner: str) -> OverviewResponse:
+        async with self._conn() as conn:
+            my_rows = await conn.fetch(pg_sql(MY_CLIENTS_SQL), owner)
+            awaiting_rows = await conn.fetch(AWAITING_CLIENTS_SQL)
+            awaiting_count = await conn.fetchval(STAT_AWAITING_SQL)
+        return OverviewResponse(
+            my_clients=[row_to_client(r) for r in my_rows],
+            awaiting_clients=[row_to_client(r) for r in awaiting_rows],
+            stats={"my_clients_count": len(my_rows), "awaiting_tasks_count": awaiting_count},
+        )
 
-class Client(BaseModel):
-    id: int
-    name: str
-    owner: str
-    created_at: str
+    async def home_stats(self, owner: str, client_id: Optional[int]) -> Optional[HomeStats]:
+        async with self._conn() as conn:
+            if client_id is not None and await conn.fetchrow(pg_sql(CLIENT_OWNER_SQL), client_id) is None:
+                return None
+            rows = await conn.fetch(pg_sql(STAT_SCOPES_SQL), *stat_scopes(owner, client_id))
+        return build_home_stats(rows, owner, client_id)
 
+    async def check_stat_counters(self, repair: bool) -> List[dict]:
+        async with self._conn() as conn:
+            async with conn.transaction():
+                # Waits out writers that already bumped a counter and holds off the rest
+                await conn.execute("LOCK TABLE stat_counters IN EXCLUSIVE MODE")
+                mismatches = counter_mismatches(
+                    await conn.fetch("SELECT scope, kind, status, count FROM stat_counters"),
+                    await conn.fetch(STAT_EXPECTED_SQL),
+                )
+                if mismatches and repair:
+                    await self._rebuild_stat_counters(conn)
+        return mismatches
 
-class OverviewResponse(BaseModel):
-    my_clients: List[Client]
-    awaiting_clients: List[Client]
-    stats: dict
+    async def audit_state(self, assignee_id: int, entity: str, as_of: str) -> Optional[tuple]:
+        rows = await self.fetch(pg_sql(AUDIT_STATE_SQL), assignee_id, entity, as_of, assignee_id, entity, as_of)
+        return audit_fold(rows)
 
+    async def compact_audit(self, keep: int, cutoff: str) -> dict:
+        result = {"entities": 0, "removed": 0}
+        if not keep and not cutoff:
+            return result
+        after = (0, "")
+        while True:
+            batch = await self.fetch(pg_sql(AUDIT_COMPACT_SQL), *after, keep or sys.maxsize, cutoff, AUDIT_COMPACT_BATCH)
+            if not batch:
+                return result
+            async with self._conn() as conn:
+                async with conn.transaction():
+                    for assignee_id, entity in batch:
+                        rows = await conn.fetch(pg_sql(AUDIT_ENTITY_SQL + " FOR UPDATE"), assignee_id, entity)
+                        compacted = audit_compaction(rows, keep, cutoff)
+                        if compacted is None:
+                            continue
+                        version, state = compacted
+                        await conn.execute(pg_sql(AUDIT_SNAPSHOT_SQL), state, assignee_id, entity, version)
+                        status = await conn.execute(pg_sql(AUDIT_TRIM_SQL), assignee_id, entity, version)
+                        result["removed"] += int(status.split()[-1])
+            result["entities"] += len(batch)
+            after = tuple(batch[-1])
 
-def row_to_client(row) -> Client:
-    return Client(id=row[0], name=row[1], owner=row[2], created_at=row[3])
+    @staticmethod
+    async def _rebuild_stat_counters(conn) -> None:
+        await conn.execute("DELETE FROM stat_counters")
+        await conn.execute("INSERT INTO stat_counters (scope, kind, status, count) " + STAT_EXPECTED_SQL)
 
+    async def search_clients(self, response: Response, q: str, match: str, tier: str, key, limit: int):
+        q = q.lower()
+        lo, hi = prefix_bounds(q) if q else ("", "\U0010ffff")
+        rows = []
+        async with self._conn() as conn:
+            if tier == "prefix":
+                rows = await conn.fetch(PG_SEARCH_PREFIX_SQL, lo, hi, key[0].lower(), key[1], limit + 1)
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    response.headers["X-Next-Cursor"] = encode_cursor("prefix", [rows[-1][1], rows[-1][0]])
+                    return [client_item(r) for r in rows]
+                tier, key = "token", 0
+            if match:
+                remaining = limit - len(rows)
+                more = await conn.fetch(PG_SEARCH_TOKEN_SQL, pg_tsquery(q), int(key), lo, hi, remaining + 1)
+                if len(more) > remaining:
+                    more = more[:remaining]
+                    response.headers["X-Next-Cursor"] = encode_cursor("token", more[-1][0] if more else int(key))
+                rows = list(rows) + list(more)
+        return [client_item(r) for r in rows]
 
-@app.get("/api/home/overview", response_model=OverviewResponse)
-def home_overview(owner: str = "demo"):
-    conn = get_db()
-    try:
-        my_rows = conn.execute(
-            "SELECT id, name, owner, created_at FROM clients WHERE owner = ? ORDER BY name",
-            (owner,),
-        ).fetchall()
-        awaiting_rows = conn.execute(
+    async def assign_client(self, client_id: int, owner: str) -> Optional[str]:
+        row = await self.fetchrow(
             """
-            SELECT DISTINCT c.id, c.name, c.owner, c.created_at
-            FROM clients c
-            JOIN tasks t ON t.client_id = c.id
-            WHERE t.status = 'awaiting'
-            ORDER BY c.name
-            """
-        ).fetchall()
-        awaiting_count = conn.execute(
-            "SELECT COUNT(*) FROM tasks WHERE status = 'awaiting'"
-        ).fetchone()[0]
-        return OverviewResponse(
-            my_clients=[row_to_client(r) for r in my_rows],
-            awaiting_clients=[row_to_client(r) for r in awaiting_rows],
-            stats={
-                "my_clients_count": len(my_rows),
-                "awaiting_tasks_count": awaiting_count,
-            },
+            UPDATE clients c SET owner = $2
+            FROM (SELECT id, owner FROM clients WHERE id = $1 FOR UPDATE) old
+            WHERE c.id = old.id
+            RETURNING old.owner
+            """,
+            client_id, owner,
         )
-    finally:
-        conn.close()
+        return row[0] if row else None
 
+    async def my_assignees(self, owner: str) -> List[AssigneeBrief]:
+        rows = await self.fetch(pg_sql(MY_ASSIGNEES_SQL), owner)
+        return [assignee_brief_item(r) for r in rows]
 
-@app.get("/api/clients/search", response_model=List[Client])
-def search_clients(q: str = ""):
-    conn = get_db()
-    try:
-        like = f"%{q.strip()}%"
-        rows = conn.execute(
-            "SELECT id, name, owner, created_at FROM clients WHERE name LIKE ? ORDER BY name",
-            (like,),
-        ).fetchall()
-        return [row_to_client(r) for r in rows]
-    finally:
-        conn.close()
+    async def create_assignee(self, client_id: int, name: str, email: str):
+        try:
+            row = await self.fetchrow(
+                """
+                WITH ins AS (
+                    INSERT INTO assignees (client_id, name, email) VALUES ($1, $2, $3)
+                    RETURNING id, client_id, name, email, created_at
+                )
+                SELECT ins.*, c.owner FROM ins JOIN clients c ON c.id = ins.client_id
+                """,
+                client_id, name, email,
+            )
+        except self._asyncpg.ForeignKeyViolationError:
+            return None
+        return row_to_assignee(row), row["owner"]
 
+    async def get_assignee(self, assignee_id: int) -> Optional[AssigneeDetail]:
+        return row_to_assignee_detail(await self.fetchrow(PG_ASSIGNEE_DETAIL_SQL, assignee_id))
 
-class AssignBody(BaseModel):
-    owner: str
+    async def assignee_scope(self, assignee_id: int) -> Optional[tuple]:
+        row = await self.fetchrow(pg_sql(ASSIGNEE_SCOPE_SQL), assignee_id)
+        return tuple(row) if row else None
 
+    async def create_workpaper(self, assignee_id: int, title: str, notes: str) -> Optional[Workpaper]:
+        try:
+            row = await self.fetchrow(
+                """
+                INSERT INTO workpapers (assignee_id, title, notes) VALUES ($1, $2, $3)
+                RETURNING id, assignee_id, title, status, notes, created_at
+                """,
+                assignee_id, title, notes,
+            )
+        except self._asyncpg.ForeignKeyViolationError:
+            return None
+        return row_to_workpaper(row)
 
-@app.post("/api/clients/{client_id}/assign")
-def assign_client(client_id: int, body: AssignBody):
-    conn = get_db()
-    try:
-        cur = conn.execute(
-            "UPDATE clients SET owner = ? WHERE id = ?",
-            (body.owner.strip(), client_id),
+    async def workpaper_forms(self, assignee_ids: List[int]):
+        rows = await self.fetch(
+            """
+            SELECT w.id, w.title, w.status, w.notes, w.created_at, a.name, c.name,
+                coalesce(ts.income_total, 0), coalesce(ts.deductions_total, 0),
+                coalesce(ts.taxable_income, 0), coalesce(ts.estimated_tax, 0)
+            FROM workpapers w
+            JOIN assignees a ON a.id = w.assignee_id
+            JOIN clients c ON c.id = a.client_id
+            LEFT JOIN tax_summary ts ON ts.assignee_id = a.id
+            WHERE w.assignee_id = ANY($1::bigint[])
+            ORDER BY a.id, w.id
+            """,
+            assignee_ids,
         )
-        conn.commit()
-        if cur.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Client not found")
-        return {"status": "ok"}
-    finally:
-        conn.close()
+        return [workpaper_form(r) for r in rows]
 
+    async def get_calc(self, assignee_id: int, calc_key: str) -> Optional[tuple]:
+        schema = CALCULATOR_SCHEMAS.get(calc_key)
+        if schema is not None:
+            row = await self.fetchrow(pg_sql(schema.select_sql()), assignee_id)
+            return (schema.to_dict(tuple(row)[:-1]), row[-1]) if row else None
+        row = await self.fetchrow(pg_sql(FREE_CALC_SQL), assignee_id, calc_key)
+        return (row[0], row[1]) if row else None
 
-# --------- Tools API ---------
+    async def write_calcs(self, assignee_id: int, writes: List[CalcWrite]) -> Optional[Dict[str, int]]:
+        statements = [(w.calc_key, *calc_write_sql(assignee_id, w, PG_NOW, lambda v: v)) for w in writes]
+        async with self._conn() as conn:
+            async with conn.transaction():
+                versions = {}
+                for calc_key, sql, params in statements:
+                    try:
+                        version = await conn.fetchval(pg_sql(sql), *params)
+                    except self._asyncpg.ForeignKeyViolationError:
+                        return None
+                    if version is None:
+                        if await conn.fetchval("SELECT 1 FROM assignees WHERE id = $1", assignee_id) is None:
+                            return None
+                        sql, params = calc_version_query(assignee_id, calc_key)
+                        raise VersionConflict(calc_key, await conn.fetchval(pg_sql(sql), *params) or 0)
+                    versions[calc_key] = version
+                if any(calc_key in TAX_CALC_KEYS for calc_key in versions):
+                    await self._refresh_tax_summary(conn, [assignee_id])
+        return versions
 
-class CoverLetterRequest(BaseModel):
-    candidate_name: str
-    role: str
-    company: str
-    highlights: List[str] = []
+    async def _refresh_tax_summary(self, conn, assignee_ids: Optional[List[int]] = None) -> None:
+        if assignee_ids is None:
+            totals = await conn.fetch(TAX_TOTALS_SELECT)
+        else:
+            totals = await conn.fetch(TAX_TOTALS_SELECT + " WHERE a.id = ANY($1::bigint[])", assignee_ids)
+        rows = []
+        for aid, cid, income_total, deductions_total in totals:
+            t = tax_totals(income_total, deductions_total)
+            rows.append((aid, cid, t["income_total"], t["deductions_total"], t["taxable_income"], t["estimated_tax"]))
+        await conn.executemany(
+            f"""
+            INSERT INTO tax_summary
+                (assignee_id, client_id, income_total, deductions_total, taxable_income, estimated_tax)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (assignee_id) DO UPDATE SET
+                client_id = excluded.client_id,
+                income_total = excluded.income_total,
+                deductions_total = excluded.deductions_total,
+                taxable_income = excluded.taxable_income,
+                estimated_tax = excluded.estimated_tax,
+                updated_at = {PG_NOW}
+            """,
+            rows,
+        )
 
+    async def assignee_overview(self, assignee_id: int, include_inputs: bool) -> Optional[dict]:
+        sql = ASSIGNEE_OVERVIEW_SQL if include_inputs else ASSIGNEE_TOTALS_SQL
+        row = await self.fetchrow(pg_sql(sql), assignee_id)
+        return assignee_overview_result(row, include_inputs) if row else None
 
-class CoverLetterResponse(BaseModel):
-    content: str
+    async def assignee_bundle(self, assignee_id: int, sections: tuple) -> Optional[dict]:
+        async with self._conn() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                detail = row_to_assignee_detail(await conn.fetchrow(PG_ASSIGNEE_DETAIL_SQL, assignee_id))
+                if detail is None:
+                    return None
+                bundle = {}
+                if "assignee" in sections:
+                    bundle["assignee"] = detail
+                if "calcs" in sections:
+                    typed = {
+                        calc_key: await conn.fetchrow(pg_sql(schema.select_sql()), assignee_id)
+                        for calc_key, schema in CALCULATOR_SCHEMAS.items()
+                    }
+                    free = await conn.fetch(pg_sql(FREE_CALCS_SQL), assignee_id)
+                    bundle["calcs"] = bundle_calcs(typed, free)
+                if "overview" in sections:
+                    row = await conn.fetchrow(pg_sql(ASSIGNEE_OVERVIEW_SQL), assignee_id)
+                    bundle["overview"] = assignee_overview_result(row, True)
+                if "workpapers" in sections:
+                    bundle["workpapers"] = [workpaper_item(r) for r in await conn.fetch(pg_sql(WORKPAPERS_SQL), assignee_id)]
+        return bundle
 
+    async def tax_summaries(self, assignee_ids: List[int]) -> List[AssigneeTaxSummary]:
+        rows = await self.fetch(TAX_SUMMARY_SELECT + " WHERE a.id = ANY($1::bigint[]) ORDER BY a.id", assignee_ids)
+        return [tax_summary_item(r) for r in rows]
 
-@app.post("/api/tools/cover-letter", response_model=CoverLetterResponse)
-def generate_cover_letter(body: CoverLetterRequest):
-    lines = [
-        f"Dear {body.company} Hiring Team,",
-        "",
-        f"I am excited to apply for the {body.role} role. With a strong track record in relevant domains and a passion for impact, I believe I can contribute immediately.",
-    ]
-    if body.highlights:
-        lines.append("")
-        lines.append("Highlights:")
-        for h in body.highlights:
-            lines.append(f"- {h}")
-    lines.extend([
-        "",
-        "Thank you for your consideration.",
-        f"Sincerely,",
-        f"{body.candidate_name}",
-    ])
-    return CoverLetterResponse(content="\n".join(lines))
+    async def client_tax_aggregate(self, client_id: int) -> TaxAggregate:
+        return row_to_tax_aggregate(await self.fetchrow(PG_TAX_AGGREGATE_SELECT + " WHERE client_id = $1", client_id))
 
+    async def tax_inputs(self, client_id: Optional[int], owner: Optional[str]) -> list:
+        sql, params = tax_inputs_query(client_id, owner)
+        return [tuple(r) for r in await self.fetch(pg_sql(sql), *params)]
 
-class PdfFillRequest(BaseModel):
-    title: str = "Generated Form"
-    fields: dict
+    async def owner_tax_aggregate(self, owner: str) -> TaxAggregate:
+        row = await self.fetchrow(
+            PG_TAX_AGGREGATE_SELECT + " WHERE client_id IN (SELECT id FROM clients WHERE owner = $1)", owner
+        )
+        return row_to_tax_aggregate(row)
 
+    async def queue_email(self, from_addr: str, to: List[str], subject: str, message: bytes) -> int:
+        row = await self.fetchrow(
+            "INSERT INTO email_outbox (from_addr, to_addrs, subject, message) VALUES ($1, $2, $3, $4) RETURNING id",
+            from_addr, json.dumps(to), subject, message,
+        )
+        return row[0]
 
-class PdfFillResponse(BaseModel):
-    filename: str
-    content_b64: str
+    async def email_status(self, message_id: int) -> Optional[tuple]:
+        return await self.fetchrow(pg_sql(EMAIL_STATUS_SQL), message_id)
 
+    async def requeue_emails(self) -> None:
+        # Every host drains this outbox, so only claims that expired
+        async with self._conn() as conn:
+            await conn.execute(PG_EMAIL_REQUEUE_SQL)
 
-@app.post("/api/tools/pdf-fill", response_model=PdfFillResponse)
-def pdf_fill(body: PdfFillRequest):
-    if not REPORTLAB_AVAILABLE:
-        raise HTTPException(status_code=501, detail="PDF generation not available (reportlab missing)")
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=LETTER)
-    width, height = LETTER
-    c.setTitle(body.title)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(72, height - 72, body.title)
-    c.setFont("Helvetica", 11)
-    y = height - 108
-    for k, v in body.fields.items():
-        c.drawString(72, y, f"{k}: {v}")
-        y -= 18
-        if y < 72:
-            c.showPage()
-            y = height - 72
-            c.setFont("Helvetica", 11)
-    c.showPage()
-    c.save()
-    pdf_bytes = buf.getvalue()
-    buf.close()
-    b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    return PdfFillResponse(filename="generated_form.pdf", content_b64=b64)
+    async def claim_emails(self, claim_seconds: int, limit: int) -> list:
+        return await self.fetch(PG_EMAIL_CLAIM_SQL, claim_seconds, limit)
 
+    async def finish_emails(self, sent: list, retry: list, failed: list) -> None:
+        async with self._conn() as conn:
+            async with conn.transaction():
+                await conn.executemany(PG_EMAIL_SENT_SQL, sent)
+                await conn.executemany(PG_EMAIL_RETRY_SQL, retry)
+                await conn.executemany(PG_EMAIL_FAILED_SQL, failed)
 
-class Attachment(BaseModel):
-    filename: str
-    content_b64: str
-    mimetype: Optional[str] = None
+    async def import_chunk(self, entity: str, batch) -> tuple:
+        """PostgreSQL side of ``import_chunk``: one transaction per chunk, new rows written by COPY.
 
+        Their ids are reserved from the sequence first, so the rows read back
+        afterwards are exactly the chunk's, whatever other sessions insert
+        meanwhile. Calculator data is upserted with executemany, which COPY
+        cannot do. A constraint failure replays the chunk row by row, each in
+        its own savepoint, to report the rejected rows.
+        """
+        rows = [params for _, params in batch]
+        async with self._conn() as conn:
+            async with conn.transaction():
+                if entity == "calculator_data":
+                    insert = self._upsert_calcs
+                else:
+                    ids = await conn.fetch(PG_RESERVE_IDS_SQL, entity, len(rows))
+                    rows = [(r[0], *params) for r, params in zip(ids, rows)]
+                    insert = functools.partial(self._copy_rows, entity)
+                try:
+                    async with conn.transaction():
+                        await insert(conn, rows)
+                    written, errors = rows, []
+                except self._asyncpg.IntegrityConstraintViolationError:
+                    written, errors = [], []
+                    for (line, _), row in zip(batch, rows):
+                        try:
+                            async with conn.transaction():
+                                await insert(conn, [row])
+                            written.append(row)
+                        except self._asyncpg.IntegrityConstraintViolationError as e:
+                            errors.append({"line": line, "error": str(e)})
+                if entity == "calculator_data":
+                    changed = sorted({(p[0], p[1]) for p in written})
+                    ids = sorted({aid for aid, calc_key in changed if calc_key in TAX_CALC_KEYS})
+                    if ids:
+                        await self._refresh_tax_summary(conn, ids)
+                else:
+                    changed = await conn.fetch(PG_BULK_INSERTED_SQL[entity], [r[0] for r in written])
+        return len(written), errors, changed
 
-class SendEmailRequest(BaseModel):
-    to: List[str]
-    subject: str
-    body: str
-    attachments: List[Attachment] = []
+    @staticmethod
+    async def _copy_rows(entity: str, conn, rows: list) -> None:
+        columns = ["id", *BULK_ENTITIES[entity]["model"].model_fields]
+        await conn.copy_records_to_table(entity, records=rows, columns=columns)
 
+    @staticmethod
+    async def _upsert_calcs(conn, rows: list) -> None:
+        by_sql = {}
+        for assignee_id, calc_key, data in rows:
+            schema = CALCULATOR_SCHEMAS.get(calc_key)
+            if schema is None:
+                by_sql.setdefault(PG_BULK_CALC_UPSERT_SQL, []).append((assignee_id, calc_key, data))
+            else:
+                by_sql.setdefault(pg_sql(schema.upsert_sql(PG_NOW)), []).append((assignee_id, *data))
+        for sql, params in by_sql.items():
+            await conn.executemany(sql, params)
 
-@app.post("/api/tools/send-email")
-def send_email(body: SendEmailRequest):
-    # Build message
-    msg = EmailMessage()
-    msg["Subject"] = body.subject
-    msg["To"] = ", ".join(body.to)
-    from_addr = os.environ.get("SMTP_FROM", "noreply@example.com")
-    msg["From"] = from_addr
-    msg.set_content(body.body)
-    for att in body.attachments:
-        data = base64.b64decode(att.content_b64)
-        maintype, subtype = (att.mimetype or "application/octet-stream").split("/", 1)
-        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=att.filename)
+    async def export_rows(self, entity: str):
+        sql = BULK_ENTITIES[entity].get("pg_select") or bulk_select_sql(entity)
+        async with self._conn() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                cur = await conn.cursor(sql)
+                while rows := await cur.fetch(BULK_EXPORT_BATCH):
+                    yield rows
 
-    smtp_host = os.environ.get("SMTP_HOST")
-    smtp_port = int(os.environ.get("SMTP_PORT", "587"))
-    smtp_user = os.environ.get("SMTP_USER")
-    smtp_pass = os.environ.get("SMTP_PASS")
-    smtp_tls = os.environ.get("SMTP_TLS", "true").lower() == "true"
 
-    # If SMTP not configured, return preview only
-    if not smtp_host:
-        return {"status": "preview", "from": from_addr, "to": body.to, "subject": body.subject, "body": body.body, "attachments": [a.filename for a in body.attachments]}
+def make_storage() -> Storage:
+    if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(DATABASE_URL)
+    return SqliteStorage()
 
-    try:
-        server = smtplib.SMTP(smtp_host, smtp_port, timeout=10)
-        if smtp_tls:
-            server.starttls()
-        if smtp_user:
-            server.login(smtp_user, smtp_pass or "")
-        server.send_message(msg)
-        server.quit()
-        return {"status": "sent"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"SMTP error: {e}")
 
+storage = make_storage()
 
-# --------- Client/Assignee/Workpaper API ---------
 
-class Assignee(BaseModel):
-    id: int
+# --------- Bulk import/export API ---------
+
+class ClientRow(BaseModel):
+    name: str
+    owner: str = ""
+
+
+class AssigneeRow(BaseModel):
     client_id: int
     name: str
-    email: str
-    created_at: str
+    email: str = ""
 
 
-class Workpaper(BaseModel):
-    id: int
+class WorkpaperRow(BaseModel):
     assignee_id: int
     title: str
-    status: str
-    notes: str
-    created_at: str
+    status: Literal[WORKPAPER_STATUSES] = "draft"
+    notes: str = ""
 
 
-class AssigneeBrief(BaseModel):
-    id: int
-    name: str
-    client_name: str
+class CalculatorRow(BaseModel):
+    assignee_id: int
+    calc_key: str
+    data: dict
 
 
-class ClientDetail(Client):
-    pass
+BULK_ENTITIES = {
+    "clients": {
+        "model": ClientRow,
+        "insert": "INSERT INTO clients (name, owner) VALUES (?, ?)",
+        "columns": ("id", "name", "owner", "created_at"),
+    },
+    "assignees": {
+        "model": AssigneeRow,
+        "insert": "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)",
+        "columns": ("id", "client_id", "name", "email", "created_at"),
+    },
+    "workpapers": {
+        "model": WorkpaperRow,
+        "insert": "INSERT INTO workpapers (assignee_id, title, status, notes) VALUES (?, ?, ?, ?)",
+        "columns": ("id", "assignee_id", "title", "status", "notes", "created_at"),
+    },
+    "calculator_data": {
+        "model": CalculatorRow,
+        "insert": """
+            INSERT INTO calculator_data (assignee_id, calc_key, data) VALUES (?, ?, ?)
+            ON CONFLICT(assignee_id, calc_key)
+            DO UPDATE SET data = excluded.data, version = calculator_data.version + 1, updated_at = datetime('now')
+        """,
+        # Registered calculators live in their own tables; exported as JSON like the rest
+        "columns": ("assignee_id", "calc_key", "data", "updated_at"),
+        "select": " UNION ALL ".join(
+            ["SELECT assignee_id, calc_key, data, updated_at FROM calculator_data"]
+            + [
+                f"SELECT assignee_id, '{schema.calc_key}', {schema.json_sql()}, updated_at FROM {schema.table}"
+                for schema in CALCULATOR_SCHEMAS.values()
+            ]
+        ) + " ORDER BY assignee_id, calc_key",
+        "pg_select": " UNION ALL ".join(
+            ["SELECT assignee_id, calc_key, data, updated_at FROM calculator_data"]
+            + [
+                f"SELECT assignee_id, '{schema.calc_key}', {schema.pg_json_sql()}, updated_at FROM {schema.table}"
+                for schema in CALCULATOR_SCHEMAS.values()
+            ]
+        ) + " ORDER BY assignee_id, calc_key",
+    },
+}
 
+BULK_EXPORT_BATCH = 1000
 
-class AssigneeDetail(Assignee):
-    client: ClientDetail
 
+def bulk_entity(entity: str) -> dict:
+    spec = BULK_ENTITIES.get(entity)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown entity '{entity}'")
+    return spec
 
-@app.get("/api/clients", response_model=List[Client])
-def list_clients():
-    conn = get_db()
-    try:
-        rows = conn.execute(
-            "SELECT id, name, owner, created_at FROM clients ORDER BY name"
-        ).fetchall()
-        return [row_to_client(r) for r in rows]
-    finally:
-        conn.close()
 
+def read_bulk_rows(fileobj, fmt: str):
+    """Yield (line number, raw dict or parse error) from an NDJSON or CSV upload."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for raw in reader:
+            # Empty cells fall back to the column default
+            yield reader.line_num, {k: v for k, v in raw.items() if v not in ("", None)}
+        return
+    for n, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            yield n, ValueError(f"invalid JSON: {e}")
+            continue
+        yield n, raw if isinstance(raw, dict) else ValueError("expected a JSON object")
 
-@app.get("/api/home/my-assignees", response_model=List[AssigneeBrief])
-def my_assignees(owner: str = "demo"):
-    conn = get_db()
-    try:
-        rows = conn.execute(
-            """
-            SELECT a.id, a.name, c.name as client_name
-            FROM assignees a
-            JOIN clients c ON c.id = a.client_id
-            WHERE c.owner = ?
-            ORDER BY a.name
-            """,
-            (owner,),
-        ).fetchall()
-        return [AssigneeBrief(id=r[0], name=r[1], client_name=r[2]) for r in rows]
-    finally:
-        conn.close()
 
+def bulk_select_sql(entity: str) -> str:
+    spec = BULK_ENTITIES[entity]
+    return spec.get("select") or f"SELECT {', '.join(spec['columns'])} FROM {entity} ORDER BY id"
 
-class AssigneeCreate(BaseModel):
-    name: str
-    email: str = ""
 
+def bulk_statement(entity: str, params: tuple) -> tuple:
+    """(sql, params) inserting one parsed row; registered calculators go to their typed table."""
+    if entity == "calculator_data" and params[1] in CALCULATOR_SCHEMAS:
+        return CALCULATOR_SCHEMAS[params[1]].upsert_sql(), (params[0], *params[2])
+    return BULK_ENTITIES[entity]["insert"], params
 
-@app.get("/api/clients/{client_id}/assignees", response_model=List[Assignee])
-def list_assignees(client_id: int):
-    conn = get_db()
-    try:
-        rows = conn.execute(
-            "SELECT id, client_id, name, email, created_at FROM assignees WHERE client_id = ? ORDER BY name",
-            (client_id,),
-        ).fetchall()
-        return [Assignee(id=r[0], client_id=r[1], name=r[2], email=r[3], created_at=r[4]) for r in rows]
-    finally:
-        conn.close()
 
+# Rows an import chunk added, read back inside its transaction for cache
+# invalidation and change events; ``?`` is the largest id before the chunk.
+BULK_INSERTED_SQL = {
+    "clients": "SELECT id, owner FROM clients WHERE id > ?",
+    "assignees": """
+        SELECT a.id, a.client_id, a.name, a.email, a.created_at, c.owner
+        FROM assignees a JOIN clients c ON c.id = a.client_id
+        WHERE a.id > ?
+    """,
+    "workpapers": "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers WHERE id > ?",
+}
 
-@app.post("/api/clients/{client_id}/assignees", response_model=Assignee, status_code=201)
-def create_assignee(client_id: int, body: AssigneeCreate):
-    conn = get_db()
+# On PostgreSQL a chunk's ids are reserved up front and its rows read back by them
+PG_RESERVE_IDS_SQL = "SELECT nextval(pg_get_serial_sequence($1, 'id')) FROM generate_series(1, $2)"
+PG_BULK_INSERTED_SQL = {
+    "clients": "SELECT id, owner FROM clients WHERE id = ANY($1::bigint[]) ORDER BY id",
+    "assignees": """
+        SELECT a.id, a.client_id, a.name, a.email, a.created_at, c.owner
+        FROM assignees a JOIN clients c ON c.id = a.client_id
+        WHERE a.id = ANY($1::bigint[])
+        ORDER BY a.id
+    """,
+    "workpapers": """
+        SELECT id, assignee_id, title, status, notes, created_at FROM workpapers
+        WHERE id = ANY($1::bigint[])
+        ORDER BY id
+    """,
+}
+PG_BULK_CALC_UPSERT_SQL = f"""
+    INSERT INTO calculator_data (assignee_id, calc_key, data) VALUES ($1, $2, $3::text::jsonb)
+    ON CONFLICT (assignee_id, calc_key)
+    DO UPDATE SET data = excluded.data, version = calculator_data.version + 1, updated_at = {PG_NOW}
+"""
+
+
+def import_chunk(conn, entity: str, batch) -> tuple:
+    """Insert one chunk in its own transaction; returns (inserted, errors, changed).
+
+    The whole chunk goes through one executemany per target table; only if
+    a constraint fails is it replayed row by row to report exactly which
+    rows were rejected. ``changed`` holds the inserted rows (for
+    calculators, their (assignee_id, calc_key) pairs).
+    """
+    statements = [(line, *bulk_statement(entity, params)) for line, params in batch]
+    by_sql = {}
+    for _, sql, params in statements:
+        by_sql.setdefault(sql, []).append(params)
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cur = conn.execute(
-            "INSERT INTO assignees (client_id, name, email) VALUES (?, ?, ?)",
-            (client_id, body.name.strip(), body.email.strip()),
-        )
+        last_id = None
+        if entity in BULK_INSERTED_SQL:
+            last_id = conn.execute(f"SELECT coalesce(max(id), 0) FROM {entity}").fetchone()[0]
+        try:
+            for sql, rows in by_sql.items():
+                conn.executemany(sql, rows)
+            written, errors = [params for _, params in batch], []
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            conn.execute("BEGIN IMMEDIATE")
+            written, errors = [], []
+            for (line, sql, params), (_, row) in zip(statements, batch):
+                try:
+                    conn.execute(sql, params)
+                    written.append(row)
+                except sqlite3.IntegrityError as e:
+                    errors.append({"line": line, "error": str(e)})
+        if entity == "calculator_data":
+            changed = sorted({(p[0], p[1]) for p in written})
+            ids = sorted({aid for aid, calc_key in changed if calc_key in TAX_CALC_KEYS})
+            if ids:
+                refresh_tax_summary(conn, ids)
+        else:
+            changed = conn.execute(BULK_INSERTED_SQL[entity], (last_id,)).fetchall()
         conn.commit()
-        new_id = cur.lastrowid
-        row = conn.execute(
-            "SELECT id, client_id, name, email, created_at FROM assignees WHERE id = ?",
-            (new_id,),
-        ).fetchone()
-        return Assignee(id=row[0], client_id=row[1], name=row[2], email=row[3], created_at=row[4])
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(written), errors, changed
 
 
-class WorkpaperCreate(BaseModel):
-    title: str
-    notes: str = ""
+async def publish_bulk_changes(entity: str, changed) -> None:
+    """Invalidate cached responses and publish change events for an imported chunk, as the per-row handlers do."""
+    if entity == "clients":
+        response_cache.invalidate("clients", *{f"owner:{owner}" for _, owner in changed})
+    elif entity == "assignees":
+        response_cache.invalidate(*{f"owner:{r[5]}" for r in changed})
+        for r in changed:
+            assignee = row_to_assignee(r)
+            change_broker.publish(
+                "assignee.created", (f"assignee:{assignee.id}", f"client:{assignee.client_id}", f"owner:{r[5]}"),
+                assignee_id=assignee.id, client_id=assignee.client_id, assignee=assignee.model_dump(),
+            )
+    elif entity == "workpapers":
+        response_cache.invalidate(*{f"assignee:{r[1]}" for r in changed})
+        topics = {}
+        for r in changed:
+            if r[1] not in topics:
+                topics[r[1]] = await assignee_topics(r[1])
+            if change_broker.listening(topics[r[1]]):
+                workpaper = row_to_workpaper(r)
+                change_broker.publish(
+                    "workpaper.created", topics[r[1]], assignee_id=r[1], workpaper=workpaper.model_dump()
+                )
+    else:
+        response_cache.invalidate(*{f"assignee:{aid}" for aid, _ in changed})
+        for assignee_id, calc_key in changed:
+            await publish_calc_change(assignee_id, calc_key)
 
 
-@app.get("/api/assignees/{assignee_id}/workpapers", response_model=List[Workpaper])
-def list_workpapers(assignee_id: int):
-    conn = get_db()
-    try:
-        rows = conn.execute(
-            "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers WHERE assignee_id = ? ORDER BY id DESC",
-            (assignee_id,),
-        ).fetchall()
-        return [Workpaper(id=r[0], assignee_id=r[1], title=r[2], status=r[3], notes=r[4], created_at=r[5]) for r in rows]
-    finally:
-        conn.close()
+def bulk_batches(entity: str, fmt: str, fileobj, record):
+    """Yield chunks of up to BULK_CHUNK_SIZE parsed (line, params) rows, passing rejected rows to ``record``."""
+    model = BULK_ENTITIES[entity]["model"]
+    fields = list(model.model_fields)
+    batch = []
+    for line, raw in read_bulk_rows(fileobj, fmt):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            if fmt == "csv" and isinstance(raw.get("data"), str):
+                raw["data"] = json.loads(raw["data"])
+            row = model(**raw)
+            params = tuple(
+                json.dumps(v) if isinstance(v, dict) else v for v in (getattr(row, f) for f in fields)
+            )
+            if entity == "calculator_data" and row.calc_key in CALCULATOR_SCHEMAS:
+                params = (row.assignee_id, row.calc_key, CALCULATOR_SCHEMAS[row.calc_key].values(row.data))
+        except ValidationError as e:
+            msg = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            record([{"line": line, "error": msg}])
+            continue
+        except ValueError as e:
+            record([{"line": line, "error": str(e)}])
+            continue
+        batch.append((line, params))
+        if len(batch) >= BULK_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
-@app.post("/api/assignees/{assignee_id}/workpapers", response_model=Workpaper, status_code=201)
-def create_workpaper(assignee_id: int, body: WorkpaperCreate):
-    conn = get_db()
-    try:
-        cur = conn.execute(
-            "INSERT INTO workpapers (assignee_id, title, notes) VALUES (?, ?, ?)",
-            (assignee_id, body.title.strip(), body.notes.strip()),
-        )
-        conn.commit()
-        new_id = cur.lastrowid
-        row = conn.execute(
-            "SELECT id, assignee_id, title, status, notes, created_at FROM workpapers WHERE id = ?",
-            (new_id,),
-        ).fetchone()
-        return Workpaper(id=row[0], assignee_id=row[1], title=row[2], status=row[3], notes=row[4], created_at=row[5])
-    finally:
-        conn.close()
+async def import_rows(entity: str, fmt: str, fileobj) -> dict:
+    """Parse the upload on a worker thread and insert each chunk through the storage (on SQLite, the writer thread)."""
+    inserted, error_count, errors = 0, 0, []
 
+    def record(new_errors):
+        nonlocal error_count
+        error_count += len(new_errors)
+        errors.extend(new_errors[: max(0, BULK_MAX_ERRORS - len(errors))])
 
-@app.get("/api/assignees/{assignee_id}", response_model=AssigneeDetail)
-def get_assignee(assignee_id: int):
-    conn = get_db()
-    try:
-        a = conn.execute(
-            "SELECT id, client_id, name, email, created_at FROM assignees WHERE id = ?",
-            (assignee_id,),
-        ).fetchone()
-        if not a:
-            raise HTTPException(status_code=404, detail="Assignee not found")
-        c = conn.execute(
-            "SELECT id, name, owner, created_at FROM clients WHERE id = ?",
-            (a[1],),
-        ).fetchone()
-        if not c:
-            raise HTTPException(status_code=404, detail="Client not found")
-        return AssigneeDetail(
-            id=a[0], client_id=a[1], name=a[2], email=a[3], created_at=a[4],
-            client=ClientDetail(id=c[0], name=c[1], owner=c[2], created_at=c[3])
-        )
-    finally:
-        conn.close()
+    batches = bulk_batches(entity, fmt, fileobj, record)
+    while (batch := await run_in_threadpool(next, batches, None)) is not None:
+        n, errs, changed = await storage.import_chunk(entity, batch)
+        inserted += n
+        record(errs)
+        await publish_bulk_changes(entity, changed)
+    errors.sort(key=lambda e: e["line"])
+    return {"entity": entity, "inserted": inserted, "error_count": error_count, "errors": errors}
 
 
-@app.get("/api/assignees/{assignee_id}/calc/{calc_key}")
-def get_calc_data(assignee_id: int, calc_key: str):
-    conn = get_db()
+@app.post("/api/bulk/{entity}")
+async def bulk_import(entity: str, request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Load NDJSON or CSV rows from the request body.
+
+    The body is spooled (to disk past a few MB) and inserted in chunks of
+    BULK_CHUNK_SIZE rows, one executemany and one commit per chunk. Rows
+    that fail validation or a constraint are reported by line number and
+    do not abort the rest of the import.
+    """
+    bulk_entity(entity)
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
     try:
-        row = conn.execute(
-            "SELECT data FROM calculator_data WHERE assignee_id = ? AND calc_key = ?",
-            (assignee_id, calc_key),
-        ).fetchone()
-        return {"data": {} if not row else __import__('json').loads(row[0])}
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        return await import_rows(entity, format, spool)
     finally:
-        conn.close()
+        spool.close()
 
 
-class SaveCalcBody(BaseModel):
-    data: dict
+def bulk_export_text(columns, rows, fmt: str) -> str:
+    """Exported rows as CSV lines or NDJSON, with calculator ``data`` as a JSON object either way."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        csv.writer(buf).writerows([json.dumps(v) if isinstance(v, dict) else v for v in r] for r in rows)
+        return buf.getvalue()
+    for r in rows:
+        item = dict(zip(columns, r))
+        if isinstance(item.get("data"), str):
+            item["data"] = json.loads(item["data"])
+        buf.write(json.dumps(item) + "\n")
+    return buf.getvalue()
 
 
-@app.put("/api/assignees/{assignee_id}/calc/{calc_key}")
-def put_calc_data(assignee_id: int, calc_key: str, body: SaveCalcBody):
-    import json
-    conn = get_db()
-    try:
-        payload = json.dumps(body.data or {})
-        conn.execute(
-            """
-            INSERT INTO calculator_data (assignee_id, calc_key, data)
-            VALUES (?, ?, ?)
-            ON CONFLICT(assignee_id, calc_key)
-            DO UPDATE SET data = excluded.data, updated_at = datetime('now')
-            """,
-            (assignee_id, calc_key, payload),
-        )
-        conn.commit()
-        return {"status": "ok"}
-    finally:
-        conn.close()
+@app.get("/api/bulk/{entity}")
+async def bulk_export(entity: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    columns = bulk_entity(entity)["columns"]
+    batches = await prefetched(storage.export_rows(entity))
 
+    async def generate():
+        if format == "csv":
+            yield bulk_export_text(columns, [columns], format)  # the header
+        async for rows in batches:
+            yield await run_in_threadpool(bulk_export_text, columns, rows, format)
 
-@app.get("/api/assignees/{assignee_id}/overview")
-def assignee_overview(assignee_id: int):
-    import json
-    conn = get_db()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'},
+    )
+
+
+# --------- Query plan checks ---------
+
+def list_plan_checks(name: str, query: ListQuery, params: list, full_scan_ok: bool = False) -> list:
+    """Checks for a list query as ``page_query`` builds it: the full listing and a page after a cursor."""
+    return [
+        (name, *page_query(Page(None, None, "json"), query, params), full_scan_ok),
+        (name + ".after", *page_query(Page(1, 50, "json"), query, params), False),
+    ]
+
+
+# The handlers' own SQL constants and builders, with sample parameters.
+# `python -m backend.main check-plans` and backend/tests/test_query_plans.py
+# fail on any full scan; the tests also fail on a constant missing here.
+QUERY_PLAN_CHECKS = [
+    *list_plan_checks("list_ideas", IDEAS_LIST, [], True),
+    ("idea_by_id", IDEA_SQL, (1,), False),
+    ("delete_idea", IDEA_DELETE_SQL, (1,), False),
+    ("rescore_ideas.chunk", IDEA_SCORE_CHUNK_SQL, (0, 5000), False),
+    ("rescore_ideas.update", IDEA_SCORE_UPDATE_SQL, (1, 1), False),
+    ("home_overview.my_clients", MY_CLIENTS_SQL, ("demo",), False),
+    ("home_overview.awaiting_clients", AWAITING_CLIENTS_SQL, (), False),
+    ("home_overview.awaiting_count", STAT_AWAITING_SQL, (), False),
+    ("home_stats", STAT_SCOPES_SQL, ("all", "owner:demo", "client:1"), False),
+    ("stat_counters.bump", stat_bump_sql("task", "?", 1, "?"), ("awaiting", "awaiting", 1), False),
+    ("stat_counters.subtree", stat_subtree_sql("?", "?", -1), (1, 1), False),
+    ("stat_counters.expected", STAT_EXPECTED_SQL, (), True),
+    ("client_owner", CLIENT_OWNER_SQL, (1,), False),
+    ("assign_client", ASSIGN_CLIENT_SQL, ("demo", 1), False),
+    ("search_clients.prefix", SEARCH_PREFIX_SQL, ("co", "cp", "", 0, 21), False),
+    ("search_clients.token", SEARCH_TOKEN_SQL, ('"co"*', 0, "co", "cp", 21), False),
+    *list_plan_checks("list_clients", CLIENTS_LIST, []),
+    ("my_assignees", MY_ASSIGNEES_SQL, ("demo",), False),
+    *list_plan_checks("list_assignees", ASSIGNEES_LIST, [1]),
+    ("assignee_scope", ASSIGNEE_SCOPE_SQL, (1,), False),
+    ("assignee_by_id", ASSIGNEE_SQL, (1,), False),
+    ("client_by_id", CLIENT_SQL, (1,), False),
+    *list_plan_checks("list_workpapers", WORKPAPERS_LIST, [1]),
+    ("workpaper_by_id", WORKPAPER_SQL, (1,), False),
+    ("workpaper_forms", WORKPAPER_FORMS_SQL, ("[1, 2]",), False),
+    ("email.claim", EMAIL_CLAIM_SQL, ("+300 seconds", 50), False),
+    ("email.requeue", EMAIL_REQUEUE_SQL, (True,), False),
+    ("email.status", EMAIL_STATUS_SQL, (1,), False),
+    ("assignee_bundle.workpapers", WORKPAPERS_SQL, (1,), False),
+    ("assignee_bundle.free_calcs", FREE_CALCS_SQL, (1,), False),
+    ("calc_data", FREE_CALC_SQL, (1, "notes"), False),
+    ("calc_version", *calc_version_query(1, "notes"), False),
+    *[(f"calc_typed.{key}", schema.select_sql(), (1,), False) for key, schema in CALCULATOR_SCHEMAS.items()],
+    ("calc_typed.if_match", *calc_write_sql(1, CalcWrite("income-tax", {"salary": 1.0}, True, 2)), False),
+    ("calc_data.if_match", *calc_write_sql(1, CalcWrite("notes", {"text": None}, True, 2)), False),
+    ("assignee_overview", ASSIGNEE_OVERVIEW_SQL, (1,), False),
+    ("assignee_overview.totals", ASSIGNEE_TOTALS_SQL, (1,), False),
+    ("refresh_tax_summary", *tax_totals_query([1, 2]), False),
+    ("overview_batch", TAX_SUMMARIES_SQL, ("[1, 2]",), False),
+    *list_plan_checks("client_assignees_overview", CLIENT_TAX_SUMMARIES_LIST, [1]),
+    *list_plan_checks("owner_assignees_overview", OWNER_TAX_SUMMARIES_LIST, ["demo"]),
+    ("client_tax_summary", CLIENT_TAX_AGGREGATE_SQL, (1,), False),
+    ("owner_tax_summary", OWNER_TAX_AGGREGATE_SQL, ("demo",), False),
+    *list_plan_checks("audit.entries", AUDIT_LIST, [1, "calc/income-tax"]),
+    ("audit.state", AUDIT_STATE_SQL, (1, "calc/income-tax", "2025-01-01", 1, "calc/income-tax", "2025-01-01"), False),
+    ("audit.compact_entity", AUDIT_ENTITY_SQL, (1, "calc/income-tax"), False),
+    ("audit.compact_candidates", AUDIT_COMPACT_SQL, (0, "", 500, "2025-01-01", AUDIT_COMPACT_BATCH), True),
+    ("audit.snapshot", AUDIT_SNAPSHOT_SQL, ("{}", 1, "calc/income-tax", 2), False),
+    ("audit.trim", AUDIT_TRIM_SQL, (1, "calc/income-tax", 2), False),
+    ("what_if.all", *tax_inputs_query(None, None), True),
+    ("what_if.client", *tax_inputs_query(1, None), False),
+    ("what_if.owner", *tax_inputs_query(None, "demo"), False),
+    *[(f"bulk_import.{entity}", sql, (0,), False) for entity, sql in BULK_INSERTED_SQL.items()],
+]
+
+
+def unindexed_scans(conn, sql: str, params) -> List[str]:
+    """The ``SCAN`` steps of a query plan that read a whole table.
+
+    Scans driven by an index (``SCAN t USING INDEX ...``) or an FTS match
+    (``SCAN f VIRTUAL TABLE INDEX ...``) are not listed, nor are scans of
+    constant rows and of subqueries the query itself materialized.
+    """
+    derived = {"CONSTANT ROW"}
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[3]
+        if detail.startswith(("MATERIALIZE ", "CO-ROUTINE ")):
+            derived.add(detail.split(" ", 1)[1])
+        indexed = " USING " in detail or " VIRTUAL TABLE INDEX " in detail or detail[5:] in derived
+        if detail.startswith("SCAN ") and not indexed:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(conn) -> List[str]:
+    """Return one message per query whose plan contains a full table scan.
+
+    A bare ``SCAN <table>`` is only allowed for queries flagged as full listings.
+    """
+    failures = []
+    for name, sql, params, full_scan_ok in QUERY_PLAN_CHECKS:
+        if not full_scan_ok:
+            failures += [f"{name}: {detail}" for detail in unindexed_scans(conn, sql, params)]
+    return failures
+
+
+async def with_storage(call):
+    """Run one storage call from the CLI, outside the app's startup/shutdown."""
+    await storage.open()
     try:
-        def get_data(key):
-            row = conn.execute(
-                "SELECT data FROM calculator_data WHERE assignee_id = ? AND calc_key = ?",
-                (assignee_id, key),
-            ).fetchone()
-            return {} if not row else json.loads(row[0])
-
-        income = get_data("income-tax")
-        ded = get_data("deductions")
-        income_total = float(income.get("salary", 0)) + float(income.get("bonus", 0)) + float(income.get("other", 0))
-        deductions_total = float(ded.get("retirement", 0)) + float(ded.get("health", 0)) + float(ded.get("charity", 0))
-        taxable = max(0, income_total - deductions_total)
-        est_tax = round(taxable * 0.25, 2)
-        return {
-            "income_total": income_total,
-            "deductions_total": deductions_total,
-            "taxable_income": taxable,
-            "estimated_tax": est_tax,
-            "inputs": {
-                "income": income,
-                "deductions": ded,
-            },
-        }
+        return await call()
     finally:
-        conn.close()
+        await storage.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m backend.main")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check-plans", help="fail if any handler query falls back to a full table scan")
+    migrate = sub.add_parser("migrate", help="create or upgrade the database schema; run once per deploy")
+    migrate.add_argument("--seed", action="store_true", help="fill an empty database with the demo data")
+    sub.add_parser("rescore-ideas", help="recompute every stored idea score with the current scoring table")
+    counters = sub.add_parser("check-counters", help="re-derive the dashboard counters and compare them with the stored ones")
+    counters.add_argument("--repair", action="store_true", help="rewrite the counters from the tables if they drifted")
+    audit = sub.add_parser("compact-audit", help="drop audit log entries past retention; run it as a scheduled job")
+    audit.add_argument("--keep-versions", type=int, default=AUDIT_KEEP_VERSIONS, help="entries kept per entity (0: no limit)")
+    audit.add_argument("--keep-days", type=int, default=AUDIT_KEEP_DAYS, help="days of history kept (0: no limit)")
+    serve = sub.add_parser("serve", help="run the API under uvicorn, one worker per CPU unless WEB_CONCURRENCY says otherwise")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=0, help="worker processes (default: WEB_CONCURRENCY, else the CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        applied = asyncio.run(storage.migrate(args.seed))
+        done = f"applied {', '.join(map(str, applied))}" if applied else "up to date"
+        print(f"{storage.name} schema at version {SCHEMA_VERSION} ({done})")
+        return 0
+    if args.command == "rescore-ideas":
+        result = asyncio.run(with_storage(lambda: storage.rescore_ideas(idea_scorer)))
+        print(f"rescored {result['ideas']} ideas with the {idea_scorer.matcher} matcher, {result['changed']} changed")
+        return 0
+    if args.command == "check-counters":
+        mismatches = asyncio.run(with_storage(lambda: storage.check_stat_counters(args.repair)))
+        for m in mismatches:
+            print(f"{m['scope']} {m['kind']} {m['status'] or '-'}: stored {m['stored']}, expected {m['expected']}")
+        state = ("repaired" if args.repair else "drifted") if mismatches else "consistent"
+        print(f"{len(mismatches)} counter(s) off, stat_counters {state}")
+        return 1 if mismatches and not args.repair else 0
+    if args.command == "compact-audit":
+        result = asyncio.run(with_storage(lambda: storage.compact_audit(args.keep_versions, audit_cutoff(args.keep_days))))
+        print(f"compacted {result['entities']} audit log entities, {result['removed']} entries removed")
+        return 0
+    if args.command == "serve":
+        uvicorn = optional_module("uvicorn")
+        if uvicorn is None:
+            raise SystemExit("serve needs uvicorn (pip install uvicorn)")
+        workers = args.workers or int(os.environ.get("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+        # Each worker imports this module afresh; WEB_CONCURRENCY > 1 turns the worker bus on there
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        uvicorn.run("backend.main:app", host=args.host, port=args.port, workers=workers)
+        return 0
+    if args.command == "check-plans":
+        migrate_db()
+        conn = get_db()
+        try:
+            failures = check_query_plans(conn)
+        finally:
+            conn.close()
+        for f in failures:
+            print(f"SCAN  {f}")
+        print(f"{len(QUERY_PLAN_CHECKS) - len(failures)}/{len(QUERY_PLAN_CHECKS)} query plans OK")
+        return 1 if failures else 0
+    return 0
+
 
 # Serve React static files if built
 frontend_build = os.path.join(os.path.dirname(__file__), "..", "frontend", "build")
 if os.path.isdir(frontend_build):
     app.mount("/", StaticFiles(directory=frontend_build, html=True), name="static")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
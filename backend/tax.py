@@ -0,0 +1,131 @@
+"""Tax engine: progressive bracket schedules and the totals computed from them.
+
+Pure arithmetic with no web or database code, so it can be tested and
+benchmarked on its own. main.py picks the default schedule
+(TAX_JURISDICTION, TAX_YEAR), stores per-assignee results in tax_summary
+and serves the what-if API on top of ``Portfolio``.
+"""
+import bisect
+import json
+from typing import Optional
+
+
+def _numpy():
+    """NumPy, imported on first use, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+# Single-filer federal brackets; "flat" is the old 25% estimate
+DEFAULT_TAX_BRACKETS = {
+    "us-federal": {
+        "2024": [[0, 0.10], [11600, 0.12], [47150, 0.22], [100525, 0.24], [191950, 0.32], [243725, 0.35], [609350, 0.37]],
+        "2025": [[0, 0.10], [11925, 0.12], [48475, 0.22], [103350, 0.24], [197300, 0.32], [250525, 0.35], [626350, 0.37]],
+    },
+    "flat": {
+        "2024": [[0, 0.25]],
+        "2025": [[0, 0.25]],
+    },
+}
+
+
+class TaxSchedule:
+    """Progressive brackets: ``rates[i]`` applies to income from ``thresholds[i]`` to the next threshold.
+
+    ``base[i]`` is the tax owed on income up to ``thresholds[i]``, so the tax
+    on any amount is one bracket lookup, a multiply and an add. ``tax`` does
+    the lookup with bisect for one value, ``tax_array`` with NumPy's
+    searchsorted for many; both round the same way and agree to the cent.
+    """
+
+    def __init__(self, jurisdiction: str, year: int, brackets):
+        brackets = sorted((float(t), float(r)) for t, r in brackets)
+        if not brackets or brackets[0][0] != 0:
+            raise ValueError(f"tax brackets for {jurisdiction} {year} must start at 0")
+        self.jurisdiction = jurisdiction
+        self.year = year
+        self.thresholds = [t for t, _ in brackets]
+        self.rates = [r for _, r in brackets]
+        self.base = [0.0]
+        for i in range(1, len(brackets)):
+            self.base.append(self.base[-1] + (self.thresholds[i] - self.thresholds[i - 1]) * self.rates[i - 1])
+        self._arrays = None
+
+    def tax(self, taxable: float) -> float:
+        if taxable <= 0:
+            return 0.0
+        i = bisect.bisect_right(self.thresholds, taxable) - 1
+        return round((self.base[i] + (taxable - self.thresholds[i]) * self.rates[i]) * 100) / 100
+
+    def tax_array(self, taxable):
+        np = _numpy()
+        if self._arrays is None:
+            self._arrays = (np.array(self.thresholds), np.array(self.rates), np.array(self.base))
+        thresholds, rates, base = self._arrays
+        taxable = np.maximum(taxable, 0.0)
+        i = np.searchsorted(thresholds, taxable, side="right") - 1
+        return np.rint((base[i] + (taxable - thresholds[i]) * rates[i]) * 100) / 100
+
+    def fingerprint(self) -> str:
+        return json.dumps([self.jurisdiction, self.year, self.thresholds, self.rates])
+
+
+def load_tax_schedules(path: str = "") -> dict:
+    """{(jurisdiction, year): TaxSchedule} from a JSON bracket file, or the built-in tables."""
+    tables = DEFAULT_TAX_BRACKETS
+    if path:
+        with open(path) as f:
+            tables = json.load(f)
+    return {
+        (jurisdiction, int(year)): TaxSchedule(jurisdiction, int(year), brackets)
+        for jurisdiction, years in tables.items()
+        for year, brackets in years.items()
+    }
+
+
+def tax_totals(income_total: float, deductions_total: float, schedule: TaxSchedule) -> dict:
+    taxable = max(0, income_total - deductions_total)
+    return {
+        "income_total": income_total,
+        "deductions_total": deductions_total,
+        "taxable_income": taxable,
+        "estimated_tax": schedule.tax(taxable),
+    }
+
+
+class Portfolio:
+    """Stored (income_total, deductions_total, estimated_tax) rows, re-taxed under scenarios.
+
+    With NumPy (``vectorized`` None and NumPy installed, or True) the rows
+    are held as columns and each scenario is a few array operations;
+    otherwise each row is taxed in a Python loop. Both give the same cents.
+    """
+
+    def __init__(self, rows, vectorized: Optional[bool] = None):
+        self.size = len(rows)
+        self._np = _numpy() if vectorized is not False else None
+        if vectorized and self._np is None:
+            raise RuntimeError("vectorized tax totals need numpy")
+        if self._np is not None:
+            data = self._np.asarray(rows, dtype=self._np.float64).reshape(-1, 3)
+            self._income, self._deductions = data[:, 0], data[:, 1]
+            self.current_tax = float(data[:, 2].sum())
+        else:
+            self._rows = rows
+            self.current_tax = sum(r[2] for r in rows)
+
+    def totals(self, schedule: TaxSchedule, income_factor: float = 1.0, extra_deductions: float = 0.0) -> list:
+        """[income, deductions, taxable income, tax] summed over the rows, unrounded."""
+        np = self._np
+        if np is not None:
+            scaled = self._income * income_factor
+            deducted = self._deductions + extra_deductions
+            taxable = np.maximum(scaled - deducted, 0.0)
+            return [float(scaled.sum()), float(deducted.sum()), float(taxable.sum()), float(schedule.tax_array(taxable).sum())]
+        scaled = [r[0] * income_factor for r in self._rows]
+        deducted = [r[1] + extra_deductions for r in self._rows]
+        taxable = [max(i - d, 0.0) for i, d in zip(scaled, deducted)]
+        return [sum(scaled), sum(deducted), sum(taxable), sum(schedule.tax(t) for t in taxable)]
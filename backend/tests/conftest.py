@@ -0,0 +1,107 @@
+import os
+
+import httpx
+import pytest
+
+from backend import main
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point the app at a new SQLite file, closing its connections afterwards."""
+    monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "data.db"))
+    main.response_cache.clear()
+    yield main.DB_PATH
+    main.db.close()
+    main.db_pool.close()
+    main.stream_pool.close()
+    main.response_cache.clear()
+
+
+@pytest.fixture
+async def sqlite_storage(db_path, monkeypatch):
+    """The SQLite backend, migrated and seeded with the demo data."""
+    monkeypatch.setattr(main, "SEED_DEMO_DATA", True)
+    backend = main.SqliteStorage()
+    await backend.open()
+    monkeypatch.setattr(main, "storage", backend)
+    yield backend
+    await backend.close()
+
+
+# Data tables emptied before each PostgreSQL test; settings (schema version) stay
+POSTGRES_TABLES = (
+    "ideas", "clients", "tasks", "assignees", "workpapers", "calculator_data", "calc_income_tax",
+    "calc_deductions", "tax_summary", "stat_counters", "audit_log", "email_outbox",
+)
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    """DATABASE_URL if it is a PostgreSQL URL, else a throwaway server started with ``pgserver``.
+
+    Skips the PostgreSQL tests when neither is available.
+    """
+    url = os.environ.get("DATABASE_URL", "")
+    if url.startswith(("postgres://", "postgresql://")):
+        yield url
+        return
+    pytest.importorskip("asyncpg")
+    pgserver = pytest.importorskip("pgserver", reason="DATABASE_URL is not a PostgreSQL URL and pgserver is not installed")
+    server = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="delete")
+    try:
+        yield server.get_uri("postgres")
+    finally:
+        server.cleanup()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+async def storage(request, db_path, monkeypatch):
+    """Each storage backend, migrated and seeded with the demo data, as ``main.storage``.
+
+    PostgreSQL runs against ``postgres_url``, whose tables are emptied first.
+    """
+    monkeypatch.setattr(main, "SEED_DEMO_DATA", True)
+    if request.param == "sqlite":
+        backend = main.SqliteStorage()
+        await backend.open()
+    else:
+        backend = main.PostgresStorage(request.getfixturevalue("postgres_url"))
+        await backend.open()
+        async with backend._pool.acquire() as conn:
+            await conn.execute(f"TRUNCATE {', '.join(POSTGRES_TABLES)} RESTART IDENTITY CASCADE")
+            await backend._seed(conn)
+            await backend._sync_tax_summary(conn)
+    monkeypatch.setattr(main, "storage", backend)
+    yield backend
+    await backend.close()
+
+
+@pytest.fixture
+def run_sql(storage):
+    """Run one ``?``-placeholder statement on the storage's database and commit; returns the rows."""
+    async def run(sql: str, *params) -> list:
+        if storage.name == "postgres":
+            async with storage._pool.acquire() as conn:
+                return [tuple(r) for r in await conn.fetch(main.pg_sql(sql), *params)]
+
+        def txn(conn):
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+
+        return await main.db.write(txn)
+
+    return run
+
+
+@pytest.fixture
+async def client():
+    """HTTP client calling the app in-process, against whatever ``main.storage`` is."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as http:
+        yield http
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+
+def ndjson(*rows) -> str:
+    return "".join(json.dumps(r) + "\n" for r in rows)
+
+
+def from_ndjson(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines()]
+
+
+@pytest.fixture
+def subscription():
+    sub = main.change_broker.subscribe(["owner:demo", "assignee:1"])
+    yield sub
+    main.change_broker.unsubscribe(sub)
+
+
+def drain(sub) -> list:
+    events = []
+    while not sub.queue.empty():
+        events.append(sub.queue.get_nowait())
+    return events
+
+
+async def test_chunks_go_through_the_writer(sqlite_storage, client, monkeypatch):
+    monkeypatch.setattr(main, "BULK_CHUNK_SIZE", 2)
+    calls = []
+    write = main.db.write
+
+    async def spy(fn, *args):
+        calls.append(fn.__name__)
+        return await write(fn, *args)
+
+    monkeypatch.setattr(main.db, "write", spy)
+    body = ndjson(*({"name": f"Bulk {i}", "owner": "bulk"} for i in range(5)))
+    response = await client.post("/api/bulk/clients", content=body)
+    assert response.json()["inserted"] == 5
+    assert calls == ["import_chunk"] * 3
+
+
+async def test_invalid_workpaper_status_is_a_row_error(storage, client):
+    body = ndjson(
+        {"assignee_id": 1, "title": "Ok", "status": "review"},
+        {"assignee_id": 1, "title": "Bad", "status": "archived"},
+        {"assignee_id": 1, "title": "Default"},
+    )
+    result = (await client.post("/api/bulk/workpapers", content=body)).json()
+    assert result["inserted"] == 2
+    assert [e["line"] for e in result["errors"]] == [2]
+    assert "status" in result["errors"][0]["error"]
+    statuses = [w["status"] for w in (await client.get("/api/assignees/1/workpapers")).json()]
+    assert sorted(statuses) == ["draft", "review"]
+
+
+async def test_constraint_errors_keep_the_rest_of_the_chunk(storage, client):
+    body = ndjson({"assignee_id": 1, "title": "A"}, {"assignee_id": 999, "title": "B"}, {"assignee_id": 1, "title": "C"})
+    result = (await client.post("/api/bulk/workpapers", content=body)).json()
+    assert result["inserted"] == 2
+    assert [e["line"] for e in result["errors"]] == [2]
+
+
+async def test_clients_import_invalidates_cached_listings(storage, client):
+    before = (await client.get("/api/clients")).json()
+    mine = (await client.get("/api/home/overview", params={"owner": "demo"})).json()["my_clients"]
+    await client.post("/api/bulk/clients", content=ndjson({"name": "Imported Co", "owner": "demo"}))
+    after = (await client.get("/api/clients")).json()
+    assert len(after) == len(before) + 1
+    overview = (await client.get("/api/home/overview", params={"owner": "demo"})).json()
+    assert len(overview["my_clients"]) == len(mine) + 1
+
+
+async def test_assignees_import_publishes_and_invalidates(storage, client, subscription):
+    before = (await client.get("/api/home/my-assignees")).json()
+    result = (await client.post("/api/bulk/assignees", content=ndjson({"client_id": 1, "name": "Imported"}))).json()
+    assert result["inserted"] == 1
+    events = drain(subscription)
+    assert [e["type"] for e in events] == ["assignee.created"]
+    assert events[0]["assignee"]["name"] == "Imported"
+    after = (await client.get("/api/home/my-assignees")).json()
+    assert len(after) == len(before) + 1
+
+
+async def test_workpapers_import_publishes_and_invalidates(storage, client, subscription):
+    assert (await client.get("/api/assignees/1/bundle")).json()["workpapers"] == []
+    await client.post("/api/bulk/workpapers", content=ndjson({"assignee_id": 1, "title": "Imported"}))
+    events = drain(subscription)
+    assert [e["type"] for e in events] == ["workpaper.created"]
+    assert events[0]["workpaper"]["title"] == "Imported"
+    bundle = (await client.get("/api/assignees/1/bundle")).json()
+    assert [w["title"] for w in bundle["workpapers"]] == ["Imported"]
+
+
+async def test_calculator_import_publishes_and_invalidates(storage, client, subscription):
+    assert (await client.get("/api/assignees/1/bundle")).json()["overview"]["income_total"] == 0
+    body = ndjson(
+        {"assignee_id": 1, "calc_key": "income-tax", "data": {"salary": 50000}},
+        {"assignee_id": 1, "calc_key": "notes", "data": {"text": "hi"}},
+    )
+    assert (await client.post("/api/bulk/calculator_data", content=body)).json()["inserted"] == 2
+    events = drain(subscription)
+    assert sorted((e["type"], e["calc_key"]) for e in events) == [("calc.updated", "income-tax"), ("calc.updated", "notes")]
+    bundle = (await client.get("/api/assignees/1/bundle")).json()
+    assert bundle["overview"]["income_total"] == 50000
+    assert bundle["calcs"]["notes"]["data"] == {"text": "hi"}
+
+
+async def test_chunks_and_constraint_errors(storage, client, monkeypatch):
+    monkeypatch.setattr(main, "BULK_CHUNK_SIZE", 2)
+    body = ndjson(*({"name": f"Bulk {i}"} for i in range(5)), {"name": "Bulk 1"}, {"name": "Bulk 5"})
+    result = (await client.post("/api/bulk/clients", content=body)).json()
+    assert (result["inserted"], [e["line"] for e in result["errors"]]) == (6, [6])
+    names = [c["name"] for c in from_ndjson((await client.get("/api/bulk/clients")).text)]
+    assert names[-6:] == [f"Bulk {i}" for i in range(6)]
+
+
+async def test_export_round_trip(storage, client):
+    await client.put("/api/assignees/1/calc/income-tax", json={"data": {"salary": 50000}})
+    await client.put("/api/assignees/1/calc/notes", json={"data": {"text": "hi"}})
+    exported = from_ndjson((await client.get("/api/bulk/calculator_data")).text)
+    assert [(r["assignee_id"], r["calc_key"], r["data"]) for r in exported] == [
+        (1, "income-tax", {"salary": 50000}),
+        (1, "notes", {"text": "hi"}),
+    ]
+    rows = [{"assignee_id": 2, "calc_key": r["calc_key"], "data": r["data"]} for r in exported]
+    assert (await client.post("/api/bulk/calculator_data", content=ndjson(*rows))).json()["inserted"] == 2
+    bundle = (await client.get("/api/assignees/2/bundle")).json()
+    assert bundle["calcs"]["notes"]["data"] == {"text": "hi"}
+    assert bundle["overview"]["income_total"] == 50000
+
+
+async def test_csv_export(storage, client):
+    await client.put("/api/assignees/1/calc/notes", json={"data": {"text": "a, b"}})
+    response = await client.get("/api/bulk/calculator_data", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    header, row = response.text.splitlines()
+    assert header == "assignee_id,calc_key,data,updated_at"
+    assert row.startswith('1,notes,"{""text"": ""a, b""}",')
@@ -0,0 +1,89 @@
+"""The assignee bundle on both backends: section selection, ETags and invalidation after writes."""
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+
+async def bundle(client, assignee_id: int = 1, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return await client.get(f"/api/assignees/{assignee_id}/bundle", params=params, headers=headers)
+
+
+async def test_every_section_by_default(storage, client):
+    body = (await bundle(client)).json()
+    assert list(body) == list(main.BUNDLE_SECTIONS)
+    assert body["assignee"]["id"] == 1
+    assert body["assignee"]["client"]["id"] == body["assignee"]["client_id"]
+    assert {k: body["calcs"][k] for k in main.CALCULATOR_SCHEMAS} == {k: {"data": {}, "version": 0} for k in main.CALCULATOR_SCHEMAS}
+    assert body["overview"]["income_total"] == 0
+    assert body["workpapers"] == []
+
+
+@pytest.mark.parametrize(
+    "include, sections",
+    [
+        ("workpapers,calcs", ["calcs", "workpapers"]),
+        (" overview , ", ["overview"]),
+        ("assignee,assignee", ["assignee"]),
+    ],
+)
+async def test_include_selects_sections(storage, client, include, sections):
+    everything = (await bundle(client)).json()
+    response = await bundle(client, include=include)
+    assert response.json() == {s: everything[s] for s in sections}
+    assert response.headers["etag"] != (await bundle(client)).headers["etag"]
+
+
+async def test_bad_requests(storage, client):
+    response = await bundle(client, include="calcs,secrets")
+    assert response.status_code == 400
+    assert "secrets" in response.json()["detail"]
+    assert (await bundle(client, 999)).status_code == 404
+    assert main.response_cache.stats()["entries"] == 0
+
+
+async def test_matching_etag_is_a_304(storage, client):
+    first = await bundle(client, include="calcs")
+    etag = first.headers["etag"]
+    unchanged = await bundle(client, etag=etag, include="calcs")
+    assert (unchanged.status_code, unchanged.content, unchanged.headers["etag"]) == (304, b"", etag)
+    assert (await bundle(client, etag=etag, include="workpapers")).status_code == 200
+    assert (await bundle(client, etag='"other"', include="calcs")).status_code == 200
+
+
+async def test_calc_save_invalidates(storage, client):
+    etag = (await bundle(client)).headers["etag"]
+    other = (await bundle(client, 2)).headers["etag"]
+    await client.put("/api/assignees/1/calc/income-tax", json={"data": {"salary": 1000}})
+
+    response = await bundle(client, etag=etag)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["calcs"]["income-tax"] == {"data": {"salary": 1000}, "version": 1}
+    assert body["overview"]["income_total"] == 1000
+    # Other assignees' bundles stay cached
+    assert (await bundle(client, 2, etag=other)).status_code == 304
+
+    etag = response.headers["etag"]
+    await client.post("/api/assignees/1/calc:batch", json={"calcs": {"notes": {"data": {"text": "hi"}}}})
+    response = await bundle(client, etag=etag, include="calcs")
+    assert response.json()["calcs"]["notes"] == {"data": {"text": "hi"}, "version": 1}
+
+
+async def test_workpaper_create_invalidates(storage, client):
+    etag = (await bundle(client, include="workpapers")).headers["etag"]
+    assert (await client.post("/api/assignees/1/workpapers", json={"title": "W-2"})).status_code == 201
+    response = await bundle(client, etag=etag, include="workpapers")
+    assert response.status_code == 200
+    assert [w["title"] for w in response.json()["workpapers"]] == ["W-2"]
+
+
+async def test_client_assign_invalidates(storage, client):
+    response = await bundle(client, include="assignee")
+    client_id = response.json()["assignee"]["client_id"]
+    await client.post(f"/api/clients/{client_id}/assign", json={"owner": "someone"})
+    changed = await bundle(client, etag=response.headers["etag"], include="assignee")
+    assert changed.status_code == 200
+    assert changed.json()["assignee"]["client"]["owner"] == "someone"
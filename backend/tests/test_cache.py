@@ -0,0 +1,150 @@
+"""The response cache: hits and misses, ETags and 304s, and invalidation by tag after writes."""
+import json
+
+import pytest
+
+from backend import main
+
+
+def test_counters_ttl_and_lru():
+    cache = main.ResponseCache(2, 60)
+    assert cache.get("a") is None
+    etag = cache.put("a", b"[1]", {"clients"}, cache.generation)
+    assert cache.get("a") == (cache.get("a")[0], etag, b"[1]", frozenset({"clients"}))
+    cache.put("b", b"[2]", {"owner:demo"}, cache.generation)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", b"[3]", {"owner:demo"}, cache.generation)
+    assert cache.get("b") is None
+    assert cache.stats() | {"ttl_seconds": 0} == {
+        "entries": 2, "max_entries": 2, "ttl_seconds": 0, "hits": 3, "misses": 2,
+        "not_modified": 0, "evictions": 1, "invalidations": 0,
+    }
+
+    expired = main.ResponseCache(2, -1)
+    expired.put("a", b"[]", (), expired.generation)
+    assert expired.get("a") is None
+
+
+def test_invalidate_by_tag():
+    cache = main.ResponseCache(10, 60)
+    for key, tags in [("clients", {"clients"}), ("mine", {"owner:demo"}), ("theirs", {"owner:other"})]:
+        cache.put(key, b"[]", tags, cache.generation)
+    cache.invalidate("clients", "owner:demo")
+    assert [k for k in ("clients", "mine", "theirs") if cache.get(k)] == ["theirs"]
+    assert cache.invalidations == 2
+
+
+def test_body_computed_before_an_invalidation_is_not_cached():
+    cache = main.ResponseCache(10, 60)
+    generation = cache.generation
+    cache.invalidate("clients")  # a write finished while the body was being computed
+    etag = cache.put("clients", b"[]", {"clients"}, generation)
+    assert etag.startswith('"')
+    assert cache.get("clients") is None
+
+
+def test_etag_matches_weak_and_any():
+    def request(value):
+        return main.Request({"type": "http", "headers": [(b"if-none-match", value.encode())]})
+
+    assert main.etag_matches(request('"x"'), '"x"')
+    assert main.etag_matches(request('"y", W/"x"'), '"x"')
+    assert main.etag_matches(request("*"), '"x"')
+    assert not main.etag_matches(request('"y"'), '"x"')
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """An empty ``response_cache`` with zeroed counters for each test."""
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(main.RESPONSE_CACHE_SIZE, main.RESPONSE_CACHE_TTL))
+
+
+async def stats(client) -> dict:
+    return (await client.get("/api/cache/stats")).json()
+
+
+@pytest.mark.anyio
+async def test_etag_and_not_modified(storage, client):
+    first = await client.get("/api/home/my-assignees", params={"owner": "demo"})
+    assert first.headers["cache-control"] == "no-cache"
+    etag = first.headers["etag"]
+    assert (await stats(client))["misses"] == 1
+
+    again = await client.get("/api/home/my-assignees", params={"owner": "demo"})
+    assert (again.content, again.headers["etag"]) == (first.content, etag)
+    unchanged = await client.get("/api/home/my-assignees", params={"owner": "demo"}, headers={"If-None-Match": etag})
+    assert (unchanged.status_code, unchanged.content, unchanged.headers["etag"]) == (304, b"", etag)
+    stale = await client.get("/api/home/my-assignees", params={"owner": "demo"}, headers={"If-None-Match": '"old"'})
+    assert stale.status_code == 200
+
+    counters = await stats(client)
+    assert (counters["hits"], counters["misses"], counters["not_modified"]) == (3, 1, 1)
+    # Another owner is another entry
+    await client.get("/api/home/my-assignees", params={"owner": "nobody"})
+    assert (await stats(client))["misses"] == 2
+
+
+async def cached(client, path: str, **params):
+    """GET ``path`` twice, the second time from the cache; returns the body and ETag."""
+    response = await client.get(path, params=params)
+    hits = (await stats(client))["hits"]
+    assert (await client.get(path, params=params)).content == response.content
+    assert (await stats(client))["hits"] == hits + 1
+    return response.json(), response.headers["etag"]
+
+
+async def refetched(client, path: str, etag: str, **params):
+    """GET ``path`` with its old ETag, which must no longer match; returns the new body."""
+    response = await client.get(path, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    return response.json()
+
+
+@pytest.mark.anyio
+async def test_assign_client_invalidates_both_owners(storage, client):
+    clients, clients_etag = await cached(client, "/api/clients")
+    demo, demo_etag = await cached(client, "/api/home/my-assignees", owner="demo")
+    new, new_etag = await cached(client, "/api/home/my-assignees", owner="new")
+    assert new == []
+
+    moved = next(c for c in clients if c["owner"] == "demo")
+    assert (await client.post(f"/api/clients/{moved['id']}/assign", json={"owner": "new"})).status_code == 200
+
+    assert next(c for c in await refetched(client, "/api/clients", clients_etag) if c["id"] == moved["id"])["owner"] == "new"
+    demo_after = await refetched(client, "/api/home/my-assignees", demo_etag, owner="demo")
+    new_after = await refetched(client, "/api/home/my-assignees", new_etag, owner="new")
+    assert {a["client_name"] for a in new_after} == {moved["name"]}
+    assert len(demo_after) == len(demo) - len(new_after)
+
+
+@pytest.mark.anyio
+async def test_create_assignee_invalidates_its_owner(storage, client):
+    demo, demo_etag = await cached(client, "/api/home/my-assignees", owner="demo")
+    clients, clients_etag = await cached(client, "/api/clients")
+    demo_client = next(c for c in clients if c["owner"] == "demo")
+    response = await client.post(f"/api/clients/{demo_client['id']}/assignees", json={"name": "New Hire"})
+    assert response.status_code == 201
+
+    after = await refetched(client, "/api/home/my-assignees", demo_etag, owner="demo")
+    assert [a["name"] for a in after if a not in demo] == ["New Hire"]
+    # Client listings do not carry assignees, so they stay cached
+    unchanged = await client.get("/api/clients", headers={"If-None-Match": clients_etag})
+    assert unchanged.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_bulk_import_invalidates(storage, client):
+    clients, clients_etag = await cached(client, "/api/clients")
+    demo, demo_etag = await cached(client, "/api/home/my-assignees", owner="demo")
+    demo_client = next(c for c in clients if c["owner"] == "demo")
+
+    body = json.dumps({"name": "Imported Co", "owner": "demo"}) + "\n"
+    assert (await client.post("/api/bulk/clients", content=body)).json()["inserted"] == 1
+    assert "Imported Co" in [c["name"] for c in await refetched(client, "/api/clients", clients_etag)]
+
+    demo, demo_etag = await cached(client, "/api/home/my-assignees", owner="demo")
+    body = json.dumps({"client_id": demo_client["id"], "name": "Imported Hire"}) + "\n"
+    assert (await client.post("/api/bulk/assignees", content=body)).json()["inserted"] == 1
+    after = await refetched(client, "/api/home/my-assignees", demo_etag, owner="demo")
+    assert len(after) == len(demo) + 1
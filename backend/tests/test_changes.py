@@ -0,0 +1,155 @@
+"""The change feed: SSE and WebSocket delivery, Last-Event-ID replay and slow-subscriber resyncs."""
+import json
+from contextlib import asynccontextmanager
+
+import anyio
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """A fresh broker with a small queue (4 events) and history (3 events)."""
+    broker = main.ChangeBroker(queue_size=4, history=3)
+    monkeypatch.setattr(main, "change_broker", broker)
+    return broker
+
+
+@asynccontextmanager
+async def asgi_session(scope: dict, first: dict, parse):
+    """Run the app on ``scope`` until the block exits; yields a receiver of what ``parse`` makes of each sent message.
+
+    httpx's ASGI transport only returns once a response is complete, which
+    a change feed never is, so the app is driven directly.
+    """
+    sender, events = anyio.create_memory_object_stream(100)
+    closed = anyio.Event()
+    started = False
+
+    async def receive():
+        nonlocal started
+        if not started:
+            started = True
+            return first
+        await closed.wait()
+        return {"type": first["type"].split(".")[0] + ".disconnect"}
+
+    async def send(message):
+        for event in parse(message):
+            await sender.send(event)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(main.app, scope, receive, send)
+        try:
+            yield events
+        finally:
+            closed.set()
+            tg.cancel_scope.cancel()
+
+
+def sse_parser():
+    buffer = b""
+
+    def parse(message):
+        nonlocal buffer
+        if message["type"] != "http.response.body":
+            return []
+        buffer += message.get("body", b"")
+        *blocks, buffer = buffer.split(b"\n\n")
+        return [json.loads(line[6:]) for block in blocks for line in block.decode().split("\n") if line.startswith("data: ")]
+
+    return parse
+
+
+def ws_parse(message):
+    return [json.loads(message["text"])] if message["type"] == "websocket.send" else []
+
+
+def scope(type: str, path: str, query: str, headers=()) -> dict:
+    return {
+        "type": type, "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "server": ("test", 80), "client": ("test", 1234),
+    }
+
+
+@asynccontextmanager
+async def sse(broker, query: str, last_event_id=None):
+    """Subscribed SSE stream of the app's change feed."""
+    headers = [("Last-Event-ID", str(last_event_id))] if last_event_id is not None else []
+    subscribers = broker.subscribers
+    request = scope("http", "/api/changes/stream", query, headers)
+    async with asgi_session(request, {"type": "http.request", "body": b"", "more_body": False}, sse_parser()) as events:
+        while broker.subscribers == subscribers:
+            await anyio.sleep(0.01)
+        yield events
+
+
+async def receive(events, n: int) -> list:
+    with anyio.fail_after(5):
+        return [await events.receive() for _ in range(n)]
+
+
+async def test_sse_delivers_calc_updates(storage, client, broker):
+    async with sse(broker, "assignee_id=1") as events:
+        await client.put("/api/assignees/1/calc/income-tax", json={"data": {"salary": 100}})
+        (event,) = await receive(events, 1)
+    assert event["type"] == "calc.updated"
+    assert (event["calc_key"], event["data"], event["version"]) == ("income-tax", {"salary": 100}, 1)
+    assert event["totals"]["income_total"] == 100
+    assert broker.subscribers == 0
+
+
+async def test_sse_filters_by_topic(broker):
+    async with sse(broker, "assignee_id=1") as events:
+        broker.publish("workpaper.created", ["assignee:2"], assignee_id=2)
+        broker.publish("workpaper.created", ["assignee:1"], assignee_id=1)
+        (event,) = await receive(events, 1)
+    assert event["assignee_id"] == 1
+
+
+async def test_sse_replays_after_last_event_id(broker):
+    for n in range(3):
+        broker.publish("workpaper.created", ["assignee:1"], n=n)
+    async with sse(broker, "assignee_id=1", last_event_id=1) as events:
+        replayed = await receive(events, 2)
+    assert [(e["id"], e["n"]) for e in replayed] == [(2, 1), (3, 2)]
+
+
+async def test_replay_past_history_resyncs(broker):
+    for n in range(5):
+        broker.publish("workpaper.created", ["assignee:1"], n=n)
+    async with sse(broker, "assignee_id=1", last_event_id=1) as events:
+        (event,) = await receive(events, 1)
+    assert event == {"id": 5, "type": "resync"}
+
+
+async def test_slow_subscriber_gets_one_resync(broker):
+    sub = broker.subscribe(["assignee:1"])
+    # The fifth event does not fit: the four queued ones are replaced by a resync up to it
+    for n in range(5):
+        broker.publish("workpaper.created", ["assignee:1"], n=n)
+    assert sub.queue.qsize() == 1
+    assert sub.queue.get_nowait() == {"id": 5, "type": "resync"}
+    broker.publish("workpaper.created", ["assignee:1"], n=5)
+    assert sub.queue.get_nowait()["n"] == 5
+    assert broker.resyncs == 1
+
+
+async def test_stream_needs_a_topic(client):
+    assert (await client.get("/api/changes/stream")).status_code == 400
+
+
+async def test_websocket_delivers_events(broker):
+    request = scope("websocket", "/api/changes/ws", "client_id=1")
+    async with asgi_session(request, {"type": "websocket.connect"}, ws_parse) as events:
+        while broker.subscribers == 0:
+            await anyio.sleep(0.01)
+        broker.publish("client.assigned", ["client:1"], client_id=1, owner="demo")
+        (event,) = await receive(events, 1)
+    assert event == {"id": 1, "type": "client.assigned", "client_id": 1, "owner": "demo"}
+    assert broker.subscribers == 0
@@ -0,0 +1,220 @@
+import asyncio
+import datetime
+import email
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend import main
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+pytestmark = pytest.mark.anyio
+
+
+class Relay:
+    """SMTP handler that accepts or rejects each message, noting the outbox status it was sent from."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.reject = False
+        self.received = []
+        self.statuses = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.statuses.append(await self.outbox_statuses())
+        if self.reject:
+            return "451 4.3.0 Try again later"
+        self.received.append(envelope)
+        return "250 OK"
+
+    async def outbox_statuses(self) -> list:
+        """Read on the relay's own thread and event loop, so not through the app's storage."""
+        sql = "SELECT status FROM email_outbox ORDER BY id"
+        if self.storage.name == "postgres":
+            conn = await self.storage._asyncpg.connect(self.storage._url)
+            try:
+                return [row[0] for row in await conn.fetch(sql)]
+            finally:
+                await conn.close()
+        conn = sqlite3.connect(main.DB_PATH)
+        try:
+            return [row[0] for row in conn.execute(sql)]
+        finally:
+            conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def relay(storage, monkeypatch):
+    handler = Relay(storage)
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(controller.port))
+    monkeypatch.setenv("SMTP_TLS", "false")
+    monkeypatch.delenv("SMTP_USER", raising=False)
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+async def worker():
+    worker = main.EmailWorker()
+    yield worker
+    await worker.stop()
+
+
+async def queue(subject="Hello") -> int:
+    return await main.storage.queue_email("noreply@example.com", ["a@example.com"], subject, b"Subject: x\r\n\r\nbody\r\n")
+
+
+@pytest.fixture
+def outbox(run_sql):
+    async def status(message_id: int) -> dict:
+        (row,) = await run_sql(main.EMAIL_STATUS_SQL, message_id)
+        return dict(zip(("id", "status", "attempts", "last_error", "next_attempt_at", "created_at", "sent_at"), row))
+
+    return status
+
+
+@pytest.fixture
+def make_due(run_sql):
+    async def make_due(message_id: int) -> None:
+        await run_sql("UPDATE email_outbox SET next_attempt_at = created_at WHERE id = ?", message_id)
+
+    return make_due
+
+
+async def wait_until_sent(outbox, message_id: int) -> dict:
+    deadline = time.monotonic() + 10
+    while (row := await outbox(message_id))["status"] != "sent" and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return row
+
+
+def seconds_from_now(timestamp: str) -> float:
+    due = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return (due - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)).total_seconds()
+
+
+async def test_delivery_marks_the_message_sent(relay, worker, outbox):
+    message_id = await queue()
+    assert (await outbox(message_id))["status"] == "queued"
+    assert await worker.drain_once() == 1
+    assert relay.statuses == [["sending"]]
+    assert [e.rcpt_tos for e in relay.received] == [["a@example.com"]]
+    row = await outbox(message_id)
+    assert (row["status"], row["attempts"], row["last_error"]) == ("sent", 1, None)
+    assert row["sent_at"] is not None
+    assert await worker.drain_once() == 0
+
+
+async def test_rejections_back_off_then_fail(relay, worker, outbox, make_due, monkeypatch):
+    monkeypatch.setattr(main, "EMAIL_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(main, "EMAIL_RETRY_BASE", 60)
+    relay.reject = True
+    message_id = await queue()
+    for attempt, delay in ((1, 60), (2, 120)):
+        assert await worker.drain_once() == 0
+        row = await outbox(message_id)
+        assert (row["status"], row["attempts"]) == ("queued", attempt)
+        assert "451" in row["last_error"]
+        assert delay - 5 <= seconds_from_now(row["next_attempt_at"]) <= delay + 5
+        assert await worker.drain_once() == 0  # not due yet
+        await make_due(message_id)
+    assert await worker.drain_once() == 0
+    row = await outbox(message_id)
+    assert (row["status"], row["attempts"]) == ("failed", 3)
+    assert "451" in row["last_error"]
+    await make_due(message_id)
+    assert await worker.drain_once() == 0
+    # One delivery attempt per claim, each made while the message was claimed
+    assert relay.statuses == [["sending"]] * 3
+    assert relay.received == []
+
+
+async def test_retry_succeeds_after_a_rejection(relay, worker, outbox, make_due):
+    relay.reject = True
+    message_id = await queue()
+    await worker.drain_once()
+    relay.reject = False
+    await make_due(message_id)
+    assert await worker.drain_once() == 1
+    row = await outbox(message_id)
+    assert (row["status"], row["attempts"], row["last_error"]) == ("sent", 2, None)
+
+
+async def test_stale_claims_are_requeued_on_start(relay, worker, outbox, run_sql):
+    message_id = await queue()
+    await run_sql("UPDATE email_outbox SET status = 'sending', attempts = 1 WHERE id = ?", message_id)
+    assert await worker.drain_once() == 0
+    worker.start()
+    worker.notify()
+    assert (await wait_until_sent(outbox, message_id))["status"] == "sent"
+
+
+async def test_claims_do_not_overlap(relay, outbox, monkeypatch):
+    monkeypatch.setattr(main, "EMAIL_BATCH_SIZE", 2)
+    ids = [await queue(f"Message {n}") for n in range(6)]
+    workers = [main.EmailWorker() for _ in range(3)]
+    try:
+        assert sum(await asyncio.gather(*(w.drain_once() for w in workers))) == 6
+    finally:
+        for w in workers:
+            await w.stop()
+    assert len(relay.received) == 6
+    assert [(await outbox(i))["attempts"] for i in ids] == [1] * 6
+
+
+async def test_send_email_endpoint_queues_and_delivers(relay, client):
+    try:
+        response = await client.post(
+            "/api/tools/send-email", json={"to": ["b@example.com"], "subject": "Report", "body": "Attached."}
+        )
+        assert response.status_code == 202
+        body = response.json()
+        assert body["status"] == "queued"
+        deadline = time.monotonic() + 10
+        status = {}
+        while time.monotonic() < deadline:
+            status = (await client.get(f"/api/tools/send-email/{body['id']}")).json()
+            if status["status"] == "sent":
+                break
+            await asyncio.sleep(0.05)
+        assert status["status"] == "sent"
+        message = email.message_from_bytes(relay.received[0].content)
+        assert message["Subject"] == "Report"
+        assert message["To"] == "b@example.com"
+    finally:
+        await main.email_worker.stop()
+
+
+async def test_send_email_without_smtp_is_a_preview(db_path, client, monkeypatch):
+    monkeypatch.delenv("SMTP_HOST", raising=False)
+    response = await client.post("/api/tools/send-email", json={"to": ["b@example.com"], "subject": "S", "body": "B"})
+    assert response.json()["status"] == "preview"
+
+
+async def test_worker_uses_the_sqlite_pool_only_on_db_threads(relay, client, outbox, monkeypatch):
+    threads = []
+    acquire = main.db_pool.acquire
+    monkeypatch.setattr(main.db_pool, "acquire", lambda: threads.append(threading.current_thread().name) or acquire())
+    try:
+        response = await client.post("/api/tools/send-email", json={"to": ["b@example.com"], "subject": "S", "body": "B"})
+        assert (await wait_until_sent(outbox, response.json()["id"]))["status"] == "sent"
+    finally:
+        await main.email_worker.stop()
+    if relay.storage.name == "postgres":
+        assert threads == []  # the outbox lives in PostgreSQL
+    else:
+        # Queueing, the requeue on start, claims and status updates all went through the writer
+        assert threads and all(name.startswith("db-write") for name in threads)
@@ -0,0 +1,51 @@
+"""List endpoints give the same bytes with FAST_JSON on (plain dicts, orjson) and off (models, validated)."""
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+LISTS = [
+    ("GET", "/api/ideas", {}),
+    ("GET", "/api/ideas", {"limit": 2}),
+    ("GET", "/api/clients", {}),
+    ("GET", "/api/clients", {"limit": 3}),
+    ("GET", "/api/clients/search", {"q": "co"}),
+    ("GET", "/api/clients/1/assignees", {}),
+    ("GET", "/api/assignees/1/workpapers", {}),
+    ("GET", "/api/assignees/1/audit", {"entity": "calc/income-tax"}),
+    ("GET", "/api/home/my-assignees", {"owner": "demo"}),
+    ("POST", "/api/assignees/overview:batch", {"json": {"assignee_ids": [1, 2, 3, 999]}}),
+    ("GET", "/api/clients/1/assignees/overview", {}),
+    ("GET", "/api/home/my-assignees/overview", {"owner": "demo"}),
+]
+
+
+@pytest.fixture
+async def data(storage, client):
+    """Rows whose values could encode differently: unicode, quotes, floats and whole numbers, empty strings."""
+    await client.post("/api/ideas", json={"title": "Ünïcode \"quoted\" ✓", "description": "line\nbreak"})
+    await client.post("/api/ideas", json={"title": "Plain"})
+    imported = await client.post("/api/bulk/clients", content='{"name": "Café \\"Ω\\"", "owner": "demo"}\n')
+    assert imported.json()["inserted"] == 1
+    await client.post("/api/clients/1/assignees", json={"name": "Zoë <z@example.com>", "email": ""})
+    await client.post("/api/assignees/1/workpapers", json={"title": "W-2 \\ 1099", "notes": "€"})
+    await client.put("/api/assignees/1/calc/income-tax", json={"data": {"salary": 1234.5, "bonus": 100}})
+    await client.put("/api/assignees/1/calc/income-tax", json={"data": {"salary": 2000}})
+    await client.put("/api/assignees/1/calc/deductions", json={"data": {"retirement": 0.1}})
+
+
+@pytest.mark.parametrize("method, path, kwargs", LISTS, ids=[f"{m} {p} {k}" for m, p, k in LISTS])
+async def test_fast_json_is_byte_identical(data, client, monkeypatch, method, path, kwargs):
+    responses = {}
+    for fast in (False, True):
+        monkeypatch.setattr(main, "FAST_JSON", fast)
+        main.response_cache.clear()
+        params = {k: v for k, v in kwargs.items() if k != "json"}
+        responses[fast] = await client.request(method, path, params=params, json=kwargs.get("json"))
+    slow, fast = responses[False], responses[True]
+    assert slow.status_code == fast.status_code == 200
+    assert slow.json(), "an empty list compares nothing"
+    assert fast.content == slow.content
+    assert fast.headers["content-type"] == slow.headers["content-type"]
+    assert fast.headers.get("x-next-after-id") == slow.headers.get("x-next-after-id")
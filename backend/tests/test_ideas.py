@@ -0,0 +1,92 @@
+"""Idea scoring: the substring and Aho-Corasick matchers, and rescoring stored ideas."""
+import random
+
+import pytest
+
+from backend import main
+
+# Enough keywords for the automaton, several of them inside one another
+WEIGHTS = {
+    **main.DEFAULT_IDEA_WEIGHTS,
+    "co": 1, "cost": 3, "costly": 2, "secure": 2, "security": 5, "per": 1, "form": 1, "performance": 4,
+    "risk": 5, "risky": 2, "ok": 1, "quick": 2, "quickly": 1, "fast": 2, "cheap": 3, "scale": 2,
+}
+WORDS = [*WEIGHTS, "the", "plan", "costs", "Performances", "SECURITY", "brisk", "look", "a", "", "élan", "ﬁx"]
+
+
+def texts(n: int):
+    rnd = random.Random(7)
+    for _ in range(n):
+        words = [rnd.choice(WORDS) for _ in range(rnd.randrange(0, 40))]
+        yield rnd.choice(["", " ", "-"]).join(w.upper() if rnd.random() < 0.2 else w for w in words)
+
+
+def test_automaton_and_scans_agree():
+    pytest.importorskip("ahocorasick")
+    automaton, scans = main.IdeaScorer(WEIGHTS), main.IdeaScorer(WEIGHTS, automaton=False)
+    assert (automaton.matcher, scans.matcher) == ("aho-corasick", "substring")
+    for text in texts(2000):
+        assert automaton.score(text) == scans.score(text), text
+
+
+@pytest.mark.parametrize("automaton", [True, False])
+def test_keywords_count_once_case_insensitively(automaton):
+    if automaton:
+        pytest.importorskip("ahocorasick")
+    scorer = main.IdeaScorer(WEIGHTS, length_step=1000, automaton=automaton)
+    assert scorer.score("") == 0
+    assert scorer.score("COST cost Cost") == 3 + 1  # "cost" and the "co" inside it
+    assert scorer.score("costly") == 3 + 2 + 1
+    assert scorer.score("risky business") == 5 + 2
+
+
+def test_length_bonus_is_capped():
+    scorer = main.IdeaScorer({"x": 1}, length_step=10, length_cap=3)
+    assert [scorer.score("y" * n) for n in (9, 10, 25, 1000)] == [0, 1, 2, 3]
+
+
+def test_small_tables_keep_the_scans():
+    assert main.IdeaScorer(main.DEFAULT_IDEA_WEIGHTS).matcher == "substring"
+
+
+@pytest.fixture
+def scorer(monkeypatch):
+    """Swap in a new scoring table, as a changed IDEA_SCORE_FILE would."""
+    scorer = main.IdeaScorer({"ledger": 10}, length_step=1000)
+    monkeypatch.setattr(main, "idea_scorer", scorer)
+    return scorer
+
+
+@pytest.mark.anyio
+async def test_rescore_endpoint(storage, client, scorer, monkeypatch):
+    monkeypatch.setattr(main, "BULK_CHUNK_SIZE", 2)
+    for title, description in [("A", "a ledger"), ("B", "risk"), ("C", "Ledger risk"), ("D", "")]:
+        await storage.create_idea(title, description, 5)
+    assert (await client.get("/api/ideas/scoring")).json()["rescored_with"] is None
+
+    result = (await client.post("/api/ideas:rescore")).json()
+    assert (result["ideas"], result["changed"], result["fingerprint"]) == (4, 4, scorer.fingerprint())
+    scores = {i["title"]: i["score"] for i in (await client.get("/api/ideas")).json()}
+    assert scores == {"A": 10, "B": 0, "C": 10, "D": 0}
+    assert (await client.get("/api/ideas/scoring")).json()["rescored_with"] == scorer.fingerprint()
+
+    assert (await client.post("/api/ideas:rescore")).json()["changed"] == 0
+
+
+def test_rescore_ideas_command(db_path, scorer, monkeypatch, capsys):
+    monkeypatch.setattr(main, "storage", main.SqliteStorage())
+    main.migrate_db()
+    conn = main.get_db()
+    try:
+        conn.executemany(
+            "INSERT INTO ideas (title, description, score) VALUES (?, ?, ?)",
+            [("A", "ledger", 10), ("B", "general ledger", 0), ("C", "", 3)],
+        )
+        conn.commit()
+        assert main.main(["rescore-ideas"]) == 0
+        assert capsys.readouterr().out == "rescored 3 ideas with the substring matcher, 2 changed\n"
+        assert conn.execute("SELECT title, score FROM ideas ORDER BY id").fetchall() == [("A", 10), ("B", 10), ("C", 0)]
+        stored = conn.execute("SELECT value FROM settings WHERE key = 'idea_scorer'").fetchone()
+        assert stored == (scorer.fingerprint(),)
+    finally:
+        conn.close()
@@ -0,0 +1,203 @@
+"""Upgrading files left at every historical user_version to the current schema, and startup checks."""
+import json
+
+import pytest
+
+from backend import main
+
+# The tables as the first release created them, before MIGRATIONS existed;
+# frozen here because create_base_schema() has moved on since.
+BASELINE_SCHEMA = """
+CREATE TABLE ideas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT "",
+    score INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE clients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    owner TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE TABLE tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'awaiting',
+    due_date TEXT,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+CREATE TABLE assignees (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE CASCADE
+);
+CREATE TABLE workpapers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assignee_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'draft',
+    notes TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
+);
+CREATE TABLE calculator_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assignee_id INTEGER NOT NULL,
+    calc_key TEXT NOT NULL,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+    UNIQUE(assignee_id, calc_key),
+    FOREIGN KEY(assignee_id) REFERENCES assignees(id) ON DELETE CASCADE
+);
+"""
+
+CALCULATOR_DATA = [
+    (1, "income-tax", {"salary": 50000, "bonus": 2500}),
+    (1, "deductions", {"retirement": 5000}),
+    (1, "notes", {"text": "call back"}),
+    (2, "income-tax", {"salary": 80000}),
+]
+
+
+def historical_db(version: int, monkeypatch) -> None:
+    """A DB_PATH file as the release that stopped at ``version`` left it, with some data."""
+    conn = main.get_db()
+    try:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.execute("INSERT INTO clients (name, owner) VALUES ('Acme', 'demo')")
+        conn.executemany("INSERT INTO assignees (client_id, name) VALUES (1, ?)", [("Ann",), ("Bob",)])
+        conn.execute("INSERT INTO tasks (client_id, title) VALUES (1, 'Collect W-2')")
+        conn.execute("INSERT INTO workpapers (assignee_id, title, status) VALUES (1, 'W-2', 'review')")
+        conn.executemany(
+            "INSERT INTO calculator_data (assignee_id, calc_key, data) VALUES (?, ?, ?)",
+            [(aid, key, json.dumps(data)) for aid, key, data in CALCULATOR_DATA],
+        )
+        conn.commit()
+        with monkeypatch.context() as m:
+            m.setattr(main, "MIGRATIONS", [step for step in main.MIGRATIONS if step[0] <= version])
+            main.run_migrations(conn)
+        assert main.schema_version(conn) == version
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("version", range(main.SCHEMA_VERSION))
+def test_upgrade_to_head(version, db_path, monkeypatch):
+    historical_db(version, monkeypatch)
+    main.migrate_db()
+
+    conn = main.get_db()
+    try:
+        assert main.schema_version(conn) == main.SCHEMA_VERSION
+        assert conn.execute("SELECT salary, bonus, version FROM calc_income_tax WHERE assignee_id = 1").fetchone() == (
+            50000,
+            2500,
+            1,
+        )
+        assert conn.execute("SELECT calc_key FROM calculator_data").fetchall() == [("notes",)]
+        summary = conn.execute(
+            "SELECT assignee_id, taxable_income, estimated_tax FROM tax_summary ORDER BY assignee_id"
+        ).fetchall()
+        assert summary == [
+            (1, 47500, main.tax_totals(52500, 5000)["estimated_tax"]),
+            (2, 80000, main.tax_totals(80000, 0)["estimated_tax"]),
+        ]
+        audited = conn.execute("SELECT entity, version FROM audit_log WHERE assignee_id = 1 ORDER BY entity").fetchall()
+        assert audited == [("calc/deductions", 1), ("calc/income-tax", 1), ("calc/notes", 1), ("workpaper/1", 1)]
+        assert main.check_stat_counters(conn, repair=False) == []
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def migrations(monkeypatch):
+    """Calls to migrate_db from here on, after migrating DB_PATH to HEAD."""
+    main.migrate_db()
+    calls = []
+    migrate_db = main.migrate_db
+    monkeypatch.setattr(main, "migrate_db", lambda seed=False: calls.append(seed) or migrate_db(seed))
+    return calls
+
+
+def test_startup_skips_migrate_when_current(db_path, migrations):
+    main.open_db(False)
+    assert migrations == []
+
+
+def test_startup_rebuilds_stale_tax_summary(db_path, migrations):
+    conn = main.get_db()
+    try:
+        conn.execute("UPDATE settings SET value = 'old' WHERE key = 'tax_schedule'")
+        conn.commit()
+        main.open_db(False)
+        assert migrations == [False]
+        assert main.tax_summary_current(conn)
+    finally:
+        conn.close()
+
+
+def test_startup_refuses_schema_behind_without_auto_migrate(db_path, monkeypatch):
+    historical_db(main.SCHEMA_VERSION - 1, monkeypatch)
+    monkeypatch.setattr(main, "AUTO_MIGRATE", False)
+    with pytest.raises(RuntimeError, match="migrate"):
+        main.open_db(False)
+    monkeypatch.setattr(main, "AUTO_MIGRATE", True)
+    main.open_db(False)
+    conn = main.get_db()
+    try:
+        assert main.schema_version(conn) == main.SCHEMA_VERSION
+    finally:
+        conn.close()
+
+
+def test_upgrade_keeps_audit_log_of_deleted_assignees(db_path, monkeypatch):
+    historical_db(9, monkeypatch)
+    conn = main.get_db()
+    try:
+        # audit_log as version 9 first created it, cascading from assignees
+        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'audit%'").fetchall()
+        for (name,) in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.executescript(
+            """
+            CREATE TABLE audit_log_v9 (
+                assignee_id INTEGER NOT NULL REFERENCES assignees(id) ON DELETE CASCADE,
+                entity TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                changed_at TEXT NOT NULL,
+                snapshot INTEGER NOT NULL DEFAULT 0,
+                delta TEXT NOT NULL,
+                PRIMARY KEY (assignee_id, entity, version)
+            ) WITHOUT ROWID;
+            INSERT INTO audit_log_v9 SELECT * FROM audit_log;
+            DROP TABLE audit_log;
+            ALTER TABLE audit_log_v9 RENAME TO audit_log;
+            """
+        )
+    finally:
+        conn.close()
+    main.migrate_db()
+
+    conn = main.get_db()
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")
+        assert conn.execute("SELECT * FROM pragma_foreign_key_list('audit_log')").fetchall() == []
+        conn.execute("UPDATE calc_income_tax SET version = version + 1 WHERE assignee_id = 1")
+        conn.execute("DELETE FROM assignees WHERE id = 1")
+        conn.commit()
+        audited = conn.execute("SELECT entity, version FROM audit_log WHERE assignee_id = 1 ORDER BY entity, version").fetchall()
+        assert audited == [
+            ("calc/deductions", 1),
+            ("calc/income-tax", 1),
+            ("calc/income-tax", 2),
+            ("calc/notes", 1),
+            ("workpaper/1", 1),
+        ]
+    finally:
+        conn.close()
@@ -0,0 +1,123 @@
+import re
+import sqlite3
+
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+def normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+@pytest.fixture
+def plan_conn(db_path):
+    main.migrate_db()
+    conn = main.get_db()
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("name, sql, params, full_scan_ok", main.QUERY_PLAN_CHECKS, ids=[check[0] for check in main.QUERY_PLAN_CHECKS])
+def test_query_plan(plan_conn, name, sql, params, full_scan_ok):
+    scans = main.unindexed_scans(plan_conn, sql, params)
+    assert full_scan_ok or not scans, f"{name}: {scans}"
+
+
+def query_constants():
+    """Module-level SQL the handlers run: complete *_SQL statements and the list queries."""
+    for name, value in vars(main).items():
+        if name.startswith("PG_"):
+            continue
+        if isinstance(value, main.ListQuery):
+            yield name, value
+        elif name.endswith("_SQL") and isinstance(value, str) and re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", value):
+            yield name, value
+
+
+def test_every_query_constant_is_checked():
+    checked = {normalize(sql) for _, sql, _, _ in main.QUERY_PLAN_CHECKS}
+    missing = []
+    for name, value in query_constants():
+        if isinstance(value, main.ListQuery):
+            sql, _ = main.page_query(main.Page(None, None, "json"), value, [None] * len(value.where))
+        else:
+            sql = value
+        if normalize(sql) not in checked:
+            missing.append(name)
+    assert not missing, f"add to QUERY_PLAN_CHECKS: {missing}"
+
+
+async def exercise(client):
+    """Call the read and write endpoints once each, as the frontend does."""
+    calls = [
+        ("GET", "/api/ideas", None),
+        ("GET", "/api/ideas?limit=1&after_id=100", None),
+        ("POST", "/api/ideas", {"title": "Plan", "description": "tax planning"}),
+        ("DELETE", "/api/ideas/1", None),
+        ("GET", "/api/home/overview", None),
+        ("GET", "/api/home/stats?client_id=1", None),
+        ("GET", "/api/clients/search?q=co", None),
+        ("GET", "/api/clients/search?q=group&limit=1", None),
+        ("GET", "/api/clients", None),
+        ("GET", "/api/clients?limit=1&after_id=1", None),
+        ("POST", "/api/clients/1/assign", {"owner": "demo"}),
+        ("GET", "/api/home/my-assignees", None),
+        ("GET", "/api/clients/1/assignees?limit=1&after_id=1", None),
+        ("POST", "/api/clients/1/assignees", {"name": "Plan Person"}),
+        ("POST", "/api/assignees/1/workpapers", {"title": "W-2"}),
+        ("GET", "/api/assignees/1/workpapers?limit=1&after_id=100", None),
+        ("GET", "/api/assignees/1", None),
+        ("PUT", "/api/assignees/1/calc/income-tax", {"data": {"salary": 50000}}),
+        ("PATCH", "/api/assignees/1/calc/deductions", {"data": {"charity": 100}}),
+        ("PATCH", "/api/assignees/1/calc/notes", {"data": {"text": "hi"}}),
+        ("POST", "/api/assignees/1/calc:batch", {"calcs": {"income-tax": {"data": {"bonus": 1}, "version": 1}}, "patch": True}),
+        ("GET", "/api/assignees/1/calc/income-tax", None),
+        ("GET", "/api/assignees/1/calc/notes", None),
+        ("GET", "/api/assignees/1/overview", None),
+        ("GET", "/api/assignees/1/overview?include_inputs=true", None),
+        ("GET", "/api/assignees/1/bundle", None),
+        ("POST", "/api/assignees/overview:batch", {"assignee_ids": [1, 2]}),
+        ("GET", "/api/clients/1/assignees/overview?limit=1&after_id=0", None),
+        ("GET", "/api/home/my-assignees/overview", None),
+        ("GET", "/api/clients/1/tax-summary", None),
+        ("GET", "/api/home/tax-summary", None),
+        ("GET", "/api/assignees/1/audit?entity=calc/income-tax&limit=1&after_id=5", None),
+        ("GET", "/api/assignees/1/audit/state?entity=calc/income-tax&as_of=2999-01-01", None),
+        ("POST", "/api/audit:compact?keep_versions=1&keep_days=0", None),
+        ("POST", "/api/tax/what-if", {"client_id": 1, "scenarios": [{"name": "base"}]}),
+        ("POST", "/api/tax/what-if", {"owner": "demo", "scenarios": [{"name": "base"}]}),
+    ]
+    for method, url, body in calls:
+        response = await client.request(method, url, json=body)
+        assert response.status_code < 400, (method, url, response.text)
+
+
+async def test_handler_queries_use_indexes(sqlite_storage, client, monkeypatch):
+    """EXPLAIN every statement the handlers actually ran, not a copy of it."""
+    executed = set()
+    record = main.record_query
+
+    def trace(sql, seconds):
+        executed.add(sql)
+        record(sql, seconds)
+
+    monkeypatch.setattr(main, "record_query", trace)
+    await exercise(client)
+    full_scans_ok = {normalize(sql) for _, sql, _, ok in main.QUERY_PLAN_CHECKS if ok}
+    failures = []
+    conn = main.get_db()
+    try:
+        for sql in sorted(executed):
+            if not re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", sql) or normalize(sql) in full_scans_ok:
+                continue
+            try:
+                scans = main.unindexed_scans(conn, sql, [None] * sql.count("?"))
+            except sqlite3.ProgrammingError:  # named or numbered parameters
+                continue
+            failures += [f"{normalize(sql)[:120]}: {detail}" for detail in scans]
+    finally:
+        conn.close()
+    assert executed
+    assert not failures
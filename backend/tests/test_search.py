@@ -0,0 +1,47 @@
+"""Client search on both backends: prefix ranking, case-variant names and cursor paging."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def clients(storage, run_sql):
+    for name in ("Acme", "acme", "Big Acme Ltd", "ACME corp", "Ziggy", "Zed Holdings", "Bizarre Zoo"):
+        await run_sql("INSERT INTO clients (name, owner) VALUES (?, '')", name)
+
+
+async def search(client, q, limit=20):
+    """Every page of ``q``'s results, following X-Next-Cursor; returns the names and the page count."""
+    names, pages, params = [], 0, {"q": q, "limit": limit}
+    while True:
+        response = await client.get("/api/clients/search", params=params)
+        assert response.status_code == 200
+        names += [c["name"] for c in response.json()]
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return names, pages
+        params["cursor"] = cursor
+
+
+async def test_prefix_matches_rank_first(clients, client):
+    names, _ = await search(client, "acme")
+    assert names == ["Acme", "acme", "ACME corp", "Big Acme Ltd"]
+
+
+@pytest.mark.parametrize("q", ["Z", "z"])
+async def test_uppercase_query_keeps_prefix_tier(clients, client, q):
+    names, _ = await search(client, q)
+    assert names == ["Zed Holdings", "Ziggy", "Bizarre Zoo"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3])
+async def test_cursor_paging_returns_every_case_variant_once(clients, client, limit):
+    names, pages = await search(client, "ACME", limit=limit)
+    assert names == ["Acme", "acme", "ACME corp", "Big Acme Ltd"]
+    assert pages >= 4 // limit
+
+
+async def test_invalid_cursor(clients, client):
+    response = await client.get("/api/clients/search", params={"q": "acme", "cursor": "bm90IGpzb24="})
+    assert response.status_code == 400
@@ -0,0 +1,164 @@
+"""Behaviour both storage backends must share: merge patches, triggers and schema."""
+import sqlite3
+
+import pytest
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+
+async def put(client, calc_key, data, **headers):
+    return await client.put(f"/api/assignees/1/calc/{calc_key}", json={"data": data}, headers=headers)
+
+
+async def patch(client, calc_key, data, **headers):
+    return await client.patch(f"/api/assignees/1/calc/{calc_key}", json={"data": data}, headers=headers)
+
+
+async def get(client, calc_key):
+    return (await client.get(f"/api/assignees/1/calc/{calc_key}")).json()
+
+
+async def test_free_form_merge_patch(storage, client):
+    await put(client, "notes", {"a": 1, "b": {"x": 1, "y": 2}, "c": 3})
+    response = await patch(client, "notes", {"b": {"y": None, "z": 3}, "c": None, "d": [1, 2]})
+    assert response.json()["version"] == 2
+    assert await get(client, "notes") == {"data": {"a": 1, "b": {"x": 1, "z": 3}, "d": [1, 2]}, "version": 2}
+
+
+async def test_merge_patch_creates_missing_calculator(storage, client):
+    await patch(client, "notes", {"a": {"b": None, "c": 1}})
+    assert await get(client, "notes") == {"data": {"a": {"c": 1}}, "version": 1}
+
+
+async def test_typed_merge_patch(storage, client):
+    await put(client, "income-tax", {"salary": 100, "bonus": 5})
+    await patch(client, "income-tax", {"bonus": None, "other": 7})
+    assert await get(client, "income-tax") == {"data": {"salary": 100, "other": 7}, "version": 2}
+    overview = (await client.get("/api/assignees/1/overview")).json()
+    assert overview["income_total"] == 107
+
+
+async def test_typed_fields_reject_non_numbers(storage, client):
+    assert (await patch(client, "income-tax", {"salary": "lots"})).status_code == 422
+
+
+async def test_if_match_conflict(storage, client):
+    await put(client, "deductions", {"charity": 10})
+    response = await patch(client, "deductions", {"charity": 20}, **{"If-Match": '"0"'})
+    assert response.status_code == 412
+    assert response.headers["etag"] == '"1"'
+    assert (await patch(client, "deductions", {"charity": 20}, **{"If-Match": '"1"'})).status_code == 200
+
+
+async def test_calc_writes_are_audited(storage, client):
+    await put(client, "income-tax", {"salary": 100})
+    await patch(client, "income-tax", {"salary": 150})
+    entries = (await client.get("/api/assignees/1/audit", params={"entity": "calc/income-tax"})).json()
+    assert [(e["version"], e["snapshot"], e["changes"]) for e in entries] == [
+        (2, False, {"salary": 150}),
+        (1, True, {"salary": 100}),
+    ]
+
+
+async def test_unchanged_saves_are_audited(storage, client):
+    await put(client, "income-tax", {"salary": 100})
+    assert (await patch(client, "income-tax", {})).json()["version"] == 2
+    assert (await put(client, "income-tax", {"salary": 100})).json()["version"] == 3
+    await put(client, "notes", {"a": 1})
+    assert (await patch(client, "notes", {})).json()["version"] == 2
+    for entity, versions in (("calc/income-tax", [3, 2, 1]), ("calc/notes", [2, 1])):
+        entries = (await client.get("/api/assignees/1/audit", params={"entity": entity})).json()
+        assert [e["version"] for e in entries] == versions
+        assert all(e["changes"] == {} for e in entries[:-1])
+
+
+async def test_audit_log_outlives_assignee(storage, client, run_sql):
+    await put(client, "income-tax", {"salary": 100})
+    await patch(client, "income-tax", {"salary": 150})
+    await run_sql("DELETE FROM assignees WHERE id = ?", 1)
+    rows = await run_sql("SELECT version FROM audit_log WHERE assignee_id = ? AND entity = 'calc/income-tax'", 1)
+    assert sorted(rows) == [(1,), (2,)]
+
+
+async def test_workpaper_updates_are_audited(storage, client, run_sql):
+    workpaper = (await client.post("/api/assignees/1/workpapers", json={"title": "W-2"})).json()
+    await run_sql("UPDATE workpapers SET status = 'review' WHERE id = ?", workpaper["id"])
+    await run_sql("UPDATE workpapers SET status = 'review' WHERE id = ?", workpaper["id"])
+    entries = (await client.get("/api/assignees/1/audit", params={"entity": f"workpaper/{workpaper['id']}"})).json()
+    assert [(e["version"], e["changes"]) for e in entries] == [
+        (2, {"status": "review"}),
+        (1, {"title": "W-2", "status": "draft", "notes": ""}),
+    ]
+
+
+async def stats(client, **params):
+    return (await client.get("/api/home/stats", params=params)).json()
+
+
+async def test_stat_counter_triggers(storage, client, run_sql):
+    before = await stats(client, client_id=1)
+    assignee = (await client.post("/api/clients/1/assignees", json={"name": "Counted"})).json()
+    workpaper = (await client.post(f"/api/assignees/{assignee['id']}/workpapers", json={"title": "W"})).json()
+    await run_sql("INSERT INTO tasks (client_id, title, status) VALUES (?, ?, ?)", 1, "Call", "awaiting")
+    after = await stats(client, client_id=1)
+    for scope in ("all", "owner", "client"):
+        assert after[scope]["assignees"] == before[scope]["assignees"] + 1
+        assert after[scope]["workpapers"]["draft"] == before[scope]["workpapers"]["draft"] + 1
+        assert after[scope]["tasks"]["awaiting"] == before[scope]["tasks"]["awaiting"] + 1
+
+    await run_sql("UPDATE workpapers SET status = 'final' WHERE id = ?", workpaper["id"])
+    moved = await stats(client, client_id=1)
+    assert moved["client"]["workpapers"]["draft"] == before["client"]["workpapers"]["draft"]
+    assert moved["client"]["workpapers"]["final"] == before["client"]["workpapers"]["final"] + 1
+
+    # Deleting the assignee takes its workpapers (and their counts) with it
+    await run_sql("DELETE FROM assignees WHERE id = ?", assignee["id"])
+    await run_sql("DELETE FROM tasks WHERE title = ?", "Call")
+    assert await stats(client, client_id=1) == before
+    assert await storage.check_stat_counters(repair=False) == []
+
+
+async def test_client_reassignment_moves_owner_counts(storage, client):
+    before = await stats(client, owner="demo")
+    await client.post("/api/clients/1/assign", json={"owner": "someone"})
+    after = await stats(client, owner="demo")
+    assert after["owner"]["assignees"] == before["owner"]["assignees"] - 1
+    assert (await stats(client, owner="someone"))["owner"]["assignees"] == 1
+    assert await storage.check_stat_counters(repair=False) == []
+
+
+async def test_tax_summary_follows_deletes(storage, client, run_sql):
+    await put(client, "income-tax", {"salary": 1000})
+    assert (await client.get("/api/clients/1/tax-summary")).json()["income_total"] == 1000
+    await run_sql("DELETE FROM assignees WHERE id = ?", 1)
+    assert (await client.get("/api/clients/1/tax-summary")).json()["assignees"] == 0
+
+
+def sqlite_schema(path) -> dict:
+    """{table: {column, ...}} of the SQLite file, without FTS and SQLite-internal tables."""
+    conn = sqlite3.connect(path)
+    try:
+        tables = [
+            name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            if not name.startswith(("sqlite_", "clients_fts"))
+        ]
+        return {t: {row[1] for row in conn.execute(f"PRAGMA table_info({t})")} for t in tables}
+    finally:
+        conn.close()
+
+
+async def test_postgres_schema_matches_sqlite(storage, db_path):
+    """PG_SCHEMA repeats the SQLite DDL by hand; the same tables must have the same columns."""
+    if storage.name != "postgres":
+        pytest.skip("compares the PostgreSQL schema")
+    async with storage._pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+        )
+    postgres = {}
+    for table, column in rows:
+        postgres.setdefault(table, set()).add(column)
+    main.migrate_db()
+    assert postgres == sqlite_schema(db_path)
@@ -0,0 +1,67 @@
+"""Streamed responses hold connections from their own pool, so open streams never starve reads and writes."""
+import pytest
+from fastapi import Response
+
+from backend import main
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    """Replace ``stream_pool`` with one of ``size`` connections that gives up after 0.2s."""
+    pools = []
+
+    def make(size: int) -> main.ConnectionPool:
+        pool = main.ConnectionPool(main.get_db, size, 0.2)
+        monkeypatch.setattr(main, "stream_pool", pool)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+async def open_stream() -> Response:
+    """An NDJSON client listing whose first chunk was produced and whose body is not read yet."""
+    return await main.storage.list_clients(Response(), main.Page(None, None, "ndjson"))
+
+
+async def read(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+async def test_open_streams_leave_the_pool_to_reads_and_writes(sqlite_storage, client, streams):
+    pool = streams(main.DB_POOL_SIZE + 2)
+    held = [await open_stream() for _ in range(main.DB_POOL_SIZE + 2)]
+    assert pool.stats()["in_use"] == main.DB_POOL_SIZE + 2
+    assert main.db_pool.stats()["in_use"] == 0
+
+    assert (await client.post("/api/ideas", json={"title": "While streaming"})).status_code == 201
+    assert (await client.get("/api/clients", params={"limit": 2})).status_code == 200
+
+    bodies = [await read(response) for response in held]
+    assert {body.count(b"\n") for body in bodies} == {len(main.SAMPLE_CLIENTS)}
+    assert pool.stats()["in_use"] == 0
+
+
+async def test_stream_without_a_connection_is_a_503(sqlite_storage, client, streams):
+    pool = streams(1)
+    held = await open_stream()
+    response = await client.get("/api/clients", params={"format": "ndjson"})
+    assert response.status_code == 503
+    await read(held)
+    response = await client.get("/api/clients", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == len(main.SAMPLE_CLIENTS)
+    assert pool.stats()["in_use"] == 0
+
+
+async def test_bulk_export_streams_from_the_stream_pool(sqlite_storage, client, streams):
+    pool = streams(1)
+    held = await open_stream()
+    assert (await client.get("/api/bulk/clients")).status_code == 503
+    await read(held)
+    assert len((await client.get("/api/bulk/clients")).text.splitlines()) == len(main.SAMPLE_CLIENTS)
+    assert pool.stats()["acquired_total"] == 2
@@ -0,0 +1,87 @@
+import json
+import random
+
+import pytest
+
+from backend import tax
+
+FEDERAL_2025 = tax.DEFAULT_TAX_BRACKETS["us-federal"]["2025"]
+
+
+@pytest.fixture
+def schedule():
+    return tax.TaxSchedule("us-federal", 2025, FEDERAL_2025)
+
+
+@pytest.mark.parametrize("taxable, expected", [
+    (0, 0.0),
+    (-500, 0.0),
+    (0.01, 0.0),
+    (100, 10.0),
+    (11925, 1192.5),  # top of the first bracket
+    (11926, 1192.62),  # first dollar taxed at 12%
+    (48475, 1192.5 + 36550 * 0.12),
+    (48476, 1192.5 + 36550 * 0.12 + 0.22),
+    (626350, 188769.75),
+    (1_000_000, 188769.75 + 373650 * 0.37),
+])
+def test_bracket_edges(schedule, taxable, expected):
+    assert schedule.tax(taxable) == pytest.approx(round(expected, 2), abs=0.005)
+
+
+def test_brackets_are_sorted_and_must_start_at_zero():
+    shuffled = tax.TaxSchedule("x", 2025, [[1000, 0.2], [0, 0.1]])
+    assert shuffled.thresholds == [0, 1000]
+    assert shuffled.tax(2000) == 300.0
+    with pytest.raises(ValueError):
+        tax.TaxSchedule("x", 2025, [[100, 0.1]])
+    with pytest.raises(ValueError):
+        tax.TaxSchedule("x", 2025, [])
+
+
+@pytest.mark.parametrize("income, deductions, taxable", [(50000, 10000, 40000), (1000, 5000, 0), (0, 0, 0)])
+def test_totals_never_tax_negative_income(schedule, income, deductions, taxable):
+    totals = tax.tax_totals(income, deductions, schedule)
+    assert totals["taxable_income"] == taxable
+    assert totals["estimated_tax"] == schedule.tax(taxable)
+    assert totals["estimated_tax"] >= 0
+
+
+def test_array_matches_scalar_to_the_cent(schedule):
+    np = pytest.importorskip("numpy")
+    rng = random.Random(7)
+    values = [-100.0, 0.0] + schedule.thresholds + [t + 0.005 for t in schedule.thresholds]
+    values += [round(rng.uniform(0, 2_000_000), 2) for _ in range(10_000)]
+    assert schedule.tax_array(np.array(values)).tolist() == [schedule.tax(v) for v in values]
+
+
+def portfolio_rows(n, seed=11):
+    rng = random.Random(seed)
+    return [(round(rng.lognormvariate(11, 0.8), 2), round(rng.uniform(0, 30000), 2), 0.0) for _ in range(n)]
+
+
+@pytest.mark.parametrize("income_factor, extra_deductions", [(1.0, 0.0), (1.05, 0.0), (0.5, 20000.0), (2.0, -1000.0)])
+def test_numpy_and_python_portfolio_totals_agree(schedule, income_factor, extra_deductions):
+    pytest.importorskip("numpy")
+    rows = portfolio_rows(5000)
+    vectorized = tax.Portfolio(rows, vectorized=True).totals(schedule, income_factor, extra_deductions)
+    looped = tax.Portfolio(rows, vectorized=False).totals(schedule, income_factor, extra_deductions)
+    # Per-row taxes are equal (see above); the sums only differ by NumPy's summation order
+    assert vectorized == pytest.approx(looped, rel=1e-12, abs=0.005)
+
+
+def test_portfolio_current_tax_and_empty(schedule):
+    rows = [(100.0, 0.0, 10.0), (200.0, 0.0, 20.0)]
+    for vectorized in (False, None):
+        portfolio = tax.Portfolio(rows, vectorized=vectorized)
+        assert (portfolio.size, portfolio.current_tax) == (2, 30.0)
+        assert tax.Portfolio([], vectorized=vectorized).totals(schedule) == [0, 0, 0, 0]
+
+
+def test_load_tax_schedules(tmp_path):
+    assert set(tax.load_tax_schedules()) == {("us-federal", 2024), ("us-federal", 2025), ("flat", 2024), ("flat", 2025)}
+    path = tmp_path / "brackets.json"
+    path.write_text(json.dumps({"xy": {"2030": [[0, 0.1], [100, 0.5]]}}))
+    schedules = tax.load_tax_schedules(str(path))
+    assert list(schedules) == [("xy", 2030)]
+    assert schedules["xy", 2030].tax(200) == 60.0
@@ -0,0 +1,83 @@
+import base64
+import io
+import zipfile
+
+import pytest
+
+from backend import main
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(not main.REPORTLAB_AVAILABLE, reason="reportlab is not installed"),
+]
+
+FORM = {"title": "Form", "fields": {"Name": "Jane Doe"}}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pdf_workers():
+    yield
+    if main._pdf_executor is not None:
+        main._pdf_executor.shutdown()
+        main._pdf_executor = None
+
+
+async def test_pdf_fill_defaults_to_pdf(client):
+    response = await client.post("/api/tools/pdf-fill", json=FORM)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-disposition"] == 'attachment; filename="generated_form.pdf"'
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.content.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("params, headers", [
+    ({"format": "json"}, {"Accept": "application/pdf"}),
+    ({}, {"Accept": "application/json"}),
+    ({}, {"Accept": "application/pdf;q=0.5, application/json"}),
+])
+async def test_pdf_fill_json_is_opt_in(client, params, headers):
+    response = await client.post("/api/tools/pdf-fill", json=FORM, params=params, headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert body["filename"] == "generated_form.pdf"
+    assert base64.b64decode(body["content_b64"]).startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("params, headers", [
+    ({"format": "pdf"}, {"Accept": "application/json"}),
+    ({}, {"Accept": "*/*"}),
+    ({}, {"Accept": "application/json;q=0.5, application/pdf"}),
+])
+async def test_pdf_fill_pdf_otherwise(client, params, headers):
+    response = await client.post("/api/tools/pdf-fill", json=FORM, params=params, headers=headers)
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+
+
+async def test_pdf_batch_streams_stored_zip(client, monkeypatch):
+    # One render process: the window of in-flight renders (two) is smaller than the batch
+    monkeypatch.setattr(main, "PDF_WORKERS", 1)
+    forms = [{"title": f"Form {i}", "fields": {"Name": f"Person {i}"}} for i in range(5)]
+    response = await client.post("/api/tools/pdf-fill/batch", json={"forms": forms})
+    assert response.headers["content-type"] == "application/zip"
+    assert response.headers["content-disposition"] == 'attachment; filename="forms.zip"'
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        entries = zf.infolist()
+        assert [e.filename for e in entries] == [f"form_{i:04d}.pdf" for i in range(1, 6)]
+        assert {e.compress_type for e in entries} == {zipfile.ZIP_STORED}
+        assert all(zf.read(e).startswith(b"%PDF") for e in entries)
+
+
+async def test_pdf_batch_merged(client):
+    response = await client.post("/api/tools/pdf-fill/batch", json={"forms": [FORM, FORM], "output": "pdf"})
+    assert response.headers["content-type"] == "application/pdf"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.content.startswith(b"%PDF")
+
+
+async def test_content_disposition_is_exposed_cross_origin(client):
+    response = await client.post(
+        "/api/tools/pdf-fill", json=FORM, params={"format": "pdf"}, headers={"Origin": "http://localhost:3000"}
+    )
+    assert "content-disposition" in response.headers["access-control-expose-headers"].lower()
@@ -0,0 +1,134 @@
+"""The worker bus between two workers sharing one path: delivery, truncation resets and cache invalidation."""
+import itertools
+
+import pytest
+
+from backend import main
+
+PIDS = itertools.count(1)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Make WorkerBus instances on one path, each posing as its own worker process."""
+    buses = []
+
+    def make(max_bytes: int = 1 << 20) -> main.WorkerBus:
+        bus = main.WorkerBus(str(tmp_path / "bus"), max_bytes)
+        bus._open()
+        bus._pid = next(PIDS)  # all run in this process; tell their messages apart
+        buses.append(bus)
+        return bus
+
+    yield make
+    for bus in buses:
+        bus.close()
+
+
+def follow(bus: main.WorkerBus) -> list:
+    """What ``bus`` hands its handlers, as (message, local) pairs."""
+    received = []
+    bus.add_handler(lambda message, local: received.append((message, local)))
+    return received
+
+
+def test_publish_reaches_every_worker(workers):
+    a, b = workers(), workers()
+    from_a, from_b = follow(a), follow(b)
+    a.sync()
+    b.sync()
+    assert [m for m, _ in from_a] == [m for m, _ in from_b] == [{"reset": True, "seq": 0}]
+    from_a.clear(), from_b.clear()
+
+    assert a.publish({"cache": ["clients"]}) == 1
+    assert b.publish({"cache": ["owner:demo"]}) == 2
+    a.sync()
+    b.sync()
+    assert [(m["seq"], m["cache"], local) for m, local in from_a] == [(1, ["clients"], True), (2, ["owner:demo"], False)]
+    assert [(m["seq"], m["cache"], local) for m, local in from_b] == [(1, ["clients"], False), (2, ["owner:demo"], True)]
+
+    from_a.clear()
+    a.sync()
+    assert from_a == []
+    assert a.stats() == {"seq": 2, "published_total": 1, "received_total": 2, "resets_total": 0}
+
+
+def test_late_joiner_starts_with_a_reset(workers):
+    a = workers()
+    a.publish({"cache": ["clients"]})
+    b = workers()
+    received = follow(b)
+    b.sync()
+    assert [m for m, _ in received] == [{"reset": True, "seq": 1}]
+    assert b.stats()["resets_total"] == 0
+
+
+def test_truncation_resets_workers_that_fell_behind(workers, tmp_path):
+    a, behind, current = workers(4096), workers(4096), workers(4096)
+    for bus in (a, behind, current):
+        bus.sync()
+    received, kept_up = follow(behind), follow(current)
+
+    padding = "x" * 500
+    log = tmp_path / "bus.log"
+    while log.stat().st_size <= 4096:
+        seq = a.publish({"cache": [padding]})
+        current.sync()
+    # The next publish finds the log too long and truncates it first
+    assert a.publish({"cache": ["clients"]}) == seq + 1
+    assert len(log.read_bytes().splitlines()) == 1
+
+    behind.sync()
+    assert [m for m, _ in received] == [{"reset": True, "seq": seq}, {"cache": ["clients"], "seq": seq + 1, "pid": a._pid}]
+    assert behind.stats()["resets_total"] == 1
+    current.sync()
+    assert [m["seq"] for m, _ in kept_up] == list(range(1, seq + 2))
+    assert current.stats()["resets_total"] == 0
+
+
+def test_remote_invalidation_drops_cache_entries(workers):
+    bus_a, bus_b = workers(), workers()
+    a, b = main.ResponseCache(10, 60, bus_a), main.ResponseCache(10, 60, bus_b)
+    for bus in (bus_a, bus_b):
+        bus.sync()
+    for cache in (a, b):
+        cache.put("clients", b"[]", {"clients"}, cache.generation)
+        cache.put("mine", b"[]", {"owner:demo"}, cache.generation)
+
+    a.invalidate("clients")
+    assert a.get("clients") is None
+    assert b.get("clients") is not None
+    bus_b.sync()
+    assert b.get("clients") is None
+    assert b.get("mine") is not None
+    # Its own invalidation coming back over the bus drops nothing more
+    bus_a.sync()
+    assert a.get("mine") is not None
+
+    b.clear()
+    bus_a.sync()
+    assert a.get("mine") is None
+
+
+@pytest.mark.anyio
+async def test_cached_json_syncs_before_serving(sqlite_storage, client, workers, monkeypatch):
+    """A write another worker finished is never served stale from this worker's cache."""
+    here, there = workers(), workers()
+    monkeypatch.setattr(main, "worker_bus", here)
+    monkeypatch.setattr(main, "response_cache", main.ResponseCache(10, 60, here))
+    other_cache = main.ResponseCache(10, 60, there)
+
+    first = await client.get("/api/clients")
+    assert (await client.get("/api/clients")).content == first.content
+    assert (main.response_cache.misses, main.response_cache.hits) == (1, 1)
+
+    def add_client(conn):
+        conn.execute("INSERT INTO clients (name, owner) VALUES ('Elsewhere', 'demo')")
+        conn.commit()
+
+    await main.db.write(add_client)
+    other_cache.invalidate("clients")
+    names = [c["name"] for c in (await client.get("/api/clients")).json()]
+    assert "Elsewhere" in names
+    assert len(names) == len(first.json()) + 1
+    assert main.response_cache.misses == 2
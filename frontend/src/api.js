@@ -3,3 +3,31 @@
 // In production (Docker), frontend and backend share the same origin
 export const API_BASE = process.env.REACT_APP_API_BASE || '/api';
 
+
+// Subscribe to the server's change feed (Server-Sent Events) for an assignee,
+// client and/or owner. `onEvent` gets each parsed event; a `resync` event means
+// events were missed and the caller should re-fetch. Returns an unsubscribe function.
+export function subscribeChanges(params, onEvent) {
+  const qs = new URLSearchParams(params).toString();
+  const source = new EventSource(`${API_BASE}/changes/stream?${qs}`);
+  source.onmessage = (e) => onEvent(JSON.parse(e.data));
+  return () => source.close();
+}
+
+// Save a calculator form as a JSON merge patch holding only the fields that
+// differ from `saved`, conditional on the `version` they were loaded at.
+// Resolves to the new version, or null if someone else saved first (412).
+export async function patchCalc(assigneeId, calcKey, values, saved, version) {
+  const delta = {};
+  Object.keys(values).forEach((k) => {
+    if (values[k] !== saved[k]) delta[k] = values[k] ?? null;
+  });
+  const res = await fetch(`${API_BASE}/assignees/${assigneeId}/calc/${calcKey}`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json', 'If-Match': `"${version}"` },
+    body: JSON.stringify({ data: delta }),
+  });
+  if (res.status === 412) return null;
+  if (!res.ok) throw new Error(`Save failed (${res.status})`);
+  return (await res.json()).version;
+}
@@ -67,16 +67,15 @@ function PdfTool() {
       try { fields = JSON.parse(values.fieldsJson || '{}'); } catch (e) { throw new Error('Invalid JSON'); }
       const res = await fetch(`${API_BASE}/tools/pdf-fill`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Accept: 'application/pdf' },
         body: JSON.stringify({ title: values.title || 'Generated Form', fields }),
       });
       if (!res.ok) {
         const err = await res.json().catch(() => ({}));
         throw new Error(err.detail || 'PDF generation failed');
       }
-      const data = await res.json();
-      const blob = b64ToBlob(data.content_b64, 'application/pdf');
-      triggerDownload(blob, data.filename || 'form.pdf');
+      const blob = await res.blob();
+      triggerDownload(blob, attachmentFilename(res, 'form.pdf'));
       message.success('PDF generated');
     } catch (e) {
       message.error(e.message || 'Failed');
@@ -120,7 +119,7 @@ function EmailTool() {
         body: JSON.stringify({ to: (values.to || '').split(',').map(s => s.trim()).filter(Boolean), subject: values.subject, body: values.body, attachments }),
       });
       const data = await res.json();
-      if (data.status === 'sent') message.success('Email sent');
+      if (data.status === 'queued') message.success('Email queued for sending');
       else message.info('Preview only (SMTP not configured)');
     } catch (e) {
       message.error('Failed to send');
@@ -152,14 +151,13 @@ function EmailTool() {
   );
 }
 
-function b64ToBlob(base64, type) {
-  const byteCharacters = atob(base64);
-  const byteNumbers = new Array(byteCharacters.length);
-  for (let i = 0; i < byteCharacters.length; i++) {
-    byteNumbers[i] = byteCharacters.charCodeAt(i);
-  }
-  const byteArray = new Uint8Array(byteNumbers);
-  return new Blob([byteArray], { type });
+// The filename a response's Content-Disposition header gives its attachment.
+function attachmentFilename(res, fallback) {
+  const header = res.headers.get('Content-Disposition') || '';
+  const encoded = header.match(/filename\*=UTF-8''([^;]+)/i);
+  if (encoded) return decodeURIComponent(encoded[1]);
+  const plain = header.match(/filename="?([^";]+)"?/i);
+  return plain ? plain[1] : fallback;
 }
 
 function triggerDownload(blob, filename) {
@@ -6,12 +6,13 @@ import { API_BASE } from '../../api';
 const { Title } = Typography;
 
 function TotalOverview() {
-  const { assignee } = useOutletContext();
+  const { bundle, onChange } = useOutletContext();
   const { id } = useParams();
-  const [data, setData] = useState(null);
+  // Starts from the layout's bundle; the change feed keeps it current
+  const [data, setData] = useState(bundle ? bundle.overview : null);
 
   useEffect(() => {
-    (async () => {
+    const load = async () => {
       try {
         const res = await fetch(`${API_BASE}/assignees/${id}/overview`);
         const d = await res.json();
@@ -19,8 +20,21 @@ function TotalOverview() {
       } catch (e) {
         message.error('Failed to load overview');
       }
-    })();
-  }, [id]);
+    };
+    if (!data) load();
+    return onChange((event) => {
+      if (event.type === 'resync') {
+        load();
+      } else if (event.type === 'calc.updated' && event.totals) {
+        const input = event.calc_key === 'income-tax' ? 'income' : 'deductions';
+        setData((prev) => prev && {
+          ...prev,
+          ...event.totals,
+          inputs: { ...prev.inputs, [input]: event.data },
+        });
+      }
+    });
+  }, [id, onChange]);
 
   if (!data) return null;
 
@@ -35,7 +49,7 @@ function TotalOverview() {
           <Descriptions.Item label="Income Total">{data.income_total}</Descriptions.Item>
           <Descriptions.Item label="Deductions Total">{data.deductions_total}</Descriptions.Item>
           <Descriptions.Item label="Taxable Income">{data.taxable_income}</Descriptions.Item>
-          <Descriptions.Item label="Estimated Tax (25%)">{data.estimated_tax}</Descriptions.Item>
+          <Descriptions.Item label="Estimated Tax">{data.estimated_tax}</Descriptions.Item>
         </Descriptions>
       </Card>
 
@@ -1,31 +1,76 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { Layout, Menu, Typography, Spin } from 'antd';
 import { Link, Outlet, useLocation, useParams } from 'react-router-dom';
-import { API_BASE } from '../../api';
+import { API_BASE, subscribeChanges } from '../../api';
 
 const { Sider, Content } = Layout;
 const { Title } = Typography;
 
+// Overview inputs section each tax calculator's data appears under
+const OVERVIEW_INPUTS = { 'income-tax': 'income', deductions: 'deductions' };
+
+// The bundle with one change event applied; events the bundle already reflects leave it as is
+function applyChange(bundle, event) {
+  if (!bundle) return bundle;
+  if (event.type === 'calc.updated') {
+    const current = bundle.calcs && bundle.calcs[event.calc_key];
+    if (current && current.version >= event.version) return bundle;
+    const next = { ...bundle };
+    if (bundle.calcs) {
+      next.calcs = { ...bundle.calcs, [event.calc_key]: { data: event.data, version: event.version } };
+    }
+    const input = OVERVIEW_INPUTS[event.calc_key];
+    if (bundle.overview && input && event.totals) {
+      next.overview = {
+        ...bundle.overview,
+        ...event.totals,
+        inputs: { ...bundle.overview.inputs, [input]: event.data },
+      };
+    }
+    return next;
+  }
+  if (event.type === 'workpaper.created' && bundle.workpapers) {
+    if (bundle.workpapers.some((w) => w.id === event.workpaper.id)) return bundle;
+    return { ...bundle, workpapers: [...bundle.workpapers, event.workpaper] };
+  }
+  return bundle;
+}
+
 function WorkpaperLayout() {
   const { id } = useParams();
   const location = useLocation();
-  const [assignee, setAssignee] = useState(null);
+  // Assignee, calculators, overview and workpapers in one request, then kept current from the
+  // change feed; it is only fetched again after a resync (refetches revalidate by ETag)
+  const [bundle, setBundle] = useState(null);
   const [loading, setLoading] = useState(true);
+  // Child pages' change handlers; the one change feed below is fanned out to them
+  const listeners = useRef(new Set());
+
+  const onChange = useCallback((handler) => {
+    listeners.current.add(handler);
+    return () => listeners.current.delete(handler);
+  }, []);
 
   useEffect(() => {
     const run = async () => {
-      setLoading(true);
       try {
-        const res = await fetch(`${API_BASE}/assignees/${id}`);
-        const data = await res.json();
-        setAssignee(data);
+        const res = await fetch(`${API_BASE}/assignees/${id}/bundle`);
+        if (res.ok) setBundle(await res.json());
       } finally {
         setLoading(false);
       }
     };
+    setLoading(true);
     run();
+    return subscribeChanges({ assignee_id: id }, (event) => {
+      if (event.type === 'resync') run();
+      else setBundle((prev) => applyChange(prev, event));
+      listeners.current.forEach((handler) => handler(event));
+    });
   }, [id]);
 
+  const assignee = bundle ? bundle.assignee : null;
+
   const selected = (() => {
     if (location.pathname.endsWith('/overview')) return 'overview';
     if (location.pathname.endsWith('/income-tax')) return 'income-tax';
@@ -53,7 +98,7 @@ function WorkpaperLayout() {
         />
       </Sider>
       <Content style={{ padding: 24 }}>
-        {loading ? <Spin /> : <Outlet context={{ assignee }} />}
+        {loading ? <Spin /> : <Outlet context={{ assignee, bundle, onChange }} />}
       </Content>
     </Layout>
   );
@@ -1,37 +1,64 @@
-import React, { useEffect } from 'react';
+import React, { useCallback, useEffect, useRef } from 'react';
 import { Card, Form, InputNumber, Typography, Divider, Button, message } from 'antd';
-import { useParams } from 'react-router-dom';
-import { API_BASE } from '../../../api';
+import { useOutletContext, useParams } from 'react-router-dom';
+import { API_BASE, patchCalc } from '../../../api';
 
 const { Title } = Typography;
 
 function DeductionsCalc() {
   const { id } = useParams();
+  const { bundle, onChange } = useOutletContext();
   const [form] = Form.useForm();
 
+  // The layout's bundle as it was when this page opened; later copies must not overwrite edits
+  const initial = useRef(bundle);
+
+  // Last values and version read from or saved to the server; saves send the difference
+  const stored = useRef({ values: {}, version: 0 });
+
+  const fill = useCallback((data, version) => {
+    const values = {
+      retirement: Number(data.retirement || 0),
+      health: Number(data.health || 0),
+      charity: Number(data.charity || 0),
+    };
+    form.resetFields();
+    form.setFieldsValue(values);
+    stored.current = { values, version };
+  }, [form]);
+
+  const load = useCallback(async () => {
+    try {
+      const res = await fetch(`${API_BASE}/assignees/${id}/calc/deductions`);
+      const d = await res.json();
+      fill(d.data, d.version);
+    } catch (e) {
+      // ignore
+    }
+  }, [id, fill]);
+
   useEffect(() => {
-    (async () => {
-      try {
-        const res = await fetch(`${API_BASE}/assignees/${id}/calc/deductions`);
-        const d = await res.json();
-        form.setFieldsValue({
-          retirement: Number(d.data.retirement || 0),
-          health: Number(d.data.health || 0),
-          charity: Number(d.data.charity || 0),
-        });
-      } catch (e) {
-        // ignore
-      }
-    })();
-  }, [id, form]);
+    const cached = initial.current && initial.current.calcs && initial.current.calcs['deductions'];
+    if (cached) fill(cached.data, cached.version);
+    else load();
+    // Pick up saves from other tabs/users unless this form has unsaved edits
+    return onChange((event) => {
+      if (form.isFieldsTouched()) return;
+      if (event.type === 'resync') load();
+      else if (event.type === 'calc.updated' && event.calc_key === 'deductions') fill(event.data, event.version);
+    });
+  }, [id, form, fill, load, onChange]);
 
   const save = async (values) => {
     try {
-      await fetch(`${API_BASE}/assignees/${id}/calc/deductions`, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ data: values }),
-      });
+      const { values: saved, version } = stored.current;
+      const next = await patchCalc(id, 'deductions', values, saved, version);
+      if (next === null) {
+        message.warning('These inputs were changed elsewhere; reloaded the latest values');
+        load();
+        return;
+      }
+      fill(values, next);
       message.success('Saved');
     } catch (e) {
       message.error('Save failed');